@@ -1,17 +1,47 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, BackgroundTasks, File, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Optional, List, Union
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
+import asyncio
+import json
+import random
+import tarfile
 import uuid
 import base64
+import time
 from io import BytesIO
 import logging
 
-from core.model_manager import model_manager
 from core.gpu_monitor import gpu_monitor
+from core.telemetry import telemetry
+from core.offload import OFFLOAD_MODES, offload_unavailable
+from core.quantization import PRECISION_MODES, resolve_precision
+from core.cpu_tuning import fusion_backend
+from core.input_images import input_image_store
+from core.video import video_jobs
+from core.device_pool import device_pool
+from core.downloads import download_manager
+from core.checkpoint_cache import checkpoint_cache
+from core.result_cache import hash_input_image, make_cache_key, request_coalescer
+from core.profiler import profiler_controller
+from core.history_transfer import (
+    EXPORT_BATCH_SIZE, IMPORT_BATCH_SIZE, TarExporter, export_record, import_row,
+    read_import, record_filename
+)
+from core.storage import output_storage
+from core.retention import output_gc
+from core.similarity import similarity_index
+from core.sweep import SWEEP_AXES, build_cells, contact_sheet
+from core.metrics import (
+    generation_labels, generations_total, images_per_second, images_total,
+    metrics, observe_pipeline_timings, stage_seconds, time_stage
+)
 from models.database import Database
+from utils.png_metadata import build_pnginfo
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -20,7 +50,62 @@ router = APIRouter()
 # Initialize database
 db = Database(settings.DB_PATH)
 
+# Longer side of each contact-sheet cell (pixels)
+SWEEP_THUMB_SIZE = 256
+
+# Largest output side of a hires-fix request (pixels)
+HIRES_MAX_SIDE = 4096
+
+# Sweeps still running after their client went away
+_sweep_tasks: set = set()
+
+async def run_locked(func, *args, manager=None, **kwargs):
+    """Run a model manager call in a worker thread while holding its lock"""
+    manager = manager or device_pool.primary
+    def locked_call():
+        with manager.lock:
+            return func(*args, **kwargs)
+    return await run_in_threadpool(locked_call)
+
+def encode_png(image, params: Optional[dict] = None) -> bytes:
+    """Encode a PIL image as PNG bytes, with generation parameters as text chunks"""
+    buffered = BytesIO()
+    image.save(buffered, format="PNG", pnginfo=build_pnginfo(params) if params else None)
+    return buffered.getvalue()
+
+def generation_params(request, model_key: str, active_loras: List[dict], **overrides) -> dict:
+    """Parameters embedded in every saved image (enough to rebuild its history row)"""
+    img2img = is_img2img(request) if hasattr(request, "input_image_id") else False
+    params = {
+        "prompt": request.prompt,
+        "negative_prompt": request.negative_prompt,
+        "model_key": model_key,
+        "width": request.width,
+        "height": request.height,
+        "steps": request.num_inference_steps,
+        "guidance_scale": request.guidance_scale,
+        "seed": request.seed,
+        "scheduler": request.scheduler,
+        "clip_skip": 0 if img2img else request.clip_skip,
+        "denoise_strength": request.denoise_strength if img2img else None,
+        "loras": [{"name": lora["name"], "weight": lora["weight"]} for lora in active_loras],
+    }
+    if getattr(request, "hires", None):
+        params["hires"] = {**request.hires.model_dump(), "base_size": [request.width, request.height]}
+    params.update(overrides)
+    return params
+
+def is_img2img(request) -> bool:
+    """Whether a generation request carries an input image"""
+    return bool(request.input_image_id or request.input_image)
+
 # Request Models
+class HiresFixOptions(BaseModel):
+    scale: float = Field(default=2.0, ge=1.0, le=4.0)  # Output size relative to width x height
+    denoise_strength: float = Field(default=0.5, ge=0.05, le=1.0)
+    steps: Optional[int] = Field(default=None, ge=1, le=150)  # Second pass steps before strength (default: same as first)
+    upscale_mode: str = Field(default="bilinear", pattern="^(nearest-exact|bilinear|bicubic)$")
+
 class GenerateImageRequest(BaseModel):
     prompt: str = Field(..., min_length=1, max_length=2000)
     negative_prompt: str = ""
@@ -33,13 +118,34 @@ class GenerateImageRequest(BaseModel):
     scheduler: Optional[str] = None
     denoise_strength: Optional[float] = Field(default=0.75, ge=0.0, le=1.0)
     input_image: Optional[str] = None
+    input_image_id: Optional[str] = None  # From /images/upload, preferred over input_image
     sampler: Optional[str] = None
     clip_skip: int = Field(default=0, ge=0, le=5)
+    model_key: Optional[str] = None  # Route to a device with this model (loads it if needed)
+    profile: bool = False  # Capture a profiler trace for this request
+    priority: int = Field(default=0, ge=-10, le=10)  # Higher runs first and may preempt running jobs
+    hires: Optional[HiresFixOptions] = None  # Two-pass hires fix; width/height are the first pass size
+
+class GenerateVideoRequest(BaseModel):
+    prompt: str = Field(..., min_length=1, max_length=2000)
+    negative_prompt: str = ""
+    width: int = Field(default=832, ge=64, le=1920)
+    height: int = Field(default=480, ge=64, le=1920)
+    num_frames: int = Field(default=81, ge=1, le=241)
+    num_inference_steps: int = Field(default=30, ge=1, le=150)
+    guidance_scale: float = Field(default=5.0, ge=0.0, le=20.0)
+    seed: Optional[int] = None
+    fps: int = Field(default=16, ge=1, le=60)
+    format: str = Field(default="mp4", pattern="^(mp4|webm)$")
+    input_image_id: Optional[str] = None  # Required for image-to-video models
 
 class LoadModelRequest(BaseModel):
     model_config = {"protected_namespaces": ()}
     
     model_key: str
+    offload_mode: Optional[str] = None  # none, model, sequential, disk (None = saved/default)
+    precision: Optional[str] = None  # none, int8, fp8 weight-only (None = saved/default)
+    device: Optional[str] = None  # e.g. cuda:1 (None = primary device)
 
 class AddLoRARequest(BaseModel):
     model_config = {"protected_namespaces": ()}
@@ -71,10 +177,56 @@ async def health_check():
         "version": settings.APP_VERSION
     }
 
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Per-stage latency histograms and generation counters (Prometheus text format)"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+class ArmProfilerRequest(BaseModel):
+    count: int = Field(default=1, ge=1, le=20)
+
+@router.get("/diagnostics/profile")
+async def get_profiler_status():
+    """Profiler state and the captures written so far"""
+    return profiler_controller.status()
+
+@router.post("/diagnostics/profile")
+async def arm_profiler(request: ArmProfilerRequest):
+    """Profile the next N generations (torch.profiler trace, stack samples, operator summary)"""
+    if settings.INFERENCE_WORKER_PROCESS:
+        raise HTTPException(
+            status_code=400,
+            detail="Profiling needs in-process workers (set INFERENCE_WORKER_PROCESS=false)"
+        )
+    return profiler_controller.arm(request.count)
+
+@router.delete("/diagnostics/profile")
+async def disarm_profiler():
+    """Cancel pending profile captures"""
+    return profiler_controller.disarm()
+
+@router.get("/diagnostics/profile/{capture_id}/{kind}")
+async def download_profile(capture_id: str, kind: str):
+    """Download a capture file: trace (Chrome trace JSON), stacks (collapsed) or ops"""
+    capture = profiler_controller.get_capture(capture_id)
+    if not capture or kind not in capture["files"]:
+        raise HTTPException(status_code=404, detail="Profile capture not found")
+    file_path = settings.DIAGNOSTICS_DIR / capture["files"][kind]
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="Profile file not found on disk")
+    return FileResponse(file_path, filename=file_path.name)
+
 @router.get("/gpu/info")
 async def get_gpu_info():
-    """Get GPU information and stats"""
-    return gpu_monitor.get_gpu_info()
+    """Get GPU information and stats, plus per-device worker status"""
+    return {**gpu_monitor.get_gpu_info(), "devices": device_pool.status()}
+
+@router.get("/gpu/history")
+async def get_gpu_history(seconds: float = 300, points: int = 120):
+    """Sampled GPU utilization, memory, temperature, power and clocks over a recent window"""
+    if not telemetry.running:
+        raise HTTPException(status_code=503, detail="GPU telemetry is disabled (ENABLE_TELEMETRY=false)")
+    return telemetry.history(seconds=min(seconds, 86400), points=min(max(points, 1), 2000))
 
 @router.post("/gpu/clear-cache")
 async def clear_gpu_cache():
@@ -85,166 +237,993 @@ async def clear_gpu_cache():
 @router.get("/models")
 async def list_models():
     """List all available models"""
-    return model_manager.list_available_models()
+    return device_pool.primary.list_available_models()
 
 @router.get("/models/current")
 async def get_current_model():
     """Get currently loaded model info"""
-    return model_manager.get_current_model_info()
+    return device_pool.primary.get_current_model_info()
+
+@router.get("/models/offload")
+async def get_offload_info():
+    """Get offload tiers with measured peak memory and step latency per model"""
+    return device_pool.primary.get_offload_info()
 
 @router.post("/models/load")
 async def load_model(request: LoadModelRequest):
     """Load a specific model"""
-    result = model_manager.load_model(request.model_key)
+    # Remember the offload tier and weight precision per model so later loads reuse them
+    setting_key = f"offload_mode:{request.model_key}"
+    offload_mode = request.offload_mode
+    if offload_mode:
+        if offload_mode not in OFFLOAD_MODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown offload mode. Must be one of: {', '.join(OFFLOAD_MODES)}"
+            )
+        reason = offload_unavailable(offload_mode)
+        if reason is not None:
+            raise HTTPException(status_code=400, detail=reason)
+        await db.save_setting(setting_key, offload_mode)
+    else:
+        offload_mode = await db.get_setting(setting_key)
+    
+    precision = request.precision
+    if precision:
+        if precision not in PRECISION_MODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown precision. Must be one of: {', '.join(PRECISION_MODES)}"
+            )
+        await db.save_setting(f"precision:{request.model_key}", precision)
+    else:
+        precision = await db.get_setting(f"precision:{request.model_key}")
+    
+    worker = device_pool.get(request.device) if request.device else device_pool.primary
+    if worker is None:
+        raise HTTPException(status_code=400, detail=f"Unknown device: {request.device}")
+    
+    result = await run_locked(
+        worker.load_model, request.model_key, offload_mode=offload_mode, precision=precision, manager=worker
+    )
     if not result["success"]:
-        raise HTTPException(status_code=400, detail=result["error"])
+        raise _load_error(result)
     
     # Deactivate all custom models when loading a standard model
     await db.deactivate_all_custom_models()
     
     return result
 
-@router.post("/generate/image")
-async def generate_image(request: GenerateImageRequest, background_tasks: BackgroundTasks):
-    """Generate images from text prompt"""
+def _load_error(result: dict) -> HTTPException:
+    """Error for a failed model load; a model that is not on disk yet starts downloading"""
+    if result.get("download_required"):
+        if settings.AUTO_DOWNLOAD_MODELS:
+            download = download_manager.start(result["model_id"])
+        else:
+            download = download_manager.status(result["model_id"])
+        return HTTPException(status_code=409, detail={"error": result["error"], "download": download})
+    return HTTPException(status_code=400, detail=result["error"])
+
+def _model_repo(model_key: str) -> str:
+    model_info = device_pool.primary.AVAILABLE_MODELS.get(model_key)
+    if model_info is None:
+        raise HTTPException(status_code=404, detail=f"Model {model_key} not found")
+    return model_info["model_id"]
+
+@router.get("/models/downloads")
+async def list_downloads():
+    """Progress of model downloads started since the server came up"""
+    return {"downloads": download_manager.list()}
+
+@router.post("/models/{model_key}/download")
+async def start_download(model_key: str):
+    """Download (or resume) a model's files in the background; poll GET for progress"""
+    return download_manager.start(_model_repo(model_key))
+
+@router.get("/models/{model_key}/download")
+async def get_download(model_key: str):
+    """Download progress: bytes, files, speed and ETA"""
+    return download_manager.status(_model_repo(model_key))
+
+@router.delete("/models/{model_key}/download")
+async def cancel_download(model_key: str):
+    """Stop a running download; finished chunks are kept and resumed on the next start"""
+    if not download_manager.cancel(_model_repo(model_key)):
+        raise HTTPException(status_code=409, detail="No download running for this model")
+    return {"success": True}
+
+DEFAULT_AUTOLOAD_MODEL = "sdxl-turbo"
+
+@router.post("/images/upload")
+async def upload_input_image(file: UploadFile = File(...)):
+    """Upload an img2img input image once and reference it by id in generate requests"""
     try:
-        # Check if model is loaded
-        if model_manager.pipeline is None:
-            # Auto-load default model
-            logger.info("No model loaded, loading default model...")
-            load_result = model_manager.load_model("sdxl-turbo")
+        data = await file.read()
+        return {"success": True, **await run_in_threadpool(input_image_store.save, data)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error uploading input image: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _saved_load_options(model_key: Optional[str]) -> dict:
+    """Offload tier and weight precision last chosen for a model via /models/load"""
+    if not model_key:
+        return {}
+    return {
+        "offload_mode": await db.get_setting(f"offload_mode:{model_key}"),
+        "precision": await db.get_setting(f"precision:{model_key}")
+    }
+
+async def _effective_precision(worker, model_key: Optional[str]) -> str:
+    """Weight precision a request for model_key runs at on this worker, as _prepare_worker loads it"""
+    if worker.current_model is not None and model_key in (None, worker.current_model):
+        return worker.precision
+    return resolve_precision((await _saved_load_options(model_key)).get("precision"))
+
+def _effective_cpu_mode(worker, model_key: Optional[str]) -> Dict:
+    """bf16 autocast dtype and fusion backend a CPU request runs with; both None elsewhere"""
+    if worker.current_model is not None and model_key in (None, worker.current_model):
+        fusion = (worker.cpu_tuning or {}).get("fusion")
+    elif worker.device == "cpu" and settings.CPU_PERF_MODE:
+        fusion = fusion_backend()
+    else:
+        fusion = None
+    return {"autocast": "bfloat16" if worker.cpu_bf16 else None, "fusion": fusion}
+
+def _prepare_worker(request, active_loras: List[dict], worker, load_options: dict, labels: dict) -> None:
+    """Load the requested (or default) model and the active LoRAs; caller holds the lock"""
+    # Requests may name a model; the router prefers devices that have it
+    if request.model_key and worker.current_model != request.model_key:
+        logger.info(f"Loading {request.model_key} on {worker.device}...")
+        with time_stage("model_load", labels):
+            load_result = worker.load_model(request.model_key, **load_options)
             if not load_result["success"]:
+                raise _load_error(load_result)
+    
+    # Check if model is loaded
+    if worker.current_model is None:
+        # Auto-load default model
+        logger.info("No model loaded, loading default model...")
+        with time_stage("model_load", labels):
+            load_result = worker.load_model(DEFAULT_AUTOLOAD_MODEL)
+            if not load_result["success"]:
+                if load_result.get("download_required"):
+                    raise _load_error(load_result)
                 raise HTTPException(status_code=400, detail="Failed to load model")
+    
+    # Load active LoRAs into pipeline
+    if active_loras:
+        logger.info(f"Loading {len(active_loras)} active LoRAs into pipeline...")
+        with time_stage("lora_fuse", labels):
+            lora_result = worker.load_loras(active_loras)
+        if lora_result.get("incompatible"):
+            # The result (and its cache key) would claim LoRAs the model cannot apply
+            raise HTTPException(status_code=409, detail=lora_result["error"])
+        if not lora_result["success"]:
+            logger.warning(f"Failed to load LoRAs: {lora_result.get('error')}")
+            # Don't fail generation, just warn
+
+def _hold_worker(request, active_loras: List[dict], worker):
+    """
+    Take the worker's lock at the request's priority
+    
+    A higher-priority request that needs neither a model load nor different
+    LoRAs suspends the running job at its next step and runs in between.
+    """
+    return worker.lock.hold(
+        request.priority,
+        compatible=lambda: worker.can_run_while_suspended(request.model_key, active_loras)
+    )
+
+@contextmanager
+def _streamed_images(result: dict):
+    """
+    Iterate a generation's images, closing the stream however the loop ends
+    
+    A worker-process stream keeps the worker locked until it is finished,
+    so one abandoned by an exception must be closed in the holding thread.
+    """
+    images = iter(result["images"])
+    try:
+        yield images
+    finally:
+        close = getattr(images, "close", None)
+        if close is not None:
+            close()
+
+def _run_generation(
+    request: GenerateImageRequest,
+    active_loras: List[dict],
+    worker,
+    load_options: Optional[dict] = None
+) -> dict:
+    """
+    Load, generate and save images on one device (runs in a worker thread)
+    
+    Holds the worker's lock so concurrent requests never share a pipeline;
+    identical seeded requests are coalesced before reaching here. Every
+    stage is timed into the /metrics histograms.
+    """
+    labels = generation_labels(
+        request.model_key or worker.current_model or DEFAULT_AUTOLOAD_MODEL,
+        request.scheduler, request.width, request.height
+    )
+    queued_at = time.perf_counter()
+    with _hold_worker(request, active_loras, worker):
+        stage_seconds.observe(time.perf_counter() - queued_at, stage="queue_wait", **labels)
+        started_at = time.perf_counter()
         
-        # Load active LoRAs into pipeline
-        active_loras = await db.get_active_loras()
-        if active_loras:
-            logger.info(f"Loading {len(active_loras)} active LoRAs into pipeline...")
-            lora_result = model_manager.load_loras(active_loras)
-            if not lora_result["success"]:
-                logger.warning(f"Failed to load LoRAs: {lora_result.get('error')}")
-                # Don't fail generation, just warn
-        
-        # Generate images (txt2img or img2img)
-        if request.input_image:
-            # Image-to-Image generation
-            result = model_manager.generate_img2img(
-                prompt=request.prompt,
-                negative_prompt=request.negative_prompt,
-                input_image_base64=request.input_image,
-                width=request.width,
-                height=request.height,
-                num_inference_steps=request.num_inference_steps,
-                guidance_scale=request.guidance_scale,
-                num_images=request.num_images,
-                seed=request.seed,
-                scheduler=request.scheduler,
-                strength=request.denoise_strength
-            )
-        else:
-            # Text-to-Image generation
-            result = model_manager.generate_image(
-                prompt=request.prompt,
-                negative_prompt=request.negative_prompt,
-                width=request.width,
-                height=request.height,
-                num_inference_steps=request.num_inference_steps,
-                guidance_scale=request.guidance_scale,
-                num_images=request.num_images,
-                seed=request.seed,
-                scheduler=request.scheduler,
-                clip_skip=request.clip_skip
-            )
-        
-        if not result["success"]:
-            raise HTTPException(status_code=500, detail=result["error"])
+        _prepare_worker(request, active_loras, worker, load_options or {}, labels)
         
-        # Save images to disk
-        images_data = []
-        for idx, image in enumerate(result["images"]):
-            # Generate unique filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{timestamp}_{uuid.uuid4().hex[:8]}_{idx}.png"
-            file_path = settings.OUTPUTS_DIR / filename
-            
-            # Save image
-            image.save(file_path)
-            
-            # Convert to base64 for response
-            buffered = BytesIO()
-            image.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            
-            # Save to database in background
-            background_tasks.add_task(
-                db.save_generation,
-                prompt=request.prompt,
-                negative_prompt=request.negative_prompt,
-                model_key=model_manager.current_model,
-                width=request.width,
-                height=request.height,
-                steps=request.num_inference_steps,
-                guidance_scale=request.guidance_scale,
-                seed=request.seed,
-                file_path=str(file_path),
-                scheduler=request.scheduler,
-                denoise_strength=request.denoise_strength if request.input_image else None
-            )
+        # Profiles generation through image save when armed (no-op otherwise)
+        capture = profiler_controller.capture(
+            f"{labels['model']} {request.width}x{request.height} {labels['scheduler']}",
+            force=request.profile
+        )
+        with capture:
+            # Generate images (txt2img or img2img)
+            with time_stage("generate", labels):
+                if request.hires:
+                    # Base pass, latent upscale and img2img refinement in one call
+                    result = worker.generate_hires(
+                        prompt=request.prompt,
+                        negative_prompt=request.negative_prompt,
+                        width=request.width,
+                        height=request.height,
+                        num_inference_steps=request.num_inference_steps,
+                        guidance_scale=request.guidance_scale,
+                        num_images=request.num_images,
+                        seed=request.seed,
+                        scheduler=request.scheduler,
+                        clip_skip=request.clip_skip,
+                        scale=request.hires.scale,
+                        strength=request.hires.denoise_strength,
+                        hires_steps=request.hires.steps,
+                        upscale_mode=request.hires.upscale_mode
+                    )
+                elif request.input_image_id or request.input_image:
+                    # Image-to-Image generation
+                    result = worker.generate_img2img(
+                        prompt=request.prompt,
+                        negative_prompt=request.negative_prompt,
+                        input_image_base64=request.input_image,
+                        input_image_id=request.input_image_id,
+                        width=request.width,
+                        height=request.height,
+                        num_inference_steps=request.num_inference_steps,
+                        guidance_scale=request.guidance_scale,
+                        num_images=request.num_images,
+                        seed=request.seed,
+                        scheduler=request.scheduler,
+                        strength=request.denoise_strength
+                    )
+                else:
+                    # Text-to-Image generation
+                    result = worker.generate_image(
+                        prompt=request.prompt,
+                        negative_prompt=request.negative_prompt,
+                        width=request.width,
+                        height=request.height,
+                        num_inference_steps=request.num_inference_steps,
+                        guidance_scale=request.guidance_scale,
+                        num_images=request.num_images,
+                        seed=request.seed,
+                        scheduler=request.scheduler,
+                        clip_skip=request.clip_skip
+                    )
             
-            images_data.append({
-                "filename": filename,
-                "path": str(file_path),
-                "base64": img_str
-            })
+                if not result["success"]:
+                    raise HTTPException(status_code=500, detail=result["error"])
+        
+            timings = result.get("timings") or {}
+            observe_pipeline_timings(timings, labels)
+        
+            # Save images to disk as they are decoded (images may be a lazy iterator)
+            width = result.get("width", request.width)
+            height = result.get("height", request.height)
+            params = generation_params(request, worker.current_model, active_loras, width=width, height=height)
+            images_data = []
+            with _streamed_images(result) as images:
+                while True:
+                    # Pulling the next image runs its VAE decode when decoding is streamed
+                    with time_stage("vae_decode" if timings.get("streamed_decode") else "image_fetch", labels):
+                        image = next(images, None)
+                    if image is None:
+                        break
+                    
+                    # Encode PNG once, store it by content hash and reuse the bytes for the response
+                    with time_stage("png_encode", labels):
+                        png_bytes = encode_png(image, {**params, "image_index": len(images_data)})
+                    with time_stage("disk_write", labels):
+                        stored = output_storage.save(png_bytes)
+                    img_str = base64.b64encode(png_bytes).decode()
+                    del image
+                    
+                    images_data.append({
+                        "filename": stored["filename"],
+                        "path": str(stored["path"]),
+                        "url": stored["url"],
+                        "base64": img_str,
+                        "content_hash": stored["content_hash"],
+                        "size": stored["size"]
+                    })
+        
+        # Measured after saving so streamed VAE decode is included
+        peak_memory_mb = worker.peak_memory_mb()
+        
+        elapsed = time.perf_counter() - started_at
+        generations_total.inc(**labels)
+        images_total.inc(len(images_data), **labels)
+        if elapsed > 0:
+            images_per_second.set(len(images_data) / elapsed, **labels)
         
         return {
             "success": True,
             "images": images_data,
             "count": len(images_data),
             "prompt": request.prompt,
-            "model": model_manager.current_model
+            "model": worker.current_model,
+            "device": worker.device,
+            "width": width,
+            "height": height,
+            "peak_memory_mb": peak_memory_mb,
+            "labels": labels
         }
+
+async def _save_generation(labels: dict, **fields) -> None:
+    """Insert a history row, timed as the db_insert stage, and add its image to the similarity index"""
+    with time_stage("db_insert", labels):
+        gen_id = await db.save_generation(**fields)
+    if settings.ENABLE_SIMILARITY_INDEX:
+        try:
+            await run_in_threadpool(similarity_index.add_files, [gen_id], [fields["file_path"]])
+        except Exception as e:
+            logger.warning(f"Could not index generation {gen_id} for similarity search: {e}")
+
+async def _generate(
+    request: GenerateImageRequest,
+    active_loras: List[dict],
+    background_tasks: BackgroundTasks,
+    cache_key: Optional[str]
+) -> dict:
+    """Run a generation off the event loop and queue its history rows"""
+    if request.model_key and request.model_key not in device_pool.primary.AVAILABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Model {request.model_key} not found")
+    load_options = await _saved_load_options(request.model_key)
+    
+    with device_pool.acquire(request.model_key) as worker:
+        response = await run_in_threadpool(_run_generation, request, active_loras, worker, load_options)
+    labels = response.pop("labels")
+    
+    # Save to database in background
+    for image_data in response["images"]:
+        background_tasks.add_task(
+            _save_generation,
+            labels,
+            prompt=request.prompt,
+            negative_prompt=request.negative_prompt,
+            model_key=response["model"],
+            width=response["width"],
+            height=response["height"],
+            steps=request.num_inference_steps,
+            guidance_scale=request.guidance_scale,
+            seed=request.seed,
+            file_path=image_data["path"],
+            scheduler=request.scheduler,
+            denoise_strength=(
+                request.hires.denoise_strength if request.hires
+                else request.denoise_strength if is_img2img(request) else None
+            ),
+            cache_key=cache_key,
+            peak_memory_mb=response["peak_memory_mb"],
+            content_hash=image_data["content_hash"],
+            file_size=image_data["size"]
+        )
+    
+    return response
+
+def _read_cached_images(rows: List[dict]) -> Optional[List[dict]]:
+    """Load cached output files, None if any of them is gone"""
+    images_data = []
+    for row in rows:
+        file_path = Path(row["file_path"])
+        if not file_path.exists():
+            return None
+        images_data.append({
+            "filename": file_path.name,
+            "path": str(file_path),
+            "url": output_storage.url_for(file_path),
+            "base64": base64.b64encode(file_path.read_bytes()).decode()
+        })
+    return images_data
+
+async def _load_cached_result(cache_key: str, request: GenerateImageRequest) -> Optional[dict]:
+    """Return a previous response for the same deterministic request, if still on disk"""
+    rows = await db.get_generations_by_cache_key(cache_key, request.num_images)
+    if len(rows) < request.num_images:
+        return None
+    
+    images_data = await run_in_threadpool(_read_cached_images, rows)
+    if images_data is None:
+        return None
+    
+    logger.info(f"Result cache hit {cache_key[:12]} ({len(images_data)} images)")
+    return {
+        "success": True,
+        "images": images_data,
+        "count": len(images_data),
+        "prompt": request.prompt,
+        "model": rows[0]["model_key"],
+        "cached": True
+    }
+
+@router.post("/generate/image")
+async def generate_image(request: GenerateImageRequest, background_tasks: BackgroundTasks):
+    """Generate images from text prompt"""
+    try:
+        if request.profile and settings.INFERENCE_WORKER_PROCESS:
+            raise HTTPException(
+                status_code=400,
+                detail="Profiling needs in-process workers (set INFERENCE_WORKER_PROCESS=false)"
+            )
+        
+        if request.hires:
+            if is_img2img(request):
+                raise HTTPException(status_code=400, detail="Hires fix works on text-to-image requests only")
+            if max(request.width, request.height) * request.hires.scale > HIRES_MAX_SIDE:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Hires fix output would exceed {HIRES_MAX_SIDE}px per side"
+                )
+        
+        active_loras = await db.get_active_loras()
+        
+        # Only seeded requests are deterministic and therefore cacheable;
+        # profiled requests must actually run
+        if request.seed is None or not settings.ENABLE_RESULT_CACHE or request.profile:
+            return await _generate(request, active_loras, background_tasks, None)
+        
+        model_key = request.model_key or device_pool.primary.current_model or DEFAULT_AUTOLOAD_MODEL
+        worker = device_pool.route(request.model_key)
+        cache_key = make_cache_key(
+            model_key=model_key,
+            dtype=str(worker.dtype),
+            loras=active_loras,
+            prompt=request.prompt,
+            negative_prompt=request.negative_prompt,
+            width=request.width,
+            height=request.height,
+            steps=request.num_inference_steps,
+            guidance_scale=request.guidance_scale,
+            num_images=request.num_images,
+            seed=request.seed,
+            scheduler=request.scheduler,
+            clip_skip=request.clip_skip,
+            strength=request.denoise_strength,
+            # Upload ids are the SHA-256 of the image, like the hash of inline input
+            input_image_hash=request.input_image_id or hash_input_image(request.input_image),
+            hires=request.hires.model_dump() if request.hires else None,
+            precision=await _effective_precision(worker, request.model_key),
+            cpu_mode=_effective_cpu_mode(worker, request.model_key)
+        )
         
+        cached = await _load_cached_result(cache_key, request)
+        if cached is not None:
+            return cached
+        
+        response, coalesced = await request_coalescer.run(
+            cache_key,
+            lambda: _generate(request, active_loras, background_tasks, cache_key)
+        )
+        if coalesced:
+            response = {**response, "coalesced": True}
+        return response
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Generation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+class SweepAxis(BaseModel):
+    name: str  # seed, guidance_scale, num_inference_steps or scheduler
+    values: List[Union[int, float, str]] = Field(..., min_length=1)
+
+class GenerateSweepRequest(BaseModel):
+    prompt: str = Field(..., min_length=1, max_length=2000)
+    negative_prompt: str = ""
+    width: int = Field(default=1024, ge=64, le=2048)
+    height: int = Field(default=1024, ge=64, le=2048)
+    num_inference_steps: int = Field(default=30, ge=1, le=150)
+    guidance_scale: float = Field(default=7.5, ge=0.0, le=20.0)
+    seed: Optional[int] = None  # Shared by all cells unless seed is an axis
+    scheduler: Optional[str] = None
+    clip_skip: int = Field(default=0, ge=0, le=5)
+    model_key: Optional[str] = None
+    axes: List[SweepAxis] = Field(..., min_length=1, max_length=2)  # x, then optional y
+    priority: int = Field(default=0, ge=-10, le=10)
+    include_base64: bool = True  # Per-cell images inline in the stream
+
+def _validate_sweep_axes(request: GenerateSweepRequest) -> List[dict]:
+    """Check axis names and coerce values to the parameter types, as plain dicts"""
+    axes = []
+    for axis in request.axes:
+        try:
+            if axis.name == "seed":
+                values = [int(v) for v in axis.values]
+            elif axis.name == "num_inference_steps":
+                values = [int(v) for v in axis.values]
+                if not all(1 <= v <= 150 for v in values):
+                    raise ValueError("steps must be between 1 and 150")
+            elif axis.name == "guidance_scale":
+                values = [float(v) for v in axis.values]
+                if not all(0.0 <= v <= 20.0 for v in values):
+                    raise ValueError("guidance_scale must be between 0 and 20")
+            elif axis.name == "scheduler":
+                values = [str(v) for v in axis.values]
+                unknown = [v for v in values if v not in device_pool.primary.SCHEDULER_MAP]
+                if unknown:
+                    raise ValueError(f"unknown schedulers {unknown}")
+            else:
+                raise ValueError(f"must be one of {', '.join(SWEEP_AXES)}")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid sweep axis {axis.name}: {e}")
+        axes.append({"name": axis.name, "values": values})
+    
+    if len(axes) == 2 and axes[0]["name"] == axes[1]["name"]:
+        raise HTTPException(status_code=400, detail="Sweep axes must vary different parameters")
+    cells = 1
+    for axis in axes:
+        cells *= len(axis["values"])
+    if cells > settings.MAX_SWEEP_CELLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Sweep has {cells} cells, the limit is {settings.MAX_SWEEP_CELLS}"
+        )
+    return axes
+
+def _run_sweep(
+    request: GenerateSweepRequest,
+    axes: List[dict],
+    cells: List[dict],
+    active_loras: List[dict],
+    worker,
+    load_options: dict,
+    emit,
+    saved: List[dict]
+) -> None:
+    """
+    Generate a sweep on one device and emit each cell as it is saved (worker thread)
+    
+    Saved cells are appended to `saved` for the history rows, so cells that
+    finished before a failure still get recorded.
+    """
+    labels = generation_labels(
+        request.model_key or worker.current_model or DEFAULT_AUTOLOAD_MODEL,
+        request.scheduler, request.width, request.height
+    )
+    with _hold_worker(request, active_loras, worker):
+        started_at = time.perf_counter()
+        _prepare_worker(request, active_loras, worker, load_options, labels)
+        
+        result = worker.generate_sweep(
+            prompt=request.prompt,
+            negative_prompt=request.negative_prompt,
+            width=request.width,
+            height=request.height,
+            cells=cells,
+            clip_skip=request.clip_skip
+        )
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail=result["error"])
+        observe_pipeline_timings(result.get("timings"), labels)
+        emit({"type": "plan", "cells": len(cells), "groups": result["groups"], "model": worker.current_model})
+        
+        thumbnails = {}
+        with _streamed_images(result) as images:
+            for cell, image in zip(result["cells"], images):
+                params = generation_params(
+                    request, worker.current_model, active_loras,
+                    seed=cell["seed"],
+                    guidance_scale=cell["guidance_scale"],
+                    steps=cell["num_inference_steps"],
+                    scheduler=cell["scheduler"]
+                )
+                with time_stage("png_encode", labels):
+                    png_bytes = encode_png(image, params)
+                with time_stage("disk_write", labels):
+                    stored = output_storage.save(png_bytes)
+                
+                image.thumbnail((SWEEP_THUMB_SIZE, SWEEP_THUMB_SIZE))
+                thumbnails[cell["index"]] = image
+                saved.append({
+                    **cell,
+                    "path": str(stored["path"]),
+                    "model": worker.current_model,
+                    "content_hash": stored["content_hash"],
+                    "size": stored["size"]
+                })
+                
+                event = {
+                    "type": "cell",
+                    **cell,
+                    "filename": stored["filename"],
+                    "path": str(stored["path"]),
+                    "url": stored["url"]
+                }
+                if request.include_base64:
+                    event["base64"] = base64.b64encode(png_bytes).decode()
+                emit(event)
+        
+        images_total.inc(len(saved), **labels)
+        generations_total.inc(**labels)
+        peak_memory_mb = worker.peak_memory_mb()
+        for record in saved:
+            record["peak_memory_mb"] = peak_memory_mb
+    
+    # Stitching needs no GPU, so the device is free for the next request
+    # Sheets have no history row; like videos they live outside the sharded store
+    sheet = contact_sheet(thumbnails, cells, axes, SWEEP_THUMB_SIZE)
+    png_bytes = encode_png(sheet)
+    filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.png"
+    file_path = settings.OUTPUTS_DIR / "sheets" / filename
+    file_path.parent.mkdir(exist_ok=True)
+    file_path.write_bytes(png_bytes)
+    emit({
+        "type": "sheet",
+        "filename": filename,
+        "path": str(file_path),
+        "url": f"/outputs/sheets/{filename}",
+        "base64": base64.b64encode(png_bytes).decode(),
+        "columns": len(axes[0]["values"]),
+        "rows": len(axes[1]["values"]) if len(axes) > 1 else 1
+    })
+    emit({
+        "type": "done",
+        "count": len(saved),
+        "model": worker.current_model,
+        "device": worker.device,
+        "elapsed": round(time.perf_counter() - started_at, 3),
+        "peak_memory_mb": peak_memory_mb
+    })
+
+@router.post("/generate/sweep")
+async def generate_sweep(request: GenerateSweepRequest):
+    """
+    Generate an XY grid of parameter variations as NDJSON
+    
+    Streams a "plan" line, one "cell" line per image as it is saved, a
+    "sheet" line with the stitched contact sheet and a final "done" line
+    (or an "error" line). Cells are saved to history like normal images.
+    """
+    axes = _validate_sweep_axes(request)
+    if request.scheduler and request.scheduler not in device_pool.primary.SCHEDULER_MAP:
+        raise HTTPException(status_code=400, detail=f"Unknown scheduler {request.scheduler}")
+    if request.model_key and request.model_key not in device_pool.primary.AVAILABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Model {request.model_key} not found")
+    load_options = await _saved_load_options(request.model_key)
+    
+    # Without a seed every cell would get its own noise; share one so
+    # cells only differ by the swept parameters
+    base = request.model_dump()
+    if base["seed"] is None:
+        base["seed"] = random.randint(0, 2**32 - 1)
+    cells = build_cells(base, axes)
+    active_loras = await db.get_active_loras()
+    
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    emit = lambda event: loop.call_soon_threadsafe(events.put_nowait, event)
+    
+    async def produce():
+        saved: List[dict] = []
+        try:
+            with device_pool.acquire(request.model_key) as worker:
+                await run_in_threadpool(
+                    _run_sweep, request, axes, cells, active_loras, worker, load_options, emit, saved
+                )
+        except HTTPException as e:
+            emit({"type": "error", "error": e.detail})
+        except Exception as e:
+            logger.error(f"Sweep error: {e}")
+            emit({"type": "error", "error": str(e)})
+        finally:
+            emit(None)
+        
+        # History rows, also for cells saved before a failure
+        for record in saved:
+            await _save_generation(
+                generation_labels(record["model"], record["scheduler"], request.width, request.height),
+                prompt=request.prompt,
+                negative_prompt=request.negative_prompt,
+                model_key=record["model"],
+                width=request.width,
+                height=request.height,
+                steps=record["num_inference_steps"],
+                guidance_scale=record["guidance_scale"],
+                seed=record["seed"],
+                file_path=record["path"],
+                scheduler=record["scheduler"],
+                peak_memory_mb=record.get("peak_memory_mb"),
+                content_hash=record["content_hash"],
+                file_size=record["size"]
+            )
+    
+    # The sweep keeps running (and saving) if the client disconnects
+    task = asyncio.create_task(produce())
+    _sweep_tasks.add(task)
+    task.add_done_callback(_sweep_tasks.discard)
+    
+    async def stream():
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def _run_video_job(job_id: str, request: GenerateVideoRequest) -> None:
+    """Generate a video for a queued job (runs as a background task in a worker thread)"""
+    def progress(stage: str, **fields):
+        video_jobs.update(job_id, stage=stage, **fields)
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{timestamp}_{uuid.uuid4().hex[:8]}.{request.format}"
+    output_path = settings.OUTPUTS_DIR / "videos" / filename
+    
+    video_jobs.update(job_id, status="running")
+    with device_pool.acquire() as worker, worker.lock:
+        result = worker.generate_video(
+            prompt=request.prompt,
+            output_path=output_path,
+            negative_prompt=request.negative_prompt,
+            width=request.width,
+            height=request.height,
+            num_frames=request.num_frames,
+            num_inference_steps=request.num_inference_steps,
+            guidance_scale=request.guidance_scale,
+            seed=request.seed,
+            fps=request.fps,
+            container=request.format,
+            input_image_id=request.input_image_id,
+            progress=progress
+        )
+    
+    if result["success"]:
+        video_jobs.update(
+            job_id,
+            status="completed",
+            stage="done",
+            file_path=result["file_path"],
+            url=f"/outputs/videos/{filename}",
+            frames_done=result["num_frames"]
+        )
+    else:
+        video_jobs.update(job_id, status="failed", stage="failed", error=result["error"])
+
+@router.post("/generate/video")
+async def generate_video(request: GenerateVideoRequest, background_tasks: BackgroundTasks):
+    """Queue a video generation (Wan models); poll /generate/video/{job_id} for progress"""
+    if device_pool.primary.current_model is None or not device_pool.primary.is_video_model():
+        raise HTTPException(status_code=400, detail="Load a text-to-video or image-to-video model first")
+    
+    job = video_jobs.create(request.model_dump())
+    background_tasks.add_task(_run_video_job, job["job_id"], request)
+    return {"success": True, "job_id": job["job_id"], "status": job["status"]}
+
+@router.get("/generate/video/{job_id}")
+async def get_video_job(job_id: str):
+    """Get progress (denoising step, decoded frames) or result of a video job"""
+    job = video_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Video job not found")
+    return job
+
+def _with_url(generation: dict) -> dict:
+    """History row plus the URL its image is served under"""
+    return {**generation, "url": output_storage.url_for(generation["file_path"])}
+
 @router.get("/history")
 async def get_history(limit: int = 50):
     """Get generation history"""
     try:
-        generations = await db.get_recent_generations(limit)
+        generations = [_with_url(g) for g in await db.get_recent_generations(limit)]
         return {"generations": generations, "count": len(generations)}
     except Exception as e:
         logger.error(f"Error fetching history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/history/export")
+async def export_history(format: str = "ndjson"):
+    """
+    Stream the whole history as NDJSON metadata or as a tar of images plus metadata
+    
+    Rows are read in batches and files one at a time, so memory use does
+    not depend on the size of the history.
+    """
+    if format not in ("ndjson", "tar"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or tar")
+    name = f"ai_studio_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{name}"'}
+    
+    if format == "ndjson":
+        async def lines():
+            async for row in db.iter_generations(EXPORT_BATCH_SIZE):
+                record = await run_in_threadpool(export_record, row)
+                yield json.dumps(record) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+    
+    async def archive():
+        exporter = TarExporter()
+        async for row in db.iter_generations(EXPORT_BATCH_SIZE):
+            chunk = await run_in_threadpool(exporter.add_generation, row)
+            if chunk:
+                yield chunk
+        yield exporter.close()
+    return StreamingResponse(archive(), media_type="application/x-tar", headers=headers)
+
+@router.post("/history/import")
+async def import_history(file: UploadFile = File(...)):
+    """
+    Import an NDJSON or tar export, skipping generations whose image is already stored
+    
+    Archived images are written to the outputs directory as they are read;
+    rows are inserted in batched transactions.
+    """
+    stats = {"imported": 0, "duplicates": 0, "images": 0, "invalid": 0}
+    placed = {}  # archived image name -> stored path, None for duplicates
+    batch: List[dict] = []
+    batch_hashes = set()
+    
+    async def flush():
+        inserted = await db.import_generations(batch)
+        stats["imported"] += inserted
+        stats["duplicates"] += len(batch) - inserted
+        batch.clear()
+        batch_hashes.clear()
+    
+    events = read_import(file.file, settings.OUTPUTS_DIR)
+    try:
+        while True:
+            event = await run_in_threadpool(next, events, None)
+            if event is None:
+                break
+            
+            if event[0] == "image":
+                _, filename, content_hash, temp_path = event
+                if content_hash in batch_hashes or await db.has_content_hash(content_hash):
+                    temp_path.unlink()
+                    placed[filename] = None
+                else:
+                    stored = await run_in_threadpool(output_storage.adopt, temp_path, content_hash)
+                    placed[filename] = stored["path"]
+                    batch_hashes.add(content_hash)
+                    stats["images"] += 1
+                continue
+            
+            record = event[1]
+            try:
+                filename = record_filename(record)
+                if filename in placed:
+                    file_path = placed.pop(filename)
+                    if file_path is None:
+                        stats["duplicates"] += 1
+                        continue
+                else:
+                    # Metadata-only import: images are expected in outputs already
+                    file_path = None
+                    if record.get("content_hash"):
+                        file_path = await run_in_threadpool(output_storage.find, record["content_hash"])
+                    file_path = file_path or settings.OUTPUTS_DIR / (filename or "")
+                batch.append(import_row(record, file_path))
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Skipping invalid history record: {e}")
+                stats["invalid"] += 1
+                continue
+            if record.get("content_hash"):
+                batch_hashes.add(record["content_hash"])
+            
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await flush()
+        
+        if batch:
+            await flush()
+    except (ValueError, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid history export: {e}")
+    except Exception as e:
+        logger.error(f"Error importing history: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    logger.info(f"History import: {stats}")
+    return {"success": True, **stats}
+
 @router.get("/history/{gen_id}")
 async def get_generation(gen_id: int):
     """Get specific generation"""
     generation = await db.get_generation_by_id(gen_id)
     if not generation:
         raise HTTPException(status_code=404, detail="Generation not found")
-    return generation
+    return _with_url(generation)
 
 @router.delete("/history/{gen_id}")
 async def delete_generation(gen_id: int):
-    """Delete generation"""
-    success = await db.delete_generation(gen_id)
-    if not success:
+    """Delete generation and its image, unless another generation shares the file"""
+    generation = await db.get_generation_by_id(gen_id)
+    if not generation:
         raise HTTPException(status_code=404, detail="Generation not found")
-    return {"success": True}
+    orphaned = await db.delete_generations([gen_id])
+    files_deleted = await run_in_threadpool(output_gc.remove_files, orphaned)
+    return {"success": True, "files_deleted": files_deleted}
+
+class SetFavoriteRequest(BaseModel):
+    is_favorite: bool
+
+@router.patch("/history/{gen_id}/favorite")
+async def set_favorite(gen_id: int, request: SetFavoriteRequest):
+    """Mark or unmark a generation as favorite (favorites survive retention)"""
+    if not await db.set_generation_favorite(gen_id, request.is_favorite):
+        raise HTTPException(status_code=404, detail="Generation not found")
+    return {"success": True, "id": gen_id, "is_favorite": request.is_favorite}
+
+@router.get("/gc/status")
+async def get_gc_status():
+    """Retention policy and output garbage collector counters"""
+    return output_gc.status()
+
+@router.post("/gc/run")
+async def run_gc():
+    """Run one garbage collection slice now"""
+    return await output_gc.run_slice()
 
 @router.get("/history/search")
 async def search_history(q: str, limit: int = 50):
     """Search generation history"""
     try:
-        generations = await db.search_generations(q, limit)
+        generations = [_with_url(g) for g in await db.search_generations(q, limit)]
         return {"generations": generations, "count": len(generations)}
     except Exception as e:
         logger.error(f"Error searching history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/history/similar/{gen_id}")
+async def find_similar(gen_id: int, limit: int = 20):
+    """
+    Generations whose images look most like this one, best match first
+    
+    Uses the configured embedder (perceptual hash or CLIP). A generation
+    that is not indexed yet is embedded on the fly.
+    """
+    limit = max(1, min(limit, 200))
+    generation = await db.get_generation_by_id(gen_id)
+    if not generation:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    
+    started_at = time.perf_counter()
+    vector = await run_in_threadpool(similarity_index.vector_for, gen_id)
+    if vector is None:
+        added = await run_in_threadpool(similarity_index.add_files, [gen_id], [generation["file_path"]])
+        if gen_id not in added:
+            raise HTTPException(status_code=404, detail="Image file not found")
+        vector = added[gen_id]
+    
+    # Over-fetch: deleted generations are still in the index until it is compacted
+    matches = await run_in_threadpool(similarity_index.search, vector, limit * 2, gen_id)
+    search_ms = (time.perf_counter() - started_at) * 1000
+    rows = await db.get_generations_by_ids([match_id for match_id, _ in matches])
+    generations = [
+        {**_with_url(rows[match_id]), "similarity": round(score, 4)}
+        for match_id, score in matches if match_id in rows
+    ][:limit]
+    return {
+        "generations": generations,
+        "count": len(generations),
+        "embedder": similarity_index.embedder.name,
+        "indexed": len(similarity_index),
+        "search_ms": round(search_ms, 2)
+    }
+
 @router.get("/stats")
 async def get_stats():
     """Get generation statistics"""
@@ -346,10 +1325,10 @@ async def set_lora_active(lora_id: int, request: SetLoRAActiveRequest):
         # Load/unload LoRA in model manager
         if request.is_active:
             active_loras = await db.get_active_loras()
-            model_manager.load_loras(active_loras)
+            await run_locked(device_pool.primary.load_loras, active_loras)
         else:
             active_loras = await db.get_active_loras()
-            model_manager.load_loras(active_loras)
+            await run_locked(device_pool.primary.load_loras, active_loras)
         
         return {
             "success": True,
@@ -372,7 +1351,7 @@ async def delete_lora(lora_id: int):
         
         # Reload active LoRAs
         active_loras = await db.get_active_loras()
-        model_manager.load_loras(active_loras)
+        await run_locked(device_pool.primary.load_loras, active_loras)
         
         return {"success": True, "message": "LoRA deleted successfully"}
     except Exception as e:
@@ -384,7 +1363,7 @@ async def deactivate_all_loras():
     """Deactivate all LoRAs"""
     try:
         await db.deactivate_all_loras()
-        model_manager.unload_all_loras()
+        await run_locked(device_pool.primary.unload_all_loras)
         return {"success": True, "message": "All LoRAs deactivated"}
     except Exception as e:
         logger.error(f"Error deactivating all LoRAs: {e}")
@@ -489,6 +1468,17 @@ async def detect_model_type_endpoint(file_path: str):
         logger.error(f"Error detecting model type: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/custom-models/cache")
+async def get_checkpoint_cache():
+    """Single-file checkpoints cached in converted diffusers format"""
+    return await run_in_threadpool(checkpoint_cache.status)
+
+@router.delete("/custom-models/cache")
+async def clear_checkpoint_cache():
+    """Drop all converted checkpoints; the next load of each converts again"""
+    removed = await run_in_threadpool(checkpoint_cache.clear)
+    return {"success": True, "removed": removed}
+
 @router.get("/custom-models")
 async def list_custom_models():
     """Get all custom models"""
@@ -572,8 +1562,9 @@ async def load_custom_model(request: LoadCustomModelRequest):
         # Deactivate all other custom models
         await db.deactivate_all_custom_models()
         
-        # Load the model using model_manager
-        load_result = model_manager.load_custom_model(
+        # Load the model on the primary worker
+        load_result = await run_locked(
+            device_pool.primary.load_custom_model,
             model_path=str(model_path),
             model_type=model_info['model_type'],
             model_name=model_info['name']
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Optional
 import os
 
 class Settings(BaseSettings):
@@ -13,6 +14,8 @@ class Settings(BaseSettings):
     MODELS_DIR: Path = BASE_DIR / "models"
     OUTPUTS_DIR: Path = BASE_DIR / "outputs"
     DB_PATH: Path = BASE_DIR / "ai_studio.db"
+    UPLOADS_DIR: Path = BASE_DIR / "uploads"  # Uploaded img2img input images
+    DIAGNOSTICS_DIR: Path = BASE_DIR / "diagnostics"  # Profiler traces and stack samples
     
     # API
     API_HOST: str = "127.0.0.1"
@@ -23,17 +26,87 @@ class Settings(BaseSettings):
     DEFAULT_HEIGHT: int = 512
     DEFAULT_STEPS: int = 30
     DEFAULT_GUIDANCE: float = 7.5
-    MAX_BATCH_SIZE: int = 4
+    MAX_BATCH_SIZE: int = 4  # Images per pipeline call; larger requests run as micro-batches
+    MAX_SWEEP_CELLS: int = 64  # Cells per /generate/sweep grid
     
     # GPU
     DEVICE: str = "cuda"  # cuda, cpu, or mps (for Mac)
+    ENABLE_DEVICE_POOL: bool = True  # One inference worker per GPU
+    VIRTUAL_DEVICES: int = 0  # CPU-only: number of workers (independent pipelines sharing the cores)
+    INFERENCE_WORKER_PROCESS: bool = False  # Run each worker's models in a supervised child process
+    ENABLE_PREEMPTION: bool = True  # Higher-priority requests suspend running jobs at step boundaries
+    CPU_PERF_MODE: bool = True  # CPU-only: per-worker core pinning, bf16 autocast, channels_last
+    CPU_THREADS: int = 0  # Intra-op threads per worker (0 = all physical cores of its slice)
+    CPU_INTEROP_THREADS: int = 1  # Inter-op threads (diffusion pipelines run ops sequentially)
+    CPU_BF16: str = "auto"  # auto (native AVX512-BF16/AMX only), on, off
+    CPU_FUSION: str = "auto"  # auto (IPEX if installed), ipex, compile (torch.compile with freezing), none
     ENABLE_XFORMERS: bool = True
-    ENABLE_ATTENTION_SLICING: bool = True
-    VAE_SLICING: bool = True
+    ENABLE_ATTENTION_SLICING: bool = True  # Allow the memory policy to slice attention
+    VAE_SLICING: bool = True  # Allow the memory policy to slice VAE decode
+    MEMORY_POLICY: str = "adaptive"  # adaptive, legacy (always slice), or off
+    MEMORY_HEADROOM: float = 0.85  # Fraction of free VRAM a generation may plan to use
+    STREAMING_VAE_DECODE: bool = True  # Decode and save images one at a time
+    VAE_TILE_SIZE: int = 512  # Tile size in pixels when tiled decode is needed
+    VAE_TILE_OVERLAP: int = 64  # Tile overlap in pixels, blended to hide seams
+    VIDEO_DECODE_CHUNK: int = 4  # Latent frames decoded per chunk (~16 video frames for Wan)
+    OFFLOAD_MODE: str = "auto"  # auto (per-model default), none, model, sequential, disk
+    WEIGHT_PRECISION: str = "none"  # none, int8, fp8: weight-only quantization of denoiser and large text encoders
+    OFFLOAD_DIR: Path = BASE_DIR / "offload_cache"  # Weight files for disk offload
+    
+    # Reuse outputs of identical seeded requests instead of recomputing
+    ENABLE_RESULT_CACHE: bool = True
+    
+    # img2img input caches (entries): resized pixels and VAE-encoded latents
+    INPUT_PIXEL_CACHE_SIZE: int = 32
+    INPUT_LATENT_CACHE_SIZE: int = 64
+    CACHE_INPUT_LATENTS: bool = True
+    UPLOADS_MAX_AGE_DAYS: int = 30  # Uploaded and inline input images unused this long are deleted (0 = keep)
+    UPLOADS_MAX_TOTAL_MB: int = 2048  # Least recently used input images are deleted beyond this (0 = no limit)
+    
+    # GPU telemetry: background sampling interval (seconds) and ring buffer length
+    ENABLE_TELEMETRY: bool = True
+    TELEMETRY_INTERVAL: float = 1.0
+    TELEMETRY_HISTORY: int = 3600  # One hour at 1s
+    
+    # Output retention (0 = no limit) and the background garbage collector
+    ENABLE_OUTPUT_GC: bool = True
+    RETENTION_MAX_AGE_DAYS: int = 0
+    RETENTION_MAX_TOTAL_GB: float = 0.0
+    RETENTION_KEEP_FAVORITES: bool = True
+    GC_INTERVAL: float = 60.0  # Seconds between GC slices
+    GC_SLICE_SECONDS: float = 0.5  # Time budget per slice
+    GC_BATCH_SIZE: int = 200  # Rows/files checked per step
+    GC_ORPHAN_GRACE_SECONDS: int = 3600  # Unreferenced files younger than this are kept
+    GC_ORPHAN_POLICY: str = "delete"  # delete, quarantine (files into GC_QUARANTINE_DIR) or flag; see core/retention.py
+    GC_QUARANTINE_DIR: Path = BASE_DIR / "outputs_quarantine"  # Same layout as OUTPUTS_DIR; never deleted by the GC
+    GC_VACUUM_PAGES: int = 256  # SQLite pages returned to the filesystem per slice
+    
+    # Visual similarity search over history (/history/similar)
+    ENABLE_SIMILARITY_INDEX: bool = True  # Embed each image as it is saved
+    SIMILARITY_EMBEDDER: str = "phash"  # phash (perceptual hash) or clip
+    SIMILARITY_CLIP_MODEL: str = "openai/clip-vit-base-patch32"
+    SIMILARITY_DEVICE: str = "cpu"  # Device for the CLIP embedder
+    SIMILARITY_DIR: Path = BASE_DIR / "similarity_index"  # Memory-mapped embedding matrices
+    
+    # Profiling: stack sampling interval while a capture is running
+    PROFILER_SAMPLE_INTERVAL_MS: int = 5
     
     # Models
     DEFAULT_MODEL: str = "stabilityai/stable-diffusion-xl-base-1.0"
     
+    # Model downloads (hub repos are fetched ahead of loading into MODELS_DIR/snapshots)
+    HF_ENDPOINT: str = "https://huggingface.co"  # Hub or mirror serving the API and files
+    HF_TOKEN: Optional[str] = None  # Needed for gated repos (FLUX.1-dev)
+    AUTO_DOWNLOAD_MODELS: bool = True  # Loading a missing model starts its download
+    DOWNLOAD_CONNECTIONS: int = 8  # Concurrent ranged requests per download
+    DOWNLOAD_CHUNK_MB: int = 64  # Range size; also the unit of resume
+    DOWNLOAD_RETRIES: int = 5  # Attempts per chunk before the download fails
+    
+    # Single-file checkpoints converted to diffusers format once and reused
+    ENABLE_CHECKPOINT_CACHE: bool = True
+    CHECKPOINT_CACHE_DIR: Path = MODELS_DIR / "converted"
+    CHECKPOINT_CACHE_MAX_GB: float = 50.0  # Least recently used conversions are evicted beyond this
+    
     # Content Filtering
     DISABLE_NSFW_FILTER: bool = True  # Set to False to enable NSFW content filter
     
@@ -0,0 +1,189 @@
+"""
+Converted Checkpoint Cache
+Single-file checkpoints (.safetensors in the original SD layout) are
+converted to diffusers format on first load and saved under
+CHECKPOINT_CACHE_DIR, keyed by the file's SHA-256, the pipeline class and
+the dtype. Later loads read the converted components with from_pretrained,
+which memory-maps the safetensors instead of re-running key conversion and
+config inference.
+
+The file hash is computed once per (path, size, mtime) and remembered in
+index.json; a touched or copied file with the same content still hits.
+Entries are evicted least recently used once CHECKPOINT_CACHE_MAX_GB is
+exceeded.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+COMPLETE_MARKER = ".converted.json"
+HASH_BLOCK = 8 * 1024 * 1024
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class CheckpointCache:
+    """Disk cache of single-file checkpoints converted to diffusers format"""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def index_path(self) -> Path:
+        return self.root / "index.json"
+
+    def _read_index(self) -> Dict[str, Dict]:
+        try:
+            return json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index: Dict[str, Dict]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_name(f".index.{uuid.uuid4().hex}.tmp")
+        temp_path.write_text(json.dumps(index, indent=1))
+        os.replace(temp_path, self.index_path)
+
+    def file_hash(self, model_path: str) -> str:
+        """SHA-256 of a checkpoint, hashed only when its size or mtime changed"""
+        path = Path(model_path).resolve()
+        stat = path.stat()
+        with self._lock:
+            known = self._read_index().get(str(path))
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+
+        started_at = time.perf_counter()
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        logger.info(f"Hashed {path.name} in {time.perf_counter() - started_at:.1f}s")
+
+        with self._lock:
+            index = self._read_index()
+            index[str(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+            self._write_index(index)
+        return sha256
+
+    def entry_dir(self, model_path: str, pipeline_class: type, dtype: Any) -> Path:
+        dtype_name = str(dtype).replace("torch.", "")
+        return self.root / f"{self.file_hash(model_path)[:32]}-{pipeline_class.__name__}-{dtype_name}"
+
+    def lookup(self, model_path: str, pipeline_class: type, dtype: Any) -> Optional[Path]:
+        """Directory with the converted pipeline, None on a miss"""
+        entry = self.entry_dir(model_path, pipeline_class, dtype)
+        marker = entry / COMPLETE_MARKER
+        if not marker.exists():
+            return None
+        os.utime(marker)  # Recency for LRU eviction
+        return entry
+
+    def store(self, pipeline: Any, model_path: str, pipeline_class: type, dtype: Any) -> Optional[Path]:
+        """
+        Save a freshly converted pipeline; failures only cost the cache entry
+
+        The pipeline is written to a temporary directory and renamed into
+        place, so a crash never leaves a half-written entry behind.
+        """
+        entry = self.entry_dir(model_path, pipeline_class, dtype)
+        temp_dir = self.root / f".{entry.name}.{uuid.uuid4().hex}.tmp"
+        try:
+            started_at = time.perf_counter()
+            pipeline.save_pretrained(temp_dir, safe_serialization=True)
+            size = _dir_size(temp_dir)
+            if size > self.max_bytes:
+                logger.info(f"Converted {Path(model_path).name} ({size / 1024**3:.1f} GB) exceeds the cache limit")
+                return None
+            (temp_dir / COMPLETE_MARKER).write_text(json.dumps({
+                "source": str(Path(model_path).resolve()),
+                "pipeline_class": pipeline_class.__name__,
+                "dtype": str(dtype),
+                "size": size,
+                "created_at": time.time(),
+            }))
+            try:
+                os.replace(temp_dir, entry)
+            except OSError:
+                # Another worker converted the same checkpoint first
+                if not (entry / COMPLETE_MARKER).exists():
+                    raise
+            logger.info(
+                f"Cached converted {Path(model_path).name} ({size / 1024**3:.1f} GB) "
+                f"in {time.perf_counter() - started_at:.1f}s"
+            )
+            self.evict(keep=entry)
+            return entry
+        except Exception as e:
+            logger.warning(f"Could not cache converted checkpoint {model_path}: {e}")
+            return None
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def entries(self) -> List[Dict]:
+        """Cached conversions, most recently used first"""
+        entries = []
+        for entry in self.root.iterdir() if self.root.exists() else ():
+            marker = entry / COMPLETE_MARKER
+            try:
+                info = json.loads(marker.read_text())
+                last_used = marker.stat().st_mtime
+            except (OSError, ValueError):
+                continue
+            entries.append({"key": entry.name, "path": str(entry), "last_used": last_used, **info})
+        return sorted(entries, key=lambda e: e["last_used"], reverse=True)
+
+    def evict(self, keep: Optional[Path] = None) -> List[str]:
+        """Remove least recently used entries until the cache fits max_bytes"""
+        with self._lock:
+            entries = self.entries()
+            total = sum(e["size"] for e in entries)
+            removed = []
+            for entry in reversed(entries):
+                if total <= self.max_bytes:
+                    break
+                if keep is not None and Path(entry["path"]) == keep:
+                    continue
+                shutil.rmtree(entry["path"], ignore_errors=True)
+                total -= entry["size"]
+                removed.append(entry["key"])
+                logger.info(f"Evicted converted checkpoint {entry['key']}")
+            return removed
+
+    def clear(self) -> int:
+        with self._lock:
+            entries = self.entries()
+            for entry in entries:
+                shutil.rmtree(entry["path"], ignore_errors=True)
+            return len(entries)
+
+    def status(self) -> Dict:
+        entries = self.entries()
+        return {
+            "enabled": settings.ENABLE_CHECKPOINT_CACHE,
+            "max_bytes": self.max_bytes,
+            "total_bytes": sum(e["size"] for e in entries),
+            "entries": entries,
+        }
+
+
+# Global instance
+checkpoint_cache = CheckpointCache(
+    settings.CHECKPOINT_CACHE_DIR, int(settings.CHECKPOINT_CACHE_MAX_GB * 1024**3)
+)
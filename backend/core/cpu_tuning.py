@@ -0,0 +1,217 @@
+"""
+CPU Performance Mode
+Tuning for hosts without an accelerator: each inference worker gets its own
+slice of physical cores (kept within one NUMA node where the split allows),
+runs with as many intra-op threads as it has cores, and denoises under
+bfloat16 autocast when the CPU has native bf16 (AVX512-BF16 or AMX).
+UNet/VAE use channels_last so oneDNN picks its blocked convolution kernels;
+optionally the denoiser is fused by IPEX or by torch.compile with freezing.
+
+With VIRTUAL_DEVICES > 1 the cores are split between that many independent
+pipelines, trading per-image latency for throughput on large machines.
+"""
+import importlib.util
+import os
+import re
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Dict, List, Optional
+import logging
+
+import torch
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+FUSION_MODES = ("auto", "ipex", "compile", "none")
+
+NODE_DIR = Path("/sys/devices/system/node")
+CPU_DIR = Path("/sys/devices/system/cpu")
+
+# Native bf16 matmul support; without it bf16 is emulated and slower than fp32
+BF16_CPU_FLAGS = ("avx512_bf16", "amx_bf16")
+
+_runtime_configured = False
+
+
+def parse_cpulist(text: str) -> List[int]:
+    """Parse a kernel cpulist such as '0-3,8,10-11'"""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _physical(cpus: List[int]) -> List[int]:
+    """Drop SMT siblings: hyperthreads only add contention to oneDNN kernels"""
+    seen = set()
+    cores = []
+    for cpu in cpus:
+        try:
+            siblings = tuple(parse_cpulist((CPU_DIR / f"cpu{cpu}" / "topology" / "thread_siblings_list").read_text()))
+        except (OSError, ValueError):
+            siblings = (cpu,)
+        if siblings not in seen:
+            seen.add(siblings)
+            cores.append(cpu)
+    return cores
+
+
+def numa_nodes() -> List[List[int]]:
+    """Usable physical cores grouped by NUMA node (one group without NUMA info)"""
+    available = set(_available_cpus())
+    nodes = []
+    for node in sorted(NODE_DIR.glob("node[0-9]*"), key=lambda p: int(p.name[4:])):
+        try:
+            cpus = [c for c in parse_cpulist((node / "cpulist").read_text()) if c in available]
+        except (OSError, ValueError):
+            continue
+        if cpus:
+            nodes.append(_physical(cpus))
+    return nodes or [_physical(sorted(available))]
+
+
+def plan_core_slots(workers: int) -> List[List[int]]:
+    """
+    Split physical cores into one disjoint slot per worker
+
+    Cores are taken in node order and cut into equal contiguous runs, so a
+    worker count that is a multiple of the node count keeps every worker on
+    a single node. CPU_THREADS > 0 caps the cores per worker.
+    """
+    cores = [core for node in numa_nodes() for core in node]
+    workers = max(1, min(workers, len(cores)))
+    per_worker = len(cores) // workers
+    slots = [cores[i * per_worker:(i + 1) * per_worker] for i in range(workers)]
+    if settings.CPU_THREADS > 0:
+        slots = [slot[:settings.CPU_THREADS] for slot in slots]
+    return slots
+
+
+def configure_runtime(threads: int) -> None:
+    """
+    Process-wide thread settings; the inter-op pool can only be sized once,
+    before its first use, so later calls leave it alone
+    """
+    global _runtime_configured
+    torch.set_num_threads(threads)
+    if _runtime_configured:
+        return
+    _runtime_configured = True
+    try:
+        torch.set_num_interop_threads(settings.CPU_INTEROP_THREADS)
+    except RuntimeError as e:
+        logger.warning(f"Could not set inter-op threads: {e}")
+    logger.info(f"CPU runtime: {threads} intra-op / {settings.CPU_INTEROP_THREADS} inter-op threads")
+
+
+def bind_cores(cores: Optional[List[int]]) -> None:
+    """Pin the calling thread to its worker's cores (threads it spawns inherit it)"""
+    if not cores:
+        return
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+
+def bf16_supported() -> bool:
+    """Whether the CPU has native bf16 instructions and oneDNN is available"""
+    if not torch.backends.mkldnn.is_available():
+        return False
+    try:
+        flags = re.search(r"^flags\s*:(.*)$", Path("/proc/cpuinfo").read_text(), re.MULTILINE)
+    except OSError:
+        return False
+    return flags is not None and any(flag in flags.group(1).split() for flag in BF16_CPU_FLAGS)
+
+
+def resolve_bf16() -> bool:
+    """CPU_BF16: auto (only with native support), on, off"""
+    mode = settings.CPU_BF16.lower()
+    if mode == "auto":
+        return bf16_supported()
+    return mode in ("on", "true", "1")
+
+
+def bf16_autocast(enabled: bool) -> ContextManager:
+    """bfloat16 autocast for a CPU pipeline call, or a no-op"""
+    if not enabled:
+        return nullcontext()
+    return torch.autocast("cpu", dtype=torch.bfloat16)
+
+
+def _fusion_mode() -> str:
+    return settings.CPU_FUSION if settings.CPU_FUSION in FUSION_MODES else "auto"
+
+
+def fusion_backend() -> Optional[str]:
+    """Backend tune_pipeline fuses a denoiser with under CPU_FUSION, None when off or unavailable"""
+    mode = _fusion_mode()
+    if mode in ("auto", "ipex"):
+        return "ipex" if importlib.util.find_spec("intel_extension_for_pytorch") is not None else None
+    return "compile" if mode == "compile" else None
+
+
+def _fuse(module: torch.nn.Module, mode: str, bf16: bool) -> Optional[Any]:
+    """Return the fused module, or None when fusion is unavailable or off"""
+    if mode in ("auto", "ipex"):
+        try:
+            import intel_extension_for_pytorch as ipex
+        except ImportError:
+            if mode == "ipex":
+                logger.warning("CPU_FUSION=ipex but intel_extension_for_pytorch is not installed")
+            return None
+        return ipex.optimize(module.eval(), dtype=torch.bfloat16 if bf16 else torch.float32, inplace=True)
+    if mode == "compile":
+        # Freezing lets inductor prepack weights for oneDNN and fuse conv/linear epilogues
+        import torch._inductor.config as inductor_config
+        inductor_config.freezing = True
+        return torch.compile(module)
+    return None
+
+
+def tune_pipeline(pipeline: Any, bf16: bool) -> Dict:
+    """
+    Apply channels_last and the configured fusion to a CPU pipeline
+
+    Returns what was applied; "fusion" is the backend that rewrote the
+    denoiser, or None.
+    """
+    components = getattr(pipeline, "components", {}) or {}
+    channels_last = []
+    for name in ("unet", "vae"):
+        module = components.get(name)
+        if isinstance(module, torch.nn.Module):
+            module.to(memory_format=torch.channels_last)
+            channels_last.append(name)
+
+    mode = _fusion_mode()
+    fusion = None
+    for name in ("unet", "transformer"):
+        module = components.get(name)
+        if not isinstance(module, torch.nn.Module):
+            continue
+        try:
+            fused = _fuse(module, mode, bf16)
+        except Exception as e:
+            logger.warning(f"Could not fuse {name} ({mode}): {e}")
+            fused = None
+        if fused is not None:
+            setattr(pipeline, name, fused)
+            fusion = "compile" if mode == "compile" else "ipex"
+            logger.info(f"Fused {name} with {fusion}")
+
+    return {"bf16": bf16, "channels_last": channels_last, "fusion": fusion}
@@ -0,0 +1,144 @@
+"""
+Device Pool
+One ModelManager per accelerator with model-affinity routing, so multi-GPU
+machines use every card instead of only the first one
+"""
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Union
+import logging
+
+from .cpu_tuning import plan_core_slots
+from .gpu_monitor import gpu_monitor
+from .inference_worker import RemoteModelManager
+from .model_manager import ModelManager, model_manager
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DevicePool:
+    """Route generation requests to per-device model managers"""
+
+    def __init__(self, workers: List[ModelManager]):
+        self.workers = workers
+        self._active: Dict[int, int] = {id(w): 0 for w in workers}
+        self._completed: Dict[int, int] = {id(w): 0 for w in workers}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, primary: ModelManager) -> "DevicePool":
+        """
+        Build the pool around the existing primary manager
+
+        CUDA: one worker per visible GPU. CPU-only: VIRTUAL_DEVICES workers
+        sharing the CPU (useful for testing routing without GPUs). With
+        INFERENCE_WORKER_PROCESS every worker, the primary included, is a
+        proxy to its own child process. In CPU performance mode each worker
+        is pinned to its own slice of cores.
+        """
+        def make_worker(device: str, cpu_cores: Optional[List[int]]) -> Union[ModelManager, RemoteModelManager]:
+            if settings.INFERENCE_WORKER_PROCESS:
+                return RemoteModelManager(device, cpu_cores)
+            return ModelManager(device=device, cpu_cores=cpu_cores)
+
+        devices = [primary.device]
+        if settings.ENABLE_DEVICE_POOL:
+            gpus = gpu_monitor.list_devices()
+            if gpus:
+                devices += [d for d in gpus if d != primary.device]
+            else:
+                devices += [primary.device] * max(settings.VIRTUAL_DEVICES - 1, 0)
+
+        slots: List[Optional[List[int]]] = [None]
+        if primary.device == "cpu" and settings.CPU_PERF_MODE:
+            slots = plan_core_slots(len(devices))
+            logger.info(f"CPU core slots: {', '.join(f'{len(s)} cores from {s[0]}' for s in slots)}")
+
+        workers = []
+        for index, device in enumerate(devices):
+            cpu_cores = slots[index % len(slots)]
+            if index == 0 and not settings.INFERENCE_WORKER_PROCESS:
+                primary.cpu_cores = cpu_cores or primary.cpu_cores
+                workers.append(primary)
+            else:
+                workers.append(make_worker(device, cpu_cores))
+        mode = "process" if settings.INFERENCE_WORKER_PROCESS else "thread"
+        logger.info(f"Device pool ({mode} workers): {', '.join(w.device for w in workers)}")
+        return cls(workers)
+
+    @property
+    def primary(self) -> ModelManager:
+        """The manager that UI-level model selection applies to"""
+        return self.workers[0]
+
+    def route(self, model_key: Optional[str] = None) -> ModelManager:
+        """
+        Pick a worker for a request
+
+        Prefers the least-loaded worker that already has the model loaded
+        (requests without a model use the primary's current model). Falls back
+        to the least-loaded worker overall, or the primary if nothing is
+        loaded anywhere so the usual auto-load applies.
+        """
+        target = model_key or self.primary.current_model
+        with self._lock:
+            if target is not None:
+                holders = [w for w in self.workers if w.current_model == target]
+                if holders:
+                    return min(holders, key=self._load)
+            if model_key is None:
+                return self.primary
+            # Prefer idle workers without a model, then the least loaded one
+            return min(self.workers, key=lambda w: (self._load(w), w.current_model is not None))
+
+    def get(self, device: str) -> Optional[ModelManager]:
+        """Worker bound to a specific device name"""
+        for worker in self.workers:
+            if worker.device == device:
+                return worker
+        return None
+
+    @contextmanager
+    def acquire(self, model_key: Optional[str] = None) -> Iterator[ModelManager]:
+        """Route a request and count it against the worker while it runs or waits"""
+        worker = self.route(model_key)
+        with self._lock:
+            self._active[id(worker)] += 1
+        try:
+            yield worker
+        finally:
+            with self._lock:
+                self._active[id(worker)] -= 1
+                self._completed[id(worker)] += 1
+
+    def status(self) -> List[Dict]:
+        """Per-device status for /gpu/info"""
+        devices = []
+        for index, worker in enumerate(self.workers):
+            gpu_id = gpu_monitor.device_index(worker.device)
+            devices.append({
+                "worker": index,
+                "device": worker.device,
+                "model": worker.current_model,
+                "active_jobs": self._active[id(worker)],
+                "completed_jobs": self._completed[id(worker)],
+                "restarts": getattr(worker, "restarts", 0),
+                "cpu_cores": worker.cpu_cores,
+                "lock": worker.lock.status(),
+                "gpu": gpu_monitor.get_gpu_info(gpu_id) if gpu_id is not None else None
+            })
+        return devices
+
+    def shutdown(self) -> None:
+        """Stop worker child processes, if any"""
+        for worker in self.workers:
+            if isinstance(worker, RemoteModelManager):
+                worker.shutdown()
+
+    def _load(self, worker: ModelManager) -> int:
+        return self._active[id(worker)]
+
+
+# Global instance
+device_pool = DevicePool.from_settings(model_manager)
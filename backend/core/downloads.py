@@ -0,0 +1,462 @@
+"""
+Model Downloads
+Fetch Hugging Face model repos into MODELS_DIR/snapshots/<org>--<name>
+ahead of loading. Files are split into ranged chunks that are downloaded
+over several connections; finished chunks are recorded next to the partial
+file so an interrupted download resumes where it stopped. Each file is
+hash-verified before it is renamed into place, and a snapshot only counts as
+downloaded once every file is.
+
+All URLs derive from HF_ENDPOINT, so a local stand-in server (or mirror)
+can serve the hub API and files.
+"""
+import hashlib
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+COMPLETE_MARKER = ".complete.json"
+HTTP_TIMEOUT = 30
+READ_BLOCK = 1024 * 1024
+
+# Weight formats: only un-suffixed .safetensors are loaded (use_safetensors=True, no variant)
+WEIGHT_SUFFIXES = (".safetensors", ".bin", ".ckpt", ".pt", ".pth", ".msgpack", ".onnx", ".onnx_data", ".h5", ".gguf")
+SKIPPED_SUFFIXES = (".md", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".mp4", ".gitattributes")
+
+ACTIVE_STATES = ("listing", "downloading")
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+def snapshot_dir(repo_id: str) -> Path:
+    return settings.MODELS_DIR / "snapshots" / repo_id.replace("/", "--")
+
+
+def is_downloaded(repo_id: str) -> bool:
+    return (snapshot_dir(repo_id) / COMPLETE_MARKER).exists()
+
+
+def resolve_model_source(repo_id: str) -> Optional[str]:
+    """
+    What to pass to from_pretrained for a hub model, None if it is not on disk
+
+    A complete snapshot wins; models cached by earlier versions (inline
+    from_pretrained downloads) keep loading from the Hugging Face cache.
+    """
+    if is_downloaded(repo_id):
+        return str(snapshot_dir(repo_id))
+    try:
+        from huggingface_hub import try_to_load_from_cache
+        if isinstance(try_to_load_from_cache(repo_id, "model_index.json", cache_dir=settings.MODELS_DIR), str):
+            return repo_id
+    except Exception as e:
+        logger.debug(f"Hugging Face cache lookup failed for {repo_id}: {e}")
+    return None
+
+
+def target_path(root: Path, path: str) -> Path:
+    """Where a repo file goes; listings naming paths outside the snapshot are rejected"""
+    target = (root / path).resolve()
+    try:
+        target.relative_to(root.resolve())
+    except ValueError:
+        raise IOError(f"Refusing to write {path!r} outside the snapshot directory")
+    return target
+
+
+def select_files(entries: List[Dict], model_index: Optional[Dict]) -> List[Dict]:
+    """
+    Repo files from_pretrained needs
+
+    With a model_index.json that is the index itself plus the folders of
+    the components it lists; weights are limited to un-suffixed safetensors.
+    """
+    components = None
+    if model_index is not None:
+        components = {
+            name for name, value in model_index.items()
+            if isinstance(value, list) and value and value[0] is not None
+        }
+    selected = []
+    for entry in entries:
+        path = entry["path"]
+        name = path.rsplit("/", 1)[-1]
+        suffix = os.path.splitext(name)[1].lower()
+        if components is not None:
+            if "/" not in path:
+                if path != "model_index.json":
+                    continue
+            elif path.split("/", 1)[0] not in components:
+                continue
+        if suffix in SKIPPED_SUFFIXES or name.startswith("."):
+            continue
+        # 'model.fp16.safetensors' style variants hold the same weights again
+        if suffix in WEIGHT_SUFFIXES and (suffix != ".safetensors" or name.count(".") > 1):
+            continue
+        selected.append(entry)
+    return selected
+
+
+def git_blob_sha1(path: Path) -> str:
+    """Git object id of a file (non-LFS files are identified by this on the hub)"""
+    digest = hashlib.sha1(f"blob {path.stat().st_size}\0".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HubClient:
+    """Minimal Hugging Face hub client over urllib (repo listing and file ranges)"""
+
+    def __init__(self, endpoint: str, token: Optional[str] = None):
+        self.endpoint = endpoint.rstrip("/")
+        self.token = token
+
+    def _open(self, url: str, headers: Optional[Dict] = None):
+        request = urllib.request.Request(url, headers=dict(headers or {}))
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        return urllib.request.urlopen(request, timeout=HTTP_TIMEOUT)
+
+    def _json(self, url: str):
+        with self._open(url) as response:
+            return json.load(response), response.headers.get("Link")
+
+    def list_files(self, repo_id: str, revision: str = "main") -> Tuple[str, List[Dict]]:
+        """Commit sha of the revision and its files with size and expected hashes"""
+        info, _ = self._json(f"{self.endpoint}/api/models/{repo_id}/revision/{urllib.parse.quote(revision, safe='')}")
+        commit = info["sha"]
+        files = []
+        url = f"{self.endpoint}/api/models/{repo_id}/tree/{commit}?recursive=true"
+        while url:
+            entries, link = self._json(url)
+            for entry in entries:
+                if entry.get("type") != "file":
+                    continue
+                lfs = entry.get("lfs") or {}
+                files.append({
+                    "path": entry["path"],
+                    "size": lfs.get("size", entry.get("size", 0)),
+                    "sha256": lfs.get("oid"),
+                    "oid": None if lfs else entry.get("oid"),
+                })
+            # Large repos are paginated: Link: <url>; rel="next"
+            url = None
+            for part in (link or "").split(","):
+                if 'rel="next"' in part:
+                    url = part.split(";")[0].strip().strip("<>")
+        return commit, files
+
+    def file_url(self, repo_id: str, commit: str, path: str) -> str:
+        return f"{self.endpoint}/{repo_id}/resolve/{commit}/{urllib.parse.quote(path)}"
+
+    def read(self, url: str) -> bytes:
+        with self._open(url) as response:
+            return response.read()
+
+    def open_range(self, url: str, start: int, end: int):
+        """Response for bytes start..end (inclusive); servers must honour the range"""
+        response = self._open(url, {"Range": f"bytes={start}-{end}"})
+        if response.status != 206 and not (response.status == 200 and start == 0):
+            response.close()
+            raise IOError(f"Server ignored range request ({response.status})")
+        return response
+
+
+class _PartialFile:
+    """A file being downloaded: preallocated .part plus a JSON record of finished chunks"""
+
+    def __init__(self, target: Path, entry: Dict, chunk_size: int):
+        self.target = target
+        self.entry = entry
+        self.size = entry["size"]
+        self.chunk_size = chunk_size
+        self.part_path = target.with_name(target.name + ".part")
+        self.state_path = target.with_name(target.name + ".part.json")
+        self.chunks = max(1, -(-self.size // chunk_size))
+        self.done = set()
+        self._lock = threading.Lock()
+
+        expected = {"size": self.size, "chunk_size": chunk_size, "sha256": entry["sha256"], "oid": entry["oid"]}
+        try:
+            state = json.loads(self.state_path.read_text())
+            if {k: state.get(k) for k in expected} == expected and self.part_path.exists():
+                self.done = set(state["done"])
+        except (OSError, ValueError, KeyError):
+            pass
+        self._state = expected
+        if not self.done:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.part_path, "wb") as f:
+                f.truncate(self.size)
+
+    def chunk_range(self, index: int) -> Tuple[int, int]:
+        start = index * self.chunk_size
+        return start, min(start + self.chunk_size, self.size) - 1
+
+    @property
+    def pending(self) -> List[int]:
+        return [i for i in range(self.chunks) if i not in self.done]
+
+    @property
+    def done_bytes(self) -> int:
+        return sum(self.chunk_range(i)[1] - self.chunk_range(i)[0] + 1 for i in self.done) if self.size else 0
+
+    def mark_done(self, index: int) -> bool:
+        """Record a finished chunk; True when it was the last one"""
+        with self._lock:
+            self.done.add(index)
+            temp_path = self.state_path.with_suffix(".tmp")
+            temp_path.write_text(json.dumps({**self._state, "done": sorted(self.done)}))
+            os.replace(temp_path, self.state_path)
+            return len(self.done) == self.chunks
+
+    def finish(self) -> None:
+        """Verify the assembled file and move it into place"""
+        if self.entry["sha256"]:
+            actual, expected = sha256_file(self.part_path), self.entry["sha256"]
+        elif self.entry["oid"]:
+            actual, expected = git_blob_sha1(self.part_path), self.entry["oid"]
+        else:
+            actual = expected = None
+        if actual != expected:
+            self.part_path.unlink(missing_ok=True)
+            self.state_path.unlink(missing_ok=True)
+            raise IOError(f"Hash mismatch for {self.entry['path']}: expected {expected}, got {actual}")
+        os.replace(self.part_path, self.target)
+        self.state_path.unlink(missing_ok=True)
+
+
+class DownloadManager:
+    """Background repo downloads with progress, one job per repo"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict] = {}
+        self._stop: Dict[str, threading.Event] = {}
+        self._cancelled = set()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> HubClient:
+        return HubClient(settings.HF_ENDPOINT, settings.HF_TOKEN)
+
+    def start(self, repo_id: str, revision: str = "main") -> Dict:
+        """Start (or resume) downloading a repo; no-op if it is running or complete"""
+        with self._lock:
+            job = self._jobs.get(repo_id)
+            if job and job["status"] in ACTIVE_STATES:
+                return dict(job)
+            if is_downloaded(repo_id):
+                return self._complete_status(repo_id)
+            job = {
+                "repo_id": repo_id,
+                "revision": revision,
+                "commit": None,
+                "status": "listing",
+                "files_total": 0,
+                "files_done": 0,
+                "total_bytes": 0,
+                "downloaded_bytes": 0,
+                "resumed_bytes": 0,
+                "started_at": time.time(),
+                "finished_at": None,
+                "error": None,
+            }
+            self._jobs[repo_id] = job
+            self._stop[repo_id] = threading.Event()
+            self._cancelled.discard(repo_id)
+        threading.Thread(target=self._run, args=(repo_id,), name=f"download-{repo_id}", daemon=True).start()
+        return dict(job)
+
+    def cancel(self, repo_id: str) -> bool:
+        """Stop a running download; finished chunks are kept for resuming"""
+        with self._lock:
+            job = self._jobs.get(repo_id)
+            if job is None or job["status"] not in ACTIVE_STATES:
+                return False
+            self._cancelled.add(repo_id)
+            self._stop[repo_id].set()
+            return True
+
+    def _complete_status(self, repo_id: str) -> Dict:
+        try:
+            marker = json.loads((snapshot_dir(repo_id) / COMPLETE_MARKER).read_text())
+        except (OSError, ValueError):
+            marker = {}
+        return {
+            "repo_id": repo_id,
+            "status": "complete",
+            "commit": marker.get("commit"),
+            "files_total": len(marker.get("files", [])),
+            "files_done": len(marker.get("files", [])),
+            "total_bytes": marker.get("total_bytes"),
+            "downloaded_bytes": marker.get("total_bytes"),
+            "error": None,
+        }
+
+    def status(self, repo_id: str) -> Dict:
+        with self._lock:
+            job = self._jobs.get(repo_id)
+            job = dict(job) if job else None
+        if job is None:
+            if is_downloaded(repo_id):
+                return self._complete_status(repo_id)
+            return {"repo_id": repo_id, "status": "not_downloaded", "error": None}
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+        session_bytes = job["downloaded_bytes"] - job["resumed_bytes"]
+        speed = session_bytes / elapsed if elapsed > 0 else 0.0
+        remaining = job["total_bytes"] - job["downloaded_bytes"]
+        job["bytes_per_second"] = round(speed)
+        job["eta_seconds"] = round(remaining / speed) if speed > 0 and job["status"] == "downloading" else None
+        job["progress"] = round(job["downloaded_bytes"] / job["total_bytes"], 4) if job["total_bytes"] else 0.0
+        return job
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            repo_ids = list(self._jobs)
+        return [self.status(repo_id) for repo_id in repo_ids]
+
+    def _update(self, repo_id: str, **fields) -> None:
+        with self._lock:
+            self._jobs[repo_id].update(fields)
+
+    def _add_bytes(self, repo_id: str, count: int) -> None:
+        with self._lock:
+            self._jobs[repo_id]["downloaded_bytes"] += count
+
+    def _run(self, repo_id: str) -> None:
+        stop = self._stop[repo_id]
+        client = self.client
+        try:
+            commit, entries = client.list_files(repo_id, self._jobs[repo_id]["revision"])
+            model_index = None
+            if any(e["path"] == "model_index.json" for e in entries):
+                model_index = json.loads(client.read(client.file_url(repo_id, commit, "model_index.json")))
+            files = select_files(entries, model_index)
+
+            root = snapshot_dir(repo_id)
+            chunk_size = settings.DOWNLOAD_CHUNK_MB * 1024 * 1024
+            partials, done_files, done_bytes = [], 0, 0
+            for entry in files:
+                target = target_path(root, entry["path"])
+                if target.exists() and target.stat().st_size == entry["size"]:
+                    done_files += 1
+                    done_bytes += entry["size"]
+                    continue
+                partial = _PartialFile(target, entry, chunk_size)
+                partials.append(partial)
+                done_bytes += partial.done_bytes
+            self._update(
+                repo_id, commit=commit, status="downloading", files_total=len(files), files_done=done_files,
+                total_bytes=sum(e["size"] for e in files), downloaded_bytes=done_bytes, resumed_bytes=done_bytes
+            )
+            if done_bytes:
+                logger.info(f"Resuming {repo_id} at {done_bytes / 1024**3:.2f} GB")
+
+            tasks = [(partial, index) for partial in partials for index in partial.pending]
+            # Partials whose chunks were all done before an interrupted verify
+            finished = [partial for partial in partials if not partial.pending]
+            with ThreadPoolExecutor(max_workers=settings.DOWNLOAD_CONNECTIONS) as pool:
+                futures = [
+                    pool.submit(self._fetch_chunk, client, repo_id, commit, partial, index, stop)
+                    for partial, index in tasks
+                ]
+                futures += [pool.submit(self._finish_file, repo_id, partial) for partial in finished]
+                error = None
+                for future in as_completed(futures):
+                    e = future.exception()
+                    if e is not None and error is None and not isinstance(e, DownloadCancelled):
+                        error = e
+                        stop.set()  # Other connections stop early; their finished chunks are kept
+            if repo_id in self._cancelled:
+                raise DownloadCancelled()
+            if error is not None:
+                raise error
+
+            (root / COMPLETE_MARKER).write_text(json.dumps({
+                "repo_id": repo_id,
+                "commit": commit,
+                "files": [e["path"] for e in files],
+                "total_bytes": sum(e["size"] for e in files),
+                "completed_at": time.time(),
+            }))
+            self._update(repo_id, status="complete", finished_at=time.time())
+            logger.info(f"Downloaded {repo_id} ({commit[:8]})")
+        except DownloadCancelled:
+            self._update(repo_id, status="cancelled", finished_at=time.time())
+            logger.info(f"Download of {repo_id} cancelled")
+        except Exception as e:
+            self._update(repo_id, status="failed", error=str(e), finished_at=time.time())
+            logger.error(f"Download of {repo_id} failed: {e}")
+
+    def _fetch_chunk(self, client: HubClient, repo_id: str, commit: str, partial: _PartialFile,
+                     index: int, stop: threading.Event) -> None:
+        start, end = partial.chunk_range(index)
+        url = client.file_url(repo_id, commit, partial.entry["path"])
+        for attempt in range(settings.DOWNLOAD_RETRIES + 1):
+            if stop.is_set():
+                raise DownloadCancelled()
+            written = 0
+            try:
+                if partial.size:
+                    with client.open_range(url, start, end) as response, open(partial.part_path, "r+b") as f:
+                        f.seek(start)
+                        while written < end - start + 1:
+                            if stop.is_set():
+                                raise DownloadCancelled()
+                            block = response.read(min(READ_BLOCK, end - start + 1 - written))
+                            if not block:
+                                raise IOError(f"Connection closed after {written} bytes")
+                            f.write(block)
+                            written += len(block)
+                            self._add_bytes(repo_id, len(block))
+                break
+            # IncompleteRead and other protocol errors are not OSErrors
+            except (OSError, urllib.error.URLError, http.client.HTTPException) as e:
+                self._add_bytes(repo_id, -written)
+                if isinstance(e, urllib.error.HTTPError) and e.code in (401, 403, 404):
+                    raise IOError(f"{partial.entry['path']}: HTTP {e.code} (gated model? set HF_TOKEN)")
+                if attempt == settings.DOWNLOAD_RETRIES:
+                    raise
+                logger.warning(f"Retrying {partial.entry['path']} chunk {index}: {e}")
+                stop.wait(min(2 ** attempt, 30))
+        if partial.mark_done(index):
+            self._finish_file(repo_id, partial)
+
+    def _finish_file(self, repo_id: str, partial: _PartialFile) -> None:
+        try:
+            partial.finish()
+        except IOError:
+            # The file starts over on the next attempt
+            self._add_bytes(repo_id, -partial.size)
+            raise
+        with self._lock:
+            self._jobs[repo_id]["files_done"] += 1
+
+
+# Global instance
+download_manager = DownloadManager()
@@ -1,7 +1,9 @@
 import torch
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import logging
 
+from .telemetry import telemetry
+
 logger = logging.getLogger(__name__)
 
 class GPUMonitor:
@@ -11,8 +13,8 @@ class GPUMonitor:
         self.has_cuda = torch.cuda.is_available()
         self.device_count = torch.cuda.device_count() if self.has_cuda else 0
         
-    def get_gpu_info(self) -> Dict:
-        """Get current GPU information"""
+    def get_gpu_info(self, gpu_id: Optional[int] = None) -> Dict:
+        """Get GPU information (current device unless gpu_id is given)"""
         if not self.has_cuda:
             return {
                 "available": False,
@@ -21,7 +23,14 @@ class GPUMonitor:
             }
         
         try:
-            gpu_id = torch.cuda.current_device()
+            if gpu_id is None:
+                gpu_id = torch.cuda.current_device()
+            
+            # Served from the background sampler when it is running
+            sampled = telemetry.device_info(gpu_id) if telemetry.running else None
+            if sampled is not None:
+                return self._format_sample(sampled)
+            
             gpu_name = torch.cuda.get_device_name(gpu_id)
             
             # Memory stats
@@ -50,6 +59,45 @@ class GPUMonitor:
                 "error": str(e)
             }
     
+    @staticmethod
+    def _format_sample(sample: Dict) -> Dict:
+        """Telemetry sample in the get_gpu_info shape, plus the extra counters"""
+        total = sample["total_mb"] / 1024
+        allocated = sample["allocated_mb"] / 1024
+        info = {
+            "available": True,
+            "device": f"cuda:{sample['index']}",
+            "name": sample["name"],
+            "memory": {
+                "total_gb": round(total, 2),
+                "allocated_gb": round(allocated, 2),
+                "reserved_gb": round(sample["reserved_mb"] / 1024, 2),
+                "free_gb": round(total - allocated, 2),
+                "utilization_percent": round((allocated / total) * 100, 1) if total else 0.0
+            },
+            "compute_capability": sample["compute_capability"],
+            "sampled_at": sample["sampled_at"]
+        }
+        if "used_mb" in sample:
+            info["memory"]["used_gb"] = round(sample["used_mb"] / 1024, 2)
+        for key in ("gpu_util_percent", "memory_util_percent", "temperature_c",
+                    "power_w", "power_limit_w", "sm_clock_mhz", "memory_clock_mhz"):
+            if key in sample:
+                info[key] = sample[key]
+        return info
+    
+    def get_free_memory(self, device: str = "cuda") -> Optional[int]:
+        """Get free device memory in bytes, None if it cannot be queried"""
+        if not self.has_cuda or not device.startswith("cuda"):
+            return None
+        
+        try:
+            free, _total = torch.cuda.mem_get_info(torch.device(device))
+            return free
+        except Exception as e:
+            logger.warning(f"Could not query free memory for {device}: {e}")
+            return None
+    
     def clear_cache(self):
         """Clear GPU cache"""
         if self.has_cuda:
@@ -57,6 +105,19 @@ class GPUMonitor:
             torch.cuda.synchronize()
             logger.info("GPU cache cleared")
     
+    def list_devices(self) -> List[str]:
+        """All CUDA devices, the first one as plain 'cuda' like get_optimal_device()"""
+        if not self.has_cuda:
+            return []
+        return ["cuda"] + [f"cuda:{i}" for i in range(1, self.device_count)]
+    
+    @staticmethod
+    def device_index(device: str) -> Optional[int]:
+        """CUDA index of a device string ('cuda' -> 0), None for non-CUDA devices"""
+        if not device.startswith("cuda"):
+            return None
+        return int(device.split(":")[1]) if ":" in device else 0
+    
     def get_optimal_device(self) -> str:
         """Get optimal device for inference"""
         if self.has_cuda:
@@ -0,0 +1,166 @@
+"""
+History Export / Import
+Streaming NDJSON and tar archives of the generation history. Rows and
+images are handled one at a time so memory use does not grow with the
+size of the history.
+
+Archive layout (tar): for every generation its image as images/<filename>
+followed by its metadata as records/<id>.json. NDJSON exports carry the
+metadata lines only.
+"""
+import hashlib
+import io
+import json
+import tarfile
+import time
+import uuid
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
+
+# Rows read from the database per query while exporting
+EXPORT_BATCH_SIZE = 500
+
+# Rows inserted per transaction while importing
+IMPORT_BATCH_SIZE = 200
+
+CHUNK_SIZE = 1024 * 1024
+
+# Generation columns carried in exports (file paths are machine specific)
+EXPORT_FIELDS = (
+    "prompt", "negative_prompt", "model_key", "width", "height", "steps",
+    "guidance_scale", "seed", "scheduler", "denoise_strength", "cache_key",
+    "peak_memory_mb", "metadata", "created_at", "content_hash",
+)
+
+REQUIRED_FIELDS = ("prompt", "model_key", "width", "height", "steps", "guidance_scale")
+
+
+def hash_file(path: Path) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_record(row: Dict) -> Dict:
+    """Portable metadata for one history row, hashing the image if it has no hash yet"""
+    record = {field: row.get(field) for field in EXPORT_FIELDS}
+    path = Path(row["file_path"])
+    record["filename"] = path.name
+    if not record["content_hash"] and path.exists():
+        record["content_hash"] = hash_file(path)
+    return record
+
+
+class _ChunkBuffer:
+    """Write-only file object collecting bytes until they are drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class TarExporter:
+    """Build a tar stream incrementally; every call returns the bytes produced so far"""
+
+    def __init__(self):
+        self._buffer = _ChunkBuffer()
+        self._tar = tarfile.open(fileobj=self._buffer, mode="w|")
+
+    def add_generation(self, row: Dict) -> bytes:
+        record = export_record(row)
+        path = Path(row["file_path"])
+        if path.exists():
+            info = tarfile.TarInfo(f"images/{path.name}")
+            info.size = path.stat().st_size
+            info.mtime = int(path.stat().st_mtime)
+            with open(path, "rb") as f:
+                self._tar.addfile(info, f)
+
+        data = json.dumps(record).encode()
+        info = tarfile.TarInfo(f"records/{row['id']}.json")
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(data))
+        return self._buffer.drain()
+
+    def close(self) -> bytes:
+        self._tar.close()
+        return self._buffer.drain()
+
+
+def _safe_name(name: str) -> str:
+    """Base name of an archive member or record filename, refusing anything odd"""
+    name = PurePosixPath(name.replace("\\", "/")).name
+    if not name or name.startswith("."):
+        raise ValueError(f"Invalid file name {name!r}")
+    return name
+
+
+def _spool_image(source: BinaryIO, outputs_dir: Path) -> Tuple[Path, str]:
+    """Copy an archive member to a temporary file in outputs_dir, hashing it on the way"""
+    digest = hashlib.sha256()
+    temp_path = outputs_dir / f".import-{uuid.uuid4().hex}.part"
+    with open(temp_path, "wb") as f:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            f.write(chunk)
+    return temp_path, digest.hexdigest()
+
+
+def read_import(fileobj: BinaryIO, outputs_dir: Path) -> Iterator[Tuple[Any, ...]]:
+    """
+    Parse an export in a single forward pass
+
+    Yields ("image", filename, sha256, temp_path) for archived images, which
+    are spooled to a temporary file the caller moves into storage, and
+    ("record", dict) for every metadata record. NDJSON and (optionally
+    compressed) tar exports are accepted.
+    """
+    first = fileobj.read(1)
+    fileobj.seek(0)
+    if first == b"{":
+        for line in io.TextIOWrapper(fileobj, encoding="utf-8"):
+            if line.strip():
+                yield ("record", json.loads(line))
+        return
+
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            source = tar.extractfile(member)
+            if member.name.startswith("images/"):
+                temp_path, content_hash = _spool_image(source, outputs_dir)
+                yield ("image", _safe_name(member.name), content_hash, temp_path)
+            elif member.name.startswith("records/"):
+                yield ("record", json.loads(source.read()))
+
+
+def import_row(record: Dict, file_path: Path) -> Dict:
+    """Validate an exported record and turn it into database column values"""
+    missing = [field for field in REQUIRED_FIELDS if record.get(field) is None]
+    if missing:
+        raise ValueError(f"Record is missing {', '.join(missing)}")
+    row = {field: record.get(field) for field in EXPORT_FIELDS}
+    if isinstance(row["metadata"], (dict, list)):
+        row["metadata"] = json.dumps(row["metadata"])
+    row["file_path"] = str(file_path)
+    row["file_size"] = None  # Backfilled by the output GC
+    return row
+
+
+def record_filename(record: Dict) -> Optional[str]:
+    """Image file name a record refers to, None if it has none"""
+    filename = record.get("filename")
+    return _safe_name(filename) if filename else None
@@ -0,0 +1,419 @@
+"""
+Out-of-Process Inference Worker
+Run a ModelManager in a supervised child process so model loads and hard
+CUDA errors cannot take the API down. Generated images come back through
+shared memory blocks instead of being pickled through the pipe. This is a
+copy-based transport: the child copies the pixels into a block and the
+parent copies them out into a PIL image (PIL keeps RGB in its own padded
+layout, so it cannot wrap the block), after which the block is freed.
+"""
+import multiprocessing as mp
+import os
+import threading
+import time
+import uuid
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+import logging
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .model_manager import ModelManager
+from .offload import OffloadStats
+from .preemption import PriorityLock
+
+logger = logging.getLogger(__name__)
+
+# Methods whose result carries an "images" iterator to stream back
+IMAGE_METHODS = ("generate_image", "generate_img2img", "generate_hires", "generate_sweep")
+
+# How often the supervisor checks that the child is alive (seconds)
+SUPERVISE_INTERVAL = 2.0
+
+
+def _create_block(name: str, size: int) -> shared_memory.SharedMemory:
+    """Create a shared block that the parent, not this process' resource tracker, unlinks"""
+    try:
+        return shared_memory.SharedMemory(name=name, create=True, size=size, track=False)
+    except TypeError:
+        # Python < 3.13 has no track flag; unregister the block by its POSIX name instead
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        if os.name == "posix":
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(f"/{shm.name}", "shared_memory")
+        return shm
+
+
+def _send_image(conn: Any, image: Image.Image, name: str) -> None:
+    """Copy an image into a new shared memory block and announce it"""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    array = np.asarray(image, dtype=np.uint8)
+    shm = _create_block(name, array.nbytes)
+    try:
+        np.ndarray(array.shape, dtype=np.uint8, buffer=shm.buf)[...] = array
+        conn.send(("image", shm.name, array.shape))
+    finally:
+        shm.close()
+
+
+def _unlink_block(name: str) -> bool:
+    """Free a shared block that will not be read; False if it does not exist"""
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    shm.unlink()
+    return True
+
+
+def _state(manager: ModelManager) -> Dict:
+    """Attributes mirrored on the parent-side proxy"""
+    return {
+        "current_model": manager.current_model,
+        "offload_mode": manager.offload_mode,
+        "precision": manager.precision,
+        "quantization": manager.quantization,
+        "cpu_bf16": manager.cpu_bf16,
+        "cpu_tuning": manager.cpu_tuning,
+        "model_family": manager.model_family,
+        "offload_stats": manager.offload_stats.get(),
+        "loaded_loras": manager.loaded_loras,
+    }
+
+
+def _worker_main(conn: Any, device: str, cpu_cores: Optional[List[int]], block_prefix: str) -> None:
+    """Child process loop: execute ModelManager calls sent over the pipe"""
+    manager = ModelManager(device=device, cpu_cores=cpu_cores)
+    conn.send(("ready", _state(manager)))
+    blocks = 0
+
+    while True:
+        try:
+            method, args, kwargs = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        try:
+            if kwargs.pop("_progress", False):
+                kwargs["progress"] = lambda stage, **fields: conn.send(("progress", stage, fields))
+
+            result = getattr(manager, method)(*args, **kwargs)
+
+            if method in IMAGE_METHODS and result.get("success"):
+                # Metadata first, then one shared block per image as it decodes
+                images = result.pop("images")
+                conn.send(("stream", result, _state(manager)))
+                for image in images:
+                    # Sequential names let the parent find a block this process dies holding
+                    _send_image(conn, image, f"{block_prefix}{blocks}")
+                    blocks += 1
+                    del image
+                conn.send(("end", None, _state(manager)))
+            else:
+                conn.send(("result", result, _state(manager)))
+        except Exception as e:
+            conn.send(("error", str(e), _state(manager)))
+
+
+class WorkerCrashed(RuntimeError):
+    """The child process died during a call"""
+
+
+class ImageStream:
+    """
+    Images of one call, read from the child as they arrive
+
+    The stream holds the worker lock taken by the call that produced it
+    until it is exhausted or closed. Consumers must close it when they stop
+    early (the routes do so in a finally) so the worker is not left locked.
+    """
+
+    def __init__(self, worker: "RemoteModelManager"):
+        self._worker = worker
+        self._open = True
+
+    def __iter__(self) -> "ImageStream":
+        return self
+
+    def __next__(self) -> Image.Image:
+        if not self._open:
+            raise StopIteration
+        try:
+            image = self._worker._next_image()
+        except BaseException:
+            self._finish()
+            raise
+        if image is None:
+            self._finish()
+            raise StopIteration
+        return image
+
+    def close(self) -> None:
+        """Discard the images not read yet and release the worker"""
+        if not self._open:
+            return
+        try:
+            while self._worker._next_image(discard=True) is not None:
+                pass
+        except RuntimeError as e:
+            logger.warning(f"Abandoned image stream ended with an error: {e}")
+        finally:
+            self._finish()
+
+    def _finish(self) -> None:
+        if self._open:
+            self._open = False
+            # Release the hold taken by the _call that produced this stream
+            self._worker._pending = None
+            self._worker.lock.release()
+
+
+class RemoteModelManager:
+    """
+    Parent-side proxy with the ModelManager interface used by the routes
+
+    Calls are forwarded to a child process over a pipe. Read-only helpers
+    (current model info, model list, offload info) run locally on mirrored
+    state so they never wait for a running generation.
+    """
+
+    AVAILABLE_MODELS = ModelManager.AVAILABLE_MODELS
+    SCHEDULER_MAP = ModelManager.SCHEDULER_MAP
+
+    # Local implementations working on mirrored attributes
+    get_current_model_info = ModelManager.get_current_model_info
+    list_available_models = ModelManager.list_available_models
+    get_offload_info = ModelManager.get_offload_info
+    is_video_model = ModelManager.is_video_model
+    can_run_while_suspended = ModelManager.can_run_while_suspended
+    lora_signature = staticmethod(ModelManager.lora_signature)
+
+    def __init__(self, device: str, cpu_cores: Optional[List[int]] = None):
+        self.device = device
+        self.cpu_cores = cpu_cores
+        self.dtype = torch.float16 if device.startswith("cuda") else torch.float32
+        self.lock = PriorityLock()  # Serializes calls and image streams, by request priority
+        self.current_model: Optional[str] = None
+        self.offload_mode: str = "none"
+        self.precision: str = "none"
+        self.quantization: Optional[Dict] = None
+        self.cpu_bf16 = False
+        self.cpu_tuning: Optional[Dict] = None
+        self.model_family: Optional[str] = None
+        self.loaded_loras: list = []
+        self.offload_stats = OffloadStats()
+        self.restarts = 0
+
+        self._ctx = mp.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._pending: Optional[ImageStream] = None
+        self._block_prefix = ""
+        self._blocks_announced = 0
+        self._supervisor = None
+
+    # Process management
+    def start(self) -> None:
+        """Start the child process and the supervisor thread"""
+        with self.lock:
+            if self._process is not None and self._process.is_alive():
+                return
+            parent_conn, child_conn = self._ctx.Pipe()
+            # Short enough for macOS' 31 character limit on shared memory names
+            self._block_prefix = f"gen_{uuid.uuid4().hex[:8]}_"
+            self._blocks_announced = 0
+            self._process = self._ctx.Process(
+                target=_worker_main,
+                args=(child_conn, self.device, self.cpu_cores, self._block_prefix),
+                name=f"inference-worker-{self.device}",
+                daemon=True
+            )
+            self._process.start()
+            child_conn.close()
+            self._conn = parent_conn
+
+            _, state = self._conn.recv()
+            self._apply_state(state)
+            logger.info(f"Inference worker for {self.device} started (pid {self._process.pid})")
+
+        if self._supervisor is None:
+            self._supervisor = threading.Thread(
+                target=self._supervise, name=f"worker-supervisor-{self.device}", daemon=True
+            )
+            self._supervisor.start()
+
+    def _supervise(self) -> None:
+        """Restart the child if it dies while idle"""
+        while True:
+            time.sleep(SUPERVISE_INTERVAL)
+            process = self._process
+            if process is not None and not process.is_alive() and self.lock.acquire(blocking=False):
+                try:
+                    if not self._process.is_alive():
+                        self._restart(f"exit code {self._process.exitcode}")
+                except Exception as e:
+                    logger.error(f"Could not restart inference worker for {self.device}: {e}")
+                finally:
+                    self.lock.release()
+
+    def _restart(self, reason: str) -> None:
+        """Replace a dead child; its loaded model is gone, so reset mirrored state"""
+        logger.error(f"Inference worker for {self.device} died ({reason}), restarting")
+        self.restarts += 1
+        self._pending = None
+        if self._conn is not None:
+            self._conn.close()
+        if self._process is not None and self._process.is_alive():
+            self._process.kill()
+        if self._process is not None:
+            self._process.join(5)
+            # Blocks are freed as they are read, so any left over follow the last one read
+            while _unlink_block(f"{self._block_prefix}{self._blocks_announced}"):
+                self._blocks_announced += 1
+        self._process = None
+        self.current_model = None
+        self.model_family = None
+        self.loaded_loras = []
+        self.start()
+
+    def _apply_state(self, state: Dict) -> None:
+        self.current_model = state["current_model"]
+        self.offload_mode = state["offload_mode"]
+        self.precision = state["precision"]
+        self.quantization = state["quantization"]
+        self.cpu_bf16 = state["cpu_bf16"]
+        self.cpu_tuning = state["cpu_tuning"]
+        self.model_family = state["model_family"]
+        self.loaded_loras = state["loaded_loras"]
+        self.offload_stats._stats = state["offload_stats"]
+
+    # RPC
+    def _call(self, method: str, *args, progress=None, **kwargs) -> Any:
+        """
+        Forward a call to the child
+
+        Image results come back as a lazy stream; the lock stays held until
+        the stream is exhausted so no other call can interleave on the pipe.
+        """
+        self.lock.acquire()
+        try:
+            self._drain_pending()
+            self.start()
+            if progress is not None:
+                kwargs["_progress"] = True
+            self._conn.send((method, args, kwargs))
+            return self._receive(progress)
+        except (EOFError, OSError, WorkerCrashed) as e:
+            self._restart(str(e) or type(e).__name__)
+            return {"success": False, "error": "Inference worker crashed and was restarted"}
+        finally:
+            if self._pending is None:
+                self.lock.release()
+
+    def _receive(self, progress) -> Any:
+        """Read messages until the call's result or its first image"""
+        while True:
+            message = self._recv()
+            kind = message[0]
+            if kind == "progress":
+                if progress is not None:
+                    progress(message[1], **message[2])
+            elif kind == "stream":
+                # The stream takes over the rest of the call
+                self._apply_state(message[2])
+                self._pending = ImageStream(self)
+                return {**message[1], "images": self._pending}
+            elif kind == "result":
+                self._apply_state(message[2])
+                return message[1]
+            elif kind == "error":
+                self._apply_state(message[2])
+                raise RuntimeError(message[1])
+
+    def _recv(self) -> Any:
+        if not self._conn.poll(None):
+            raise WorkerCrashed("pipe closed")
+        return self._conn.recv()
+
+    def _next_image(self, discard: bool = False) -> Optional[Image.Image]:
+        """Read the stream up to its next image; None at the end (discard frees the images instead)"""
+        try:
+            while True:
+                message = self._recv()
+                if message[0] == "image":
+                    self._blocks_announced += 1
+                    if not discard:
+                        return self._read_image(message[1], message[2])
+                    _unlink_block(message[1])
+                elif message[0] == "end":
+                    self._apply_state(message[2])
+                    return None
+                elif message[0] == "error":
+                    self._apply_state(message[2])
+                    raise RuntimeError(message[1])
+        except (EOFError, OSError, WorkerCrashed) as e:
+            self._restart(str(e) or type(e).__name__)
+            raise RuntimeError("Inference worker crashed during generation")
+
+    @staticmethod
+    def _read_image(name: str, shape: tuple) -> Image.Image:
+        """Copy an image out of its shared block, then free the block"""
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            array = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+            # PIL repacks RGB into its own layout here, so the block can go
+            image = Image.fromarray(array, mode="RGB")
+            del array
+        finally:
+            shm.close()
+            shm.unlink()
+        return image
+
+    def _drain_pending(self) -> None:
+        """Finish an image stream the caller abandoned (frees its shared blocks)"""
+        if self._pending is not None:
+            self._pending.close()
+
+    # Forwarded ModelManager API
+    def load_model(self, model_key: str, offload_mode: Optional[str] = None, precision: Optional[str] = None) -> Dict:
+        return self._call("load_model", model_key, offload_mode=offload_mode, precision=precision)
+
+    def load_custom_model(self, model_path: str, model_type: str, model_name: str) -> Dict:
+        return self._call("load_custom_model", model_path=model_path, model_type=model_type, model_name=model_name)
+
+    def load_loras(self, loras: list) -> Dict:
+        return self._call("load_loras", loras)
+
+    def unload_all_loras(self) -> None:
+        return self._call("unload_all_loras")
+
+    def get_loaded_loras(self) -> list:
+        return self.loaded_loras
+
+    def peak_memory_mb(self) -> Optional[float]:
+        return self._call("peak_memory_mb")
+
+    def generate_image(self, **kwargs) -> Dict:
+        return self._call("generate_image", **kwargs)
+
+    def generate_img2img(self, **kwargs) -> Dict:
+        return self._call("generate_img2img", **kwargs)
+
+    def generate_hires(self, **kwargs) -> Dict:
+        return self._call("generate_hires", **kwargs)
+
+    def generate_sweep(self, **kwargs) -> Dict:
+        return self._call("generate_sweep", **kwargs)
+    
+    def generate_video(self, progress=None, **kwargs) -> Dict:
+        return self._call("generate_video", progress=progress, **kwargs)
+
+    def shutdown(self) -> None:
+        """Stop the child process"""
+        if self._process is not None and self._process.is_alive():
+            self._process.terminate()
+            self._process.join(timeout=10)
@@ -0,0 +1,206 @@
+"""
+Input Image Store
+Uploaded img2img source images with cached resized pixels and VAE latents,
+so iterating on prompt/strength against one image skips straight to denoising
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+import torch
+from PIL import Image
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class InputImageStore:
+    """Content-addressed input images plus pixel and latent caches"""
+
+    def __init__(self, uploads_dir: Path):
+        self.uploads_dir = uploads_dir
+        self.pixels = LRUCache(settings.INPUT_PIXEL_CACHE_SIZE)
+        self.latents = LRUCache(settings.INPUT_LATENT_CACHE_SIZE)
+
+    def save(self, data: bytes) -> Dict:
+        """
+        Store image bytes and return their id
+
+        The id is the SHA-256 of the content, so uploading the same image
+        twice returns the same id and reuses its cached pixels and latents,
+        and it equals the hash of the same image sent inline as base64.
+        """
+        try:
+            with Image.open(BytesIO(data)) as image:
+                image.verify()
+            with Image.open(BytesIO(data)) as image:
+                width, height = image.size
+        except Exception as e:
+            raise ValueError(f"Invalid image: {e}")
+
+        image_id = hashlib.sha256(data).hexdigest()
+        path = self._path(image_id)
+        if path.exists():
+            self._touch(path)
+        else:
+            self.uploads_dir.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            logger.info(f"Stored input image {image_id} ({width}x{height})")
+            self.prune(keep=image_id)
+
+        return {"image_id": image_id, "width": width, "height": height}
+
+    def exists(self, image_id: str) -> bool:
+        """Whether an uploaded image with this id exists"""
+        return self._valid_id(image_id) and self._path(image_id).exists()
+
+    def get_pixels(self, image_id: str, width: int, height: int) -> Image.Image:
+        """Decoded RGB image resized to width x height (cached)"""
+        key = (image_id, width, height)
+        image = self.pixels.get(key)
+        if image is not None:
+            self._touch(self._path(image_id))
+            return image
+
+        if not self.exists(image_id):
+            raise KeyError(f"Input image {image_id} not found")
+        self._touch(self._path(image_id))
+        with Image.open(self._path(image_id)) as source:
+            image = source.convert("RGB").resize((width, height), Image.LANCZOS)
+        self.pixels.put(key, image)
+        return image
+
+    def get_latent_moments(
+        self,
+        image_id: str,
+        width: int,
+        height: int,
+        vae_key: str,
+        encode: Callable[[Image.Image], torch.Tensor]
+    ) -> Tuple[torch.Tensor, bool]:
+        """
+        VAE latent distribution parameters for an image (cached per VAE)
+
+        Returns (moments, cache_hit). Moments are kept on the CPU; the caller
+        samples from them with its own generator so results stay identical to
+        encoding inside the pipeline.
+        """
+        key = (image_id, width, height, vae_key)
+        moments = self.latents.get(key)
+        if moments is not None:
+            return moments, True
+
+        moments = encode(self.get_pixels(image_id, width, height)).detach().cpu()
+        self.latents.put(key, moments)
+        return moments, False
+
+    def clear_latents(self) -> None:
+        """Drop cached latents (called when the VAE changes)"""
+        self.latents.clear()
+
+    def prune(self, keep: Optional[str] = None) -> int:
+        """
+        Delete the least recently used uploads past the limits
+
+        Inline base64 inputs are stored here too, so without limits the
+        directory only grows. Files unused for UPLOADS_MAX_AGE_DAYS go, then
+        the oldest until the total fits UPLOADS_MAX_TOTAL_MB; `keep` (the
+        image just stored) never does. Returns the number of files deleted.
+        """
+        max_age = settings.UPLOADS_MAX_AGE_DAYS * 86400
+        budget = settings.UPLOADS_MAX_TOTAL_MB * 1024**2
+        if max_age <= 0 and budget <= 0:
+            return 0
+
+        total = 0
+        candidates = []
+        try:
+            with os.scandir(self.uploads_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".img"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    total += stat.st_size
+                    if entry.name[:-4] != keep:
+                        candidates.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+        except FileNotFoundError:
+            return 0
+
+        now = time.time()
+        removed = 0
+        for mtime, size, path in sorted(candidates):
+            expired = max_age > 0 and now - mtime > max_age
+            if not expired and not (budget > 0 and total > budget):
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not delete input image {path}: {e}")
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} input images from {self.uploads_dir}")
+        return removed
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        """Mark an upload as recently used, so prune keeps it longest"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _path(self, image_id: str) -> Path:
+        return self.uploads_dir / f"{image_id}.img"
+
+    @staticmethod
+    def _valid_id(image_id: str) -> bool:
+        # SHA-256 hex digest
+        return len(image_id) == 64 and all(c in "0123456789abcdef" for c in image_id)
+
+
+# Global instance
+input_image_store = InputImageStore(settings.UPLOADS_DIR)
@@ -0,0 +1,232 @@
+"""
+Adaptive Memory Policy
+Pick attention slicing, VAE slicing and VAE tiling per generation call
+based on the requested resolution, batch size, model family and free VRAM
+"""
+import torch
+import torch.nn.functional as F
+from typing import Any, Dict, Optional
+import logging
+
+from .gpu_monitor import gpu_monitor
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough per-family constants used by the activation estimate.
+#   latent_factor:  pixel -> latent downscale of the VAE
+#   attn_factor:    additional downscale before the first attention block
+#   heads:          attention heads at the highest-resolution attention level
+#   unet_bytes_per_token: activation bytes kept alive per latent token and
+#                   sample while the UNet/transformer runs (empirical)
+FAMILY_PROFILES = {
+    "sd15": {"latent_factor": 8, "attn_factor": 1, "heads": 8, "unet_bytes_per_token": 90_000},
+    "sdxl": {"latent_factor": 8, "attn_factor": 2, "heads": 10, "unet_bytes_per_token": 120_000},
+    "flux": {"latent_factor": 8, "attn_factor": 2, "heads": 24, "unet_bytes_per_token": 200_000},
+    "qwen": {"latent_factor": 8, "attn_factor": 2, "heads": 24, "unet_bytes_per_token": 200_000},
+    "wan": {"latent_factor": 8, "attn_factor": 2, "heads": 40, "unet_bytes_per_token": 260_000},
+}
+
+# VAE decoder activations per output pixel (128 channels at full resolution,
+# a few live buffers) in elements
+VAE_ELEMENTS_PER_PIXEL = 128 * 6
+
+
+def has_sdpa() -> bool:
+    """Whether PyTorch provides fused scaled_dot_product_attention"""
+    return hasattr(F, "scaled_dot_product_attention")
+
+
+class MemoryPolicy:
+    """Decide per-request memory optimizations instead of global flags"""
+
+    def __init__(self, headroom: Optional[float] = None):
+        self.headroom = headroom if headroom is not None else settings.MEMORY_HEADROOM
+
+    def estimate(
+        self,
+        width: int,
+        height: int,
+        batch_size: int,
+        family: str,
+        dtype: torch.dtype = torch.float16,
+        guidance: bool = True
+    ) -> Dict[str, int]:
+        """
+        Estimate activation memory in bytes for one pipeline call
+
+        Returns a dict with the UNet/transformer activations, the extra memory
+        of naive (unfused) attention score matrices and the VAE decode cost
+        for a single image and for the whole batch.
+        """
+        profile = FAMILY_PROFILES.get(family, FAMILY_PROFILES["sdxl"])
+        bytes_per_elem = torch.finfo(dtype).bits // 8
+
+        # Classifier-free guidance doubles the effective UNet batch
+        unet_batch = batch_size * (2 if guidance else 1)
+
+        latent_tokens = (height // profile["latent_factor"]) * (width // profile["latent_factor"])
+        attn_tokens = latent_tokens // (profile["attn_factor"] ** 2)
+
+        unet_bytes = unet_batch * latent_tokens * profile["unet_bytes_per_token"] * bytes_per_elem // 2
+        attention_scores = unet_batch * profile["heads"] * attn_tokens * attn_tokens * bytes_per_elem
+
+        vae_per_image = width * height * VAE_ELEMENTS_PER_PIXEL * bytes_per_elem
+
+        return {
+            "unet_bytes": unet_bytes,
+            "attention_scores_bytes": attention_scores,
+            "vae_per_image_bytes": vae_per_image,
+            "vae_batch_bytes": vae_per_image * batch_size,
+        }
+
+    def select(
+        self,
+        width: int,
+        height: int,
+        batch_size: int,
+        family: str,
+        device: str,
+        dtype: torch.dtype = torch.float16,
+        guidance: bool = True,
+        xformers: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Select the cheapest set of optimizations that fits into free memory
+
+        Plan keys:
+            attention:    'sdpa' | 'xformers' | 'naive' | 'sliced-auto' | 'sliced-max'
+            vae_slicing:  decode batch images one at a time
+            vae_tiling:   decode each image in overlapping tiles
+        """
+        fused = "xformers" if xformers else ("sdpa" if has_sdpa() else "naive")
+        plan = {
+            "attention": fused,
+            "vae_slicing": False,
+            "vae_tiling": False,
+            "estimate": self.estimate(width, height, batch_size, family, dtype, guidance),
+            "free_bytes": None,
+            "mode": settings.MEMORY_POLICY,
+        }
+
+        if settings.MEMORY_POLICY == "legacy":
+            # Pre-adaptive behaviour: everything on, slice size 1
+            if settings.ENABLE_ATTENTION_SLICING:
+                plan["attention"] = "sliced-max"
+            plan["vae_slicing"] = settings.VAE_SLICING
+            return plan
+
+        if settings.MEMORY_POLICY == "off" or not device.startswith("cuda"):
+            return plan
+
+        free = gpu_monitor.get_free_memory(device)
+        if free is None:
+            return plan
+        plan["free_bytes"] = free
+        budget = free * self.headroom
+        estimate = plan["estimate"]
+
+        # Attention: fused kernels keep memory linear in sequence length, so
+        # only naive attention pays for the full score matrix
+        unet_need = estimate["unet_bytes"]
+        if fused == "naive":
+            unet_need += estimate["attention_scores_bytes"]
+        if settings.ENABLE_ATTENTION_SLICING and unet_need > budget:
+            if estimate["unet_bytes"] + estimate["attention_scores_bytes"] // 2 <= budget:
+                plan["attention"] = "sliced-auto"
+            else:
+                plan["attention"] = "sliced-max"
+
+        # VAE: slice the batch first, tile only when one image does not fit
+        if settings.VAE_SLICING and estimate["vae_batch_bytes"] > budget:
+            plan["vae_slicing"] = True
+        if estimate["vae_per_image_bytes"] > budget:
+            plan["vae_tiling"] = True
+
+        return plan
+
+    def max_batch_size(
+        self,
+        width: int,
+        height: int,
+        family: str,
+        device: str,
+        dtype: torch.dtype = torch.float16,
+        guidance: bool = True,
+        xformers: bool = False
+    ) -> int:
+        """
+        Largest number of images per pipeline call that fits into free memory
+
+        Bounded by MAX_BATCH_SIZE. Decode is streamed one image at a time, so
+        only the UNet/transformer activations grow with the batch. Without a
+        free-memory reading (CPU, MPS) the setting alone decides.
+        """
+        limit = max(1, settings.MAX_BATCH_SIZE)
+        if settings.MEMORY_POLICY == "off" or not device.startswith("cuda"):
+            return limit
+
+        free = gpu_monitor.get_free_memory(device)
+        if free is None:
+            return limit
+
+        per_sample = self.estimate(width, height, 1, family, dtype, guidance)
+        need = per_sample["unet_bytes"]
+        fused = xformers or has_sdpa()
+        if not fused and not settings.ENABLE_ATTENTION_SLICING:
+            need += per_sample["attention_scores_bytes"]
+        return max(1, min(limit, int(free * self.headroom // max(need, 1))))
+
+    def apply(self, pipeline: Any, plan: Dict[str, Any]) -> None:
+        """Apply a plan to a pipeline, touching only settings that changed"""
+        previous = getattr(pipeline, "_memory_plan", None) or {
+            "attention": None,
+            "vae_slicing": False,
+            "vae_tiling": False,
+        }
+
+        attention = plan["attention"]
+        if attention != previous["attention"]:
+            try:
+                if attention == "sliced-max":
+                    pipeline.enable_attention_slicing(1)
+                elif attention == "sliced-auto":
+                    pipeline.enable_attention_slicing("auto")
+                elif previous["attention"] in ("sliced-auto", "sliced-max"):
+                    # Resets the attention processors to the default (SDPA)
+                    pipeline.disable_attention_slicing()
+                    if attention == "xformers":
+                        pipeline.enable_xformers_memory_efficient_attention()
+            except Exception as e:
+                logger.warning(f"Could not switch attention mode to {attention}: {e}")
+
+        self._toggle(pipeline, "vae_slicing", plan["vae_slicing"], previous["vae_slicing"])
+        self._toggle(pipeline, "vae_tiling", plan["vae_tiling"], previous["vae_tiling"])
+
+        pipeline._memory_plan = {
+            "attention": attention,
+            "vae_slicing": plan["vae_slicing"],
+            "vae_tiling": plan["vae_tiling"],
+        }
+
+        if pipeline._memory_plan != previous:
+            logger.info(
+                f"Memory plan: attention={attention}, "
+                f"vae_slicing={plan['vae_slicing']}, vae_tiling={plan['vae_tiling']}"
+            )
+
+    def _toggle(self, pipeline: Any, name: str, enabled: bool, was_enabled: bool) -> None:
+        """Enable or disable a VAE optimization if the pipeline supports it"""
+        if enabled == was_enabled:
+            return
+        method = f"{'enable' if enabled else 'disable'}_{name}"
+        if not hasattr(pipeline, method):
+            return
+        try:
+            getattr(pipeline, method)()
+        except Exception as e:
+            logger.warning(f"Could not {method.replace('_', ' ')}: {e}")
+
+
+# Global instance
+memory_policy = MemoryPolicy()
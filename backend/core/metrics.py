@@ -0,0 +1,239 @@
+"""
+Metrics
+Minimal in-process counters and histograms rendered in the Prometheus text
+exposition format, so /metrics can be scraped without extra dependencies
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds; wide enough for sub-millisecond PNG writes and multi-minute loads
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+STEP_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.35, 0.5, 0.75, 1, 1.5, 2.5, 5, 10)
+
+# Side length of the equivalent square image, used as a low-cardinality label
+RESOLUTION_BUCKETS = (512, 768, 1024, 1536, 2048)
+
+
+def resolution_bucket(width: int, height: int) -> str:
+    """Map a size to a coarse label like "1024px" (by pixel count)"""
+    side = math.sqrt(width * height)
+    for bucket in RESOLUTION_BUCKETS:
+        if side <= bucket:
+            return f"{bucket}px"
+    return f">{RESOLUTION_BUCKETS[-1]}px"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Labelled metric family"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return lines + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = STAGE_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families and renders them for /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global instance
+metrics = MetricsRegistry()
+
+GENERATION_LABELS = ("model", "scheduler", "resolution")
+
+stage_seconds = metrics.register(Histogram(
+    "astroburner_stage_seconds",
+    "Time spent per generation stage",
+    ("stage",) + GENERATION_LABELS
+))
+denoise_step_seconds = metrics.register(Histogram(
+    "astroburner_denoise_step_seconds",
+    "Duration of individual denoising steps",
+    GENERATION_LABELS,
+    buckets=STEP_BUCKETS
+))
+generations_total = metrics.register(Counter(
+    "astroburner_generations_total",
+    "Completed image generation requests",
+    GENERATION_LABELS
+))
+images_total = metrics.register(Counter(
+    "astroburner_images_total",
+    "Generated images (use rate() for images/sec)",
+    GENERATION_LABELS
+))
+failures_total = metrics.register(Counter(
+    "astroburner_failures_total",
+    "Failed generations by the stage that failed",
+    ("stage",) + GENERATION_LABELS
+))
+preemptions_total = metrics.register(Counter(
+    "astroburner_preemptions_total",
+    "Times a running generation was suspended for a higher-priority request",
+    GENERATION_LABELS
+))
+images_per_second = metrics.register(Gauge(
+    "astroburner_images_per_second",
+    "Throughput of the most recent generation (images per second of run time)",
+    GENERATION_LABELS
+))
+
+
+def generation_labels(model: Optional[str], scheduler: Optional[str], width: int, height: int) -> Dict[str, str]:
+    """Label set shared by all per-generation metrics"""
+    return {
+        "model": model or "none",
+        "scheduler": scheduler or "default",
+        "resolution": resolution_bucket(width, height),
+    }
+
+
+@contextmanager
+def time_stage(stage: str, labels: Dict[str, str]) -> Iterator[None]:
+    """Observe a stage's duration; count a failure if the block raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        failures_total.inc(stage=stage, **labels)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage, **labels)
+
+
+def observe_pipeline_timings(timings: Optional[Dict], labels: Dict[str, str]) -> None:
+    """Record prompt-encode, denoise and per-step times reported by the model manager"""
+    if not timings:
+        return
+    if timings.get("prompt_encode") is not None:
+        stage_seconds.observe(timings["prompt_encode"], stage="prompt_encode", **labels)
+    if timings.get("denoise") is not None:
+        stage_seconds.observe(timings["denoise"], stage="denoise", **labels)
+    for duration in timings.get("steps", ()):
+        denoise_step_seconds.observe(duration, **labels)
+    if timings.get("preemptions"):
+        preemptions_total.inc(timings["preemptions"], **labels)
+        stage_seconds.observe(timings["suspended"], stage="suspended", **labels)
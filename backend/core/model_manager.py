@@ -1,4 +1,5 @@
 import torch
+import torch.nn.functional as F
 from diffusers import (
     StableDiffusionPipeline,
     StableDiffusionXLPipeline,
@@ -20,13 +21,26 @@ from diffusers import (
     KDPM2AncestralDiscreteScheduler,
     UniPCMultistepScheduler
 )
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import logging
+import time
 from pathlib import Path
 from PIL import Image
 import base64
-from io import BytesIO
+import itertools
 from .gpu_monitor import gpu_monitor
+from .memory_policy import memory_policy
+from .offload import OFFLOAD_MODES, OffloadStats, apply_offload, resolve_offload_mode
+from .step_callbacks import StepTimer, chain_callbacks, supports_step_callback
+from .vae_decode import decode_latents_iter, supports_streaming_decode
+from .input_images import input_image_store
+from .sweep import PER_SAMPLE_GUIDANCE_FAMILIES, per_sample_guidance, plan_groups
+from .video import VIDEO_TYPES, decode_video_chunks, encode_video_stream
+from .downloads import is_downloaded, resolve_model_source
+from .checkpoint_cache import checkpoint_cache
+from .quantization import PRECISION_MODES, apply_quantization, resolve_precision
+from .preemption import PriorityLock, StepPreemption
+from .cpu_tuning import bf16_autocast, bind_cores, configure_runtime, plan_core_slots, resolve_bf16, tune_pipeline
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -40,98 +54,121 @@ class ModelManager:
             "model_id": "runwayml/stable-diffusion-v1-5",
             "pipeline_class": StableDiffusionPipeline,
             "img2img_class": StableDiffusionImg2ImgPipeline,
-            "type": "text2img"
+            "type": "text2img",
+            "family": "sd15"
         },
         "sdxl": {
             "name": "Stable Diffusion XL",
             "model_id": "stabilityai/stable-diffusion-xl-base-1.0",
             "pipeline_class": StableDiffusionXLPipeline,
             "img2img_class": StableDiffusionXLImg2ImgPipeline,
-            "type": "text2img"
+            "type": "text2img",
+            "family": "sdxl"
         },
         "sdxl-turbo": {
             "name": "SDXL Turbo",
             "model_id": "stabilityai/sdxl-turbo",
             "pipeline_class": AutoPipelineForText2Image,
             "img2img_class": AutoPipelineForImage2Image,
-            "type": "text2img"
+            "type": "text2img",
+            "family": "sdxl"
         },
         "pony": {
             "name": "Pony Diffusion XL V6",
             "model_id": "LyliaEngine/Pony_Diffusion_V6_XL",
             "pipeline_class": StableDiffusionXLPipeline,
             "img2img_class": StableDiffusionXLImg2ImgPipeline,
-            "type": "text2img"
+            "type": "text2img",
+            "family": "sdxl"
         },
         "illustrious": {
             "name": "Illustrious XL",
             "model_id": "OnomaAIResearch/Illustrious-xl-early-release-v0",
             "pipeline_class": StableDiffusionXLPipeline,
             "img2img_class": StableDiffusionXLImg2ImgPipeline,
-            "type": "text2img"
+            "type": "text2img",
+            "family": "sdxl"
         },
         "flux-dev": {
             "name": "FLUX.1 Dev",
             "model_id": "black-forest-labs/FLUX.1-dev",
             "pipeline_class": DiffusionPipeline,
             "img2img_class": None,
-            "type": "text2img"
+            "type": "text2img",
+            "family": "flux",
+            "offload": "model"
         },
         "flux-kontext": {
             "name": "FLUX.1 Kontext Dev",
             "model_id": "black-forest-labs/FLUX.1-Kontext-dev",
             "pipeline_class": DiffusionPipeline,
             "img2img_class": None,
-            "type": "image2image"
+            "type": "image2image",
+            "family": "flux",
+            "offload": "model"
         },
         "wan21-t2v": {
             "name": "Wan 2.1 T2V 14B",
             "model_id": "Wan-AI/Wan2.1-T2V-14B",
             "pipeline_class": DiffusionPipeline,
             "img2img_class": None,
-            "type": "text2video"
+            "type": "text2video",
+            "family": "wan",
+            "offload": "model"
         },
         "wan21-i2v": {
             "name": "Wan 2.1 I2V 14B",
             "model_id": "Wan-AI/Wan2.1-I2V-14B",
             "pipeline_class": DiffusionPipeline,
             "img2img_class": None,
-            "type": "image2video"
+            "type": "image2video",
+            "family": "wan",
+            "offload": "model"
         },
         "wan22-t2v": {
             "name": "Wan 2.2 T2V 14B",
             "model_id": "Wan-AI/Wan2.2-T2V-14B",
             "pipeline_class": DiffusionPipeline,
             "img2img_class": None,
-            "type": "text2video"
+            "type": "text2video",
+            "family": "wan",
+            "offload": "model"
         },
         "wan22-i2v": {
             "name": "Wan 2.2 I2V 14B",
             "model_id": "Wan-AI/Wan2.2-I2V-14B",
             "pipeline_class": DiffusionPipeline,
             "img2img_class": None,
-            "type": "image2video"
+            "type": "image2video",
+            "family": "wan",
+            "offload": "model"
         },
         "wan22-s2v": {
             "name": "Wan 2.2 S2V 14B",
             "model_id": "Wan-AI/Wan2.2-S2V-14B",
             "pipeline_class": DiffusionPipeline,
             "img2img_class": None,
-            "type": "speech2video"
+            "type": "speech2video",
+            "family": "wan",
+            "offload": "model"
         },
         "qwen": {
             "name": "Qwen-Image",
             "model_id": "Qwen/Qwen-Image",
             "pipeline_class": DiffusionPipeline,
             "img2img_class": None,
-            "type": "text2img"
+            "type": "text2img",
+            "family": "qwen",
+            "offload": "model"
         },
         "qwen-image-edit": {
             "name": "Qwen-Image Edit",
             "model_id": "Qwen/Qwen-Image",
             "pipeline_class": DiffusionPipeline,
             "img2img_class": None,
-            "type": "image2image"
+            "type": "image2image",
+            "family": "qwen",
+            "offload": "model"
         }
     }
     
@@ -150,31 +187,67 @@ class ModelManager:
         "UniPCMultistep": UniPCMultistepScheduler
     }
     
-    def __init__(self):
+    # Families whose img2img pipelines take 4-channel latents as the init image
+    HIRES_FAMILIES = ("sd15", "sdxl")
+    LATENT_UPSCALE_MODES = ("nearest-exact", "bilinear", "bicubic")
+    
+    def __init__(self, device: Optional[str] = None, cpu_cores: Optional[List[int]] = None):
         self.current_model: Optional[str] = None
         self.pipeline: Optional[Any] = None
         self.img2img_pipeline: Optional[Any] = None
-        self.device = gpu_monitor.get_optimal_device()
-        self.dtype = torch.float16 if self.device == "cuda" else torch.float32
+        self.hires_pipeline: Optional[Any] = None  # img2img view of self.pipeline for hires fix
+        self.device = device or gpu_monitor.get_optimal_device()
+        self.dtype = torch.float16 if self.device.startswith("cuda") else torch.float32
         self.loaded_loras: list = []  # Track loaded LoRAs
+        self.model_family: Optional[str] = None  # sd15, sdxl, flux, wan, qwen
+        self.offload_mode: str = "none"  # none, model, sequential, disk
+        self.precision: str = "none"  # none, int8, fp8 (weight-only)
+        self.quantization: Optional[Dict] = None  # Memory saved by the current precision
+        self.offload_stats = OffloadStats()
+        self.lock = PriorityLock()  # Serializes pipeline use; higher priorities preempt at step boundaries
+        self.cpu_cores = cpu_cores  # Cores this worker is pinned to (CPU performance mode)
+        self.cpu_bf16 = False
+        self.cpu_tuning: Optional[Dict] = None  # channels_last/fusion applied to the current model
+        if self.device == "cpu" and settings.CPU_PERF_MODE:
+            if self.cpu_cores is None:
+                self.cpu_cores = plan_core_slots(1)[0]
+            configure_runtime(len(self.cpu_cores))
+            self.cpu_bf16 = resolve_bf16()
         
-    def load_model(self, model_key: str) -> Dict:
-        """Load a model with optimization"""
+    def load_model(self, model_key: str, offload_mode: Optional[str] = None, precision: Optional[str] = None) -> Dict:
+        """Load a model with optimization, the selected offload tier and weight precision"""
         try:
             if model_key not in self.AVAILABLE_MODELS:
                 return {"success": False, "error": f"Model {model_key} not found"}
             
             model_info = self.AVAILABLE_MODELS[model_key]
             
+            # Weights come from the download manager; never fetch them inline here
+            source = resolve_model_source(model_info["model_id"])
+            if source is None:
+                return {
+                    "success": False,
+                    "error": f"{model_info['name']} is not downloaded yet",
+                    "download_required": True,
+                    "model_id": model_info["model_id"]
+                }
+            
+            # Before unloading, so an unavailable tier keeps the current model
+            offload_mode = resolve_offload_mode(offload_mode, model_info, self.device)
+            precision = resolve_precision(precision)
+            
             # Unload current model if exists
             if self.pipeline is not None:
                 logger.info(f"Unloading current model: {self.current_model}")
                 del self.pipeline
                 if self.img2img_pipeline is not None:
                     del self.img2img_pipeline
+                self.hires_pipeline = None
                 gpu_monitor.clear_cache()
             
-            logger.info(f"Loading model: {model_info['name']}")
+            input_image_store.clear_latents()
+            logger.info(f"Loading model: {model_info['name']} (offload: {offload_mode}, precision: {precision})")
+            load_started = time.perf_counter()
             
             # Load pipeline
             pipeline_class = model_info["pipeline_class"]
@@ -195,66 +268,108 @@ class ModelManager:
                 logger.info("NSFW filter enabled")
             
             self.pipeline = pipeline_class.from_pretrained(
-                model_info["model_id"],
+                source,
                 **pipeline_kwargs
             )
             
-            # Move to device
-            self.pipeline = self.pipeline.to(self.device)
-            
-            # Apply optimizations
-            if self.device == "cuda":
-                if settings.ENABLE_XFORMERS:
-                    try:
-                        self.pipeline.enable_xformers_memory_efficient_attention()
-                        logger.info("xFormers enabled")
-                    except Exception as e:
-                        logger.warning(f"Could not enable xFormers: {e}")
-                
-                if settings.ENABLE_ATTENTION_SLICING:
-                    self.pipeline.enable_attention_slicing(1)
-                    logger.info("Attention slicing enabled")
-                
-                if settings.VAE_SLICING:
-                    self.pipeline.enable_vae_slicing()
-                    logger.info("VAE slicing enabled")
+            # Quantize on the CPU copy, before weights are moved or offloaded
+            quantization = apply_quantization(self.pipeline, precision)
+            
+            # Move to device according to the offload tier
+            self.pipeline = apply_offload(self.pipeline, offload_mode, self.device, model_key)
+            
+            # Apply optimizations (slicing/tiling is decided per request)
+            self._apply_optimizations(self.pipeline)
             
             # Also load img2img pipeline
             img2img_class = model_info.get("img2img_class")
             if img2img_class:
                 logger.info("Loading img2img pipeline...")
                 self.img2img_pipeline = img2img_class.from_pretrained(
-                    model_info["model_id"],
+                    source,
                     **pipeline_kwargs
                 )
-                self.img2img_pipeline = self.img2img_pipeline.to(self.device)
+                apply_quantization(self.img2img_pipeline, precision)
+                self.img2img_pipeline = apply_offload(
+                    self.img2img_pipeline, offload_mode, self.device, f"{model_key}-img2img"
+                )
                 
                 # Apply same optimizations
-                if self.device == "cuda":
-                    if settings.ENABLE_XFORMERS:
-                        try:
-                            self.img2img_pipeline.enable_xformers_memory_efficient_attention()
-                        except Exception as e:
-                            logger.warning(f"Could not enable xFormers for img2img: {e}")
-                    if settings.ENABLE_ATTENTION_SLICING:
-                        self.img2img_pipeline.enable_attention_slicing(1)
-                    if settings.VAE_SLICING:
-                        self.img2img_pipeline.enable_vae_slicing()
+                self._apply_optimizations(self.img2img_pipeline)
             
             self.current_model = model_key
+            self.model_family = model_info.get("family", "sdxl")
+            self.offload_mode = offload_mode
+            self.precision = precision
+            self.quantization = quantization
+            self.offload_stats.record_load(
+                model_key, self._stats_tier(), time.perf_counter() - load_started, self.device
+            )
             
             return {
                 "success": True,
                 "model": model_key,
                 "name": model_info["name"],
                 "device": self.device,
-                "dtype": str(self.dtype)
+                "dtype": str(self.dtype),
+                "offload_mode": offload_mode,
+                "precision": precision,
+                "quantization": quantization,
+                "cpu_tuning": self.cpu_tuning
             }
             
         except Exception as e:
             logger.error(f"Error loading model {model_key}: {e}")
             return {"success": False, "error": str(e)}
     
+    def _apply_optimizations(self, pipeline: Any) -> None:
+        """Apply load-time optimizations; slicing and tiling are chosen per request"""
+        pipeline._xformers_enabled = False
+        if self.device.startswith("cuda") and settings.ENABLE_XFORMERS:
+            try:
+                pipeline.enable_xformers_memory_efficient_attention()
+                pipeline._xformers_enabled = True
+                logger.info("xFormers enabled")
+            except Exception as e:
+                logger.warning(f"Could not enable xFormers: {e}")
+        if self.device == "cpu" and settings.CPU_PERF_MODE:
+            self.cpu_tuning = tune_pipeline(pipeline, self.cpu_bf16)
+    
+    def _apply_memory_plan(
+        self,
+        pipeline: Any,
+        width: int,
+        height: int,
+        num_images: int,
+        guidance_scale: float
+    ) -> Dict:
+        """Pick and apply attention/VAE memory optimizations for one call"""
+        plan = memory_policy.select(
+            width=width,
+            height=height,
+            batch_size=num_images,
+            family=self.model_family or "sdxl",
+            device=self.device,
+            dtype=self.dtype,
+            guidance=guidance_scale > 1.0,
+            xformers=getattr(pipeline, "_xformers_enabled", False)
+        )
+        memory_policy.apply(pipeline, plan)
+        return plan
+    
+    @staticmethod
+    def _family_for_model_type(model_type: str) -> str:
+        """Map a custom model type to a model family for memory estimates"""
+        if model_type in ["SD1.5"]:
+            return "sd15"
+        if model_type.startswith("FLUX"):
+            return "flux"
+        if model_type.startswith("Wan"):
+            return "wan"
+        if model_type.startswith("Qwen"):
+            return "qwen"
+        return "sdxl"
+    
     def load_custom_model(self, model_path: str, model_type: str, model_name: str) -> Dict:
         """Load a custom .safetensors model from local filesystem"""
         try:
@@ -264,9 +379,20 @@ class ModelManager:
                 del self.pipeline
                 if self.img2img_pipeline is not None:
                     del self.img2img_pipeline
+                self.hires_pipeline = None
                 gpu_monitor.clear_cache()
             
             logger.info(f"Loading custom model: {model_name} ({model_type}) from {model_path}")
+            input_image_store.clear_latents()
+            load_started = time.perf_counter()
+            
+            # Large transformer families default to model offload like their hub counterparts
+            model_family = self._family_for_model_type(model_type)
+            offload_mode = resolve_offload_mode(
+                None,
+                {"offload": "model" if model_family in ("flux", "wan", "qwen") else "none"},
+                self.device
+            )
             
             # Determine pipeline class based on model type
             pipeline_class = None
@@ -299,54 +425,55 @@ class ModelManager:
                 pipeline_kwargs["requires_safety_checker"] = False
                 logger.info("NSFW filter disabled for custom model")
             
-            # Load from single file
-            self.pipeline = pipeline_class.from_single_file(
-                model_path,
-                **pipeline_kwargs
-            )
+            # Converted components are cached on disk; a hit skips single-file conversion
+            cached = None
+            if settings.ENABLE_CHECKPOINT_CACHE:
+                cached = checkpoint_cache.lookup(model_path, pipeline_class, self.dtype)
+            cache_state = "hit" if cached is not None else ("miss" if settings.ENABLE_CHECKPOINT_CACHE else None)
             
-            # Move to device
-            self.pipeline = self.pipeline.to(self.device)
-            
-            # Apply optimizations
-            if self.device == "cuda":
-                if settings.ENABLE_XFORMERS:
-                    try:
-                        self.pipeline.enable_xformers_memory_efficient_attention()
-                        logger.info("xFormers enabled")
-                    except Exception as e:
-                        logger.warning(f"Could not enable xFormers: {e}")
-                
-                if settings.ENABLE_ATTENTION_SLICING:
-                    self.pipeline.enable_attention_slicing(1)
-                    logger.info("Attention slicing enabled")
-                
-                if settings.VAE_SLICING:
-                    self.pipeline.enable_vae_slicing()
-                    logger.info("VAE slicing enabled")
+            if cached is not None:
+                logger.info(f"Loading converted checkpoint from cache: {cached.name}")
+                self.pipeline = pipeline_class.from_pretrained(cached, **pipeline_kwargs)
+            else:
+                # Load from single file
+                self.pipeline = pipeline_class.from_single_file(
+                    model_path,
+                    **pipeline_kwargs
+                )
+                if settings.ENABLE_CHECKPOINT_CACHE:
+                    cached = checkpoint_cache.store(self.pipeline, model_path, pipeline_class, self.dtype)
+            
+            # Move to device according to the offload tier
+            self.pipeline = apply_offload(self.pipeline, offload_mode, self.device, f"custom-{model_name}")
+            
+            # Apply optimizations (slicing/tiling is decided per request)
+            self._apply_optimizations(self.pipeline)
             
             # Load img2img pipeline if supported
             if img2img_class:
                 logger.info("Loading img2img pipeline for custom model...")
-                self.img2img_pipeline = img2img_class.from_single_file(
-                    model_path,
-                    **pipeline_kwargs
+                if cached is not None:
+                    self.img2img_pipeline = img2img_class.from_pretrained(cached, **pipeline_kwargs)
+                else:
+                    self.img2img_pipeline = img2img_class.from_single_file(
+                        model_path,
+                        **pipeline_kwargs
+                    )
+                self.img2img_pipeline = apply_offload(
+                    self.img2img_pipeline, offload_mode, self.device, f"custom-{model_name}-img2img"
                 )
-                self.img2img_pipeline = self.img2img_pipeline.to(self.device)
                 
                 # Apply optimizations
-                if self.device == "cuda":
-                    if settings.ENABLE_XFORMERS:
-                        try:
-                            self.img2img_pipeline.enable_xformers_memory_efficient_attention()
-                        except Exception as e:
-                            logger.warning(f"Could not enable xFormers for img2img: {e}")
-                    if settings.ENABLE_ATTENTION_SLICING:
-                        self.img2img_pipeline.enable_attention_slicing(1)
-                    if settings.VAE_SLICING:
-                        self.img2img_pipeline.enable_vae_slicing()
+                self._apply_optimizations(self.img2img_pipeline)
             
             self.current_model = f"custom:{model_name}"
+            self.model_family = model_family
+            self.offload_mode = offload_mode
+            self.precision = "none"
+            self.quantization = None
+            self.offload_stats.record_load(
+                self.current_model, offload_mode, time.perf_counter() - load_started, self.device
+            )
             
             return {
                 "success": True,
@@ -355,7 +482,9 @@ class ModelManager:
                 "type": model_type,
                 "path": model_path,
                 "device": self.device,
-                "dtype": str(self.dtype)
+                "dtype": str(self.dtype),
+                "offload_mode": offload_mode,
+                "checkpoint_cache": cache_state
             }
             
         except Exception as e:
@@ -380,25 +509,14 @@ class ModelManager:
             if self.pipeline is None:
                 return {"success": False, "error": "No model loaded"}
             
-            # Apply CLIP Skip by monkey-patching encode_prompt if needed
-            if clip_skip > 0:
-                logger.info(f"Applying CLIP Skip: {clip_skip} (skipping last {clip_skip} layer(s))")
-                # Monkey-patch the pipeline's encode_prompt to use CLIP Skip
-                self._patch_pipeline_for_clip_skip(self.pipeline, clip_skip)
-            else:
-                # Restore original encode_prompt if exists
-                if hasattr(self.pipeline, '_original_encode_prompt'):
-                    self.pipeline.encode_prompt = self.pipeline._original_encode_prompt
-                    logger.info("CLIP Skip disabled, restored original encode_prompt")
+            if self.is_video_model():
+                return {"success": False, "error": "Current model generates video, use /generate/video"}
+            
+            self._apply_clip_skip(self.pipeline, clip_skip)
             
             # Set scheduler if specified
             self._set_scheduler(self.pipeline, scheduler)
             
-            # Set seed for reproducibility
-            generator = None
-            if seed is not None:
-                generator = torch.Generator(device=self.device).manual_seed(seed)
-            
             logger.info(f"Generating image with prompt: {prompt[:50]}...")
             
             # Generate image with properly applied CLIP Skip
@@ -408,23 +526,230 @@ class ModelManager:
                 "width": width,
                 "height": height,
                 "num_inference_steps": num_inference_steps,
-                "guidance_scale": guidance_scale,
-                "num_images_per_prompt": num_images,
-                "generator": generator
+                "guidance_scale": guidance_scale
             }
             
-            output = self.pipeline(**pipeline_kwargs)
+            # Split into micro-batches that fit; seeds stay per image
+            images, count, run_stats = self._run_batched(
+                self.pipeline, pipeline_kwargs, num_images, seed, width, height
+            )
             
             return {
                 "success": True,
-                "images": output.images,
-                "num_images": len(output.images)
+                "images": images,
+                "num_images": count,
+                "timings": run_stats.pop("timings"),
+                "offload": run_stats
             }
             
         except Exception as e:
             logger.error(f"Error generating image: {e}")
             return {"success": False, "error": str(e)}
     
+    def _make_generators(self, seeds: Optional[List[int]]) -> Any:
+        """
+        One generator per image, or None for random seeds
+        
+        Per-image generators keep every image identical no matter how the
+        request is split into micro-batches.
+        """
+        if seeds is None:
+            return None
+        if len(seeds) == 1:
+            return torch.Generator(device=self.device).manual_seed(seeds[0])
+        return [torch.Generator(device=self.device).manual_seed(seed) for seed in seeds]
+    
+    def _run_batched(
+        self,
+        pipeline: Any,
+        pipeline_kwargs: Dict,
+        num_images: int,
+        seed: Optional[int],
+        width: int,
+        height: int,
+        prepare: Optional[Any] = None,
+        seeds: Optional[List[int]] = None
+    ):
+        """
+        Run a request as micro-batches sized to free memory
+        
+        The batch size starts at the largest that the memory policy expects
+        to fit and is halved after an out-of-memory error. Denoising runs for
+        all batches first (latents are small); images are then decoded lazily.
+        Image i is seeded with seed + i unless explicit seeds are given.
+        prepare(generator, start, size) may return extra kwargs per batch
+        (img2img latents). Returns (images, count, run_stats).
+        """
+        if seeds is None and seed is not None:
+            seeds = [seed + i for i in range(num_images)]
+        guidance_scale = pipeline_kwargs.get("guidance_scale", 0)
+        batch_size = min(num_images, memory_policy.max_batch_size(
+            width=width,
+            height=height,
+            family=self.model_family or "sdxl",
+            device=self.device,
+            dtype=self.dtype,
+            guidance=guidance_scale > 1.0,
+            xformers=getattr(pipeline, "_xformers_enabled", False)
+        ))
+        
+        finished = []
+        batches = []
+        timings = {
+            "prompt_encode": None, "denoise": None, "steps": [], "streamed_decode": False,
+            "suspended": 0.0, "preemptions": 0
+        }
+        run_stats: Dict = {}
+        done = 0
+        while done < num_images:
+            size = min(batch_size, num_images - done)
+            kwargs = dict(pipeline_kwargs)
+            kwargs["num_images_per_prompt"] = size
+            kwargs["generator"] = self._make_generators(seeds[done:done + size] if seeds else None)
+            if prepare is not None:
+                kwargs.update(prepare(kwargs["generator"], done, size))
+            
+            # Choose slicing/tiling for this resolution and batch
+            self._apply_memory_plan(pipeline, width, height, size, guidance_scale)
+            try:
+                output, run_stats = self._run_pipeline(pipeline, kwargs)
+            except torch.cuda.OutOfMemoryError:
+                if size == 1:
+                    raise
+                batch_size = size // 2
+                del kwargs
+                gpu_monitor.clear_cache()
+                logger.warning(f"Out of memory with {size} images per batch, retrying with {batch_size}")
+                continue
+            
+            finished.append(self._finish_images(pipeline, output, kwargs, width, height))
+            batches.append(size)
+            done += size
+            self._merge_timings(timings, run_stats.pop("timings"))
+        
+        if len(batches) > 1:
+            logger.info(f"Generated {num_images} images in micro-batches of {batches}")
+        images = itertools.chain.from_iterable(images for images, _ in finished)
+        count = sum(count for _, count in finished)
+        return images, count, {**run_stats, "batches": batches, "timings": timings}
+    
+    @staticmethod
+    def _merge_timings(total: Dict, timings: Dict) -> None:
+        """Accumulate one batch's stage timings into the request total"""
+        for key in ("prompt_encode", "denoise"):
+            if timings.get(key) is not None:
+                total[key] = (total[key] or 0.0) + timings[key]
+        total["steps"].extend(timings.get("steps", []))
+        total["suspended"] += timings.get("suspended", 0.0)
+        total["preemptions"] += timings.get("preemptions", 0)
+        total["streamed_decode"] = timings.get("streamed_decode", False)
+    
+    def _run_pipeline(self, pipeline: Any, pipeline_kwargs: Dict, callbacks: Optional[list] = None):
+        """
+        Run a pipeline call with per-step timing
+        
+        Returns the pipeline output and the offload tier stats (peak memory,
+        mean step latency) recorded for the current model, plus stage
+        timings under "timings" for the metrics endpoint.
+        """
+        timer = StepTimer()
+        preemption = None
+        if settings.ENABLE_PREEMPTION:
+            def reapply_memory_plan(plan: Optional[Dict]) -> None:
+                if plan is not None:
+                    memory_policy.apply(pipeline, plan)
+            preemption = StepPreemption(self.lock, self.device, self._pipeline_state, reapply_memory_plan, timer.exclude)
+        callback = chain_callbacks([timer] + (callbacks or []) + [preemption])
+        if callback is not None and supports_step_callback(pipeline):
+            pipeline_kwargs["callback_on_step_end"] = callback
+        
+        # Skip the in-pipeline batch decode; _finish_images streams it instead
+        if supports_streaming_decode(pipeline, self.model_family):
+            pipeline_kwargs["output_type"] = "latent"
+        
+        self.offload_stats.begin_job(self.device)
+        hook = timer.watch_denoiser(pipeline)
+        bind_cores(self.cpu_cores)
+        timer.start()
+        try:
+            with bf16_autocast(self.cpu_bf16):
+                output = pipeline(**pipeline_kwargs)
+        finally:
+            self.offload_stats.end_job()
+            if hook is not None:
+                hook.remove()
+        
+        stats = self.offload_stats.record_job(
+            self.current_model, self._stats_tier(), self.device, timer.mean_step_seconds
+        )
+        timings = {**timer.timings(), "streamed_decode": pipeline_kwargs.get("output_type") == "latent"}
+        return output, {"mode": self.offload_mode, **stats, "timings": timings}
+    
+    def _finish_images(self, pipeline: Any, output: Any, pipeline_kwargs: Dict, width: int, height: int):
+        """
+        Turn pipeline output into images
+        
+        Returns (images, count). When the pipeline produced latents, images is
+        a lazy iterator that decodes one image per step so callers can save
+        each image before the next one is decoded.
+        """
+        if pipeline_kwargs.get("output_type") != "latent":
+            return output.images, len(output.images)
+        
+        latents = output.images
+        return decode_latents_iter(pipeline, latents, height, width), latents.shape[0]
+    
+    def _pipeline_state(self) -> tuple:
+        """What a suspended job's output depends on besides its checkpoint"""
+        return (
+            self.current_model, id(self.pipeline), id(self.img2img_pipeline),
+            self.precision, self.lora_signature(self.loaded_loras)
+        )
+    
+    @staticmethod
+    def lora_signature(loras: list) -> tuple:
+        """LoRA files and weights, comparable between requests and loaded state"""
+        return tuple((lora.get("file_path"), lora.get("weight", 1.0)) for lora in loras)
+    
+    def can_run_while_suspended(self, model_key: Optional[str], loras: list) -> bool:
+        """
+        Whether a request could run without changing the pipeline
+        
+        Only such requests may preempt a running job: anything that loads a
+        model or re-fuses LoRAs would change the output of the suspended one.
+        """
+        return (
+            self.current_model is not None
+            and model_key in (None, self.current_model)
+            and self.lora_signature(loras) == self.lora_signature(self.loaded_loras)
+        )
+    
+    def peak_memory_mb(self) -> Optional[float]:
+        """Peak memory since the last generation started (includes streamed decode), None if not measurable"""
+        peak_bytes = self.offload_stats.peak_memory_bytes(self.device)
+        return None if peak_bytes is None else round(peak_bytes / 1024**2, 1)
+    
+    def _stats_tier(self) -> str:
+        """Stats key: the offload tier, plus the weight precision when quantized"""
+        if self.precision == "none":
+            return self.offload_mode
+        return f"{self.offload_mode}+{self.precision}"
+    
+    def get_offload_info(self) -> Dict:
+        """Available offload tiers and precisions, and measured stats per model and tier"""
+        return {
+            "modes": OFFLOAD_MODES,
+            "precisions": PRECISION_MODES,
+            "current": {
+                "model": self.current_model,
+                "mode": self.offload_mode,
+                "precision": self.precision,
+                "quantization": self.quantization,
+                "cpu": self.cpu_tuning
+            },
+            "stats": self.offload_stats.get()
+        }
+    
     def _set_scheduler(self, pipeline: Any, scheduler_name: Optional[str]) -> None:
         """Set scheduler for pipeline"""
         if scheduler_name and scheduler_name in self.SCHEDULER_MAP:
@@ -435,6 +760,18 @@ class ModelManager:
             except Exception as e:
                 logger.warning(f"Could not set scheduler {scheduler_name}: {e}")
     
+    def _apply_clip_skip(self, pipeline: Any, clip_skip: int) -> None:
+        """Apply CLIP Skip by monkey-patching encode_prompt, or undo a previous patch"""
+        if clip_skip > 0:
+            logger.info(f"Applying CLIP Skip: {clip_skip} (skipping last {clip_skip} layer(s))")
+            # Monkey-patch the pipeline's encode_prompt to use CLIP Skip
+            self._patch_pipeline_for_clip_skip(pipeline, clip_skip)
+        else:
+            # Restore original encode_prompt if exists
+            if hasattr(pipeline, '_original_encode_prompt'):
+                pipeline.encode_prompt = pipeline._original_encode_prompt
+                logger.info("CLIP Skip disabled, restored original encode_prompt")
+    
     def _patch_pipeline_for_clip_skip(self, pipeline: Any, clip_skip: int) -> None:
         """
         Monkey-patch pipeline's encode_prompt to support CLIP Skip using hidden_states.
@@ -559,7 +896,7 @@ class ModelManager:
     def generate_img2img(
         self,
         prompt: str,
-        input_image_base64: str,
+        input_image_base64: Optional[str] = None,
         negative_prompt: str = "",
         width: int = 512,
         height: int = 512,
@@ -568,55 +905,478 @@ class ModelManager:
         num_images: int = 1,
         seed: Optional[int] = None,
         scheduler: Optional[str] = None,
-        strength: float = 0.75
+        strength: float = 0.75,
+        input_image_id: Optional[str] = None
     ) -> Dict:
-        """Generate images from input image (img2img)"""
+        """Generate images from input image (img2img), given as base64 or uploaded image id"""
         try:
             if self.img2img_pipeline is None:
                 return {"success": False, "error": "No img2img model loaded"}
             
-            # Decode base64 image
-            try:
-                if "," in input_image_base64:
-                    input_image_base64 = input_image_base64.split(",")[1]
-                
-                image_data = base64.b64decode(input_image_base64)
-                input_image = Image.open(BytesIO(image_data)).convert("RGB")
-                input_image = input_image.resize((width, height), Image.LANCZOS)
-                logger.info(f"Input image loaded and resized to {width}x{height}")
-            except Exception as e:
-                logger.error(f"Error decoding input image: {e}")
-                return {"success": False, "error": f"Invalid input image: {str(e)}"}
+            # Store base64 images like uploads so repeated calls hit the caches
+            if input_image_id is None:
+                try:
+                    if not input_image_base64:
+                        raise ValueError("No input image given")
+                    if "," in input_image_base64:
+                        input_image_base64 = input_image_base64.split(",")[1]
+                    
+                    image_data = base64.b64decode(input_image_base64)
+                    input_image_id = input_image_store.save(image_data)["image_id"]
+                except Exception as e:
+                    logger.error(f"Error decoding input image: {e}")
+                    return {"success": False, "error": f"Invalid input image: {str(e)}"}
+            elif not input_image_store.exists(input_image_id):
+                return {"success": False, "error": f"Input image {input_image_id} not found"}
             
             self._set_scheduler(self.img2img_pipeline, scheduler)
+            pipeline = self.img2img_pipeline
+            
+            logger.info(f"Generating img2img with strength={strength}, prompt: {prompt[:50]}...")
+            
+            pipeline_kwargs = {
+                "prompt": prompt,
+                "negative_prompt": negative_prompt if negative_prompt else None,
+                "num_inference_steps": num_inference_steps,
+                "guidance_scale": guidance_scale,
+                "strength": strength
+            }
+            
+            # Resized pixels are cached per (image, size); latents per VAE as well.
+            # Initial latents are sampled per micro-batch with its generators.
+            def prepare(generator, start, size):
+                return {"image": self._prepare_img2img_input(pipeline, input_image_id, width, height, generator)}
+            
+            images, count, run_stats = self._run_batched(
+                pipeline, pipeline_kwargs, num_images, seed, width, height, prepare=prepare
+            )
+            
+            return {
+                "success": True,
+                "images": images,
+                "num_images": count,
+                "timings": run_stats.pop("timings"),
+                "offload": run_stats
+            }
+            
+        except Exception as e:
+            logger.error(f"Error generating img2img: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def _hires_pipeline(self) -> Optional[Any]:
+        """
+        img2img pipeline for the hires-fix second pass
+        
+        Built with from_pipe on the txt2img pipeline, so it shares every
+        loaded component (fused LoRAs and quantized weights included) rather
+        than holding its own copy. Offloaded models use their separately
+        loaded img2img pipeline, since offload hooks belong to one pipeline.
+        """
+        if self.img2img_pipeline is None:
+            return None
+        if self.offload_mode != "none":
+            return self.img2img_pipeline
+        if self.hires_pipeline is None:
+            self.hires_pipeline = type(self.img2img_pipeline).from_pipe(self.pipeline)
+            self.hires_pipeline._xformers_enabled = getattr(self.pipeline, "_xformers_enabled", False)
+        return self.hires_pipeline
+    
+    @staticmethod
+    def _upscale_latents(latents: torch.Tensor, height: int, width: int, mode: str) -> torch.Tensor:
+        """Resize latents to height x width latent pixels (interpolated in fp32)"""
+        return F.interpolate(latents.float(), size=(height, width), mode=mode).to(latents.dtype)
+    
+    def generate_hires(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        width: int = 512,
+        height: int = 512,
+        num_inference_steps: int = 30,
+        guidance_scale: float = 7.5,
+        num_images: int = 1,
+        seed: Optional[int] = None,
+        scheduler: Optional[str] = None,
+        clip_skip: int = 0,
+        scale: float = 2.0,
+        strength: float = 0.5,
+        hires_steps: Optional[int] = None,
+        upscale_mode: str = "bilinear"
+    ) -> Dict:
+        """
+        Hires fix: generate at width x height, upscale the latents, refine with img2img
+        
+        The first pass stops at latents, which are resized with F.interpolate
+        (no VAE decode/encode in between) and denoised again from `strength`
+        by an img2img pipeline sharing the loaded components. The prompt is
+        encoded once for both passes; each micro-batch keeps its generators
+        across them. Images come out at `scale` times the base size.
+        """
+        try:
+            if self.pipeline is None:
+                return {"success": False, "error": "No model loaded"}
+            
+            if self.model_family not in self.HIRES_FAMILIES:
+                return {"success": False, "error": f"Hires fix is not supported for {self.model_family} models"}
+            
+            if upscale_mode not in self.LATENT_UPSCALE_MODES:
+                return {"success": False, "error": f"Unknown latent upscale mode {upscale_mode}"}
+            
+            second = self._hires_pipeline()
+            if second is None:
+                return {"success": False, "error": "Current model has no img2img pipeline for the hires pass"}
+            
+            first = self.pipeline
+            self._apply_clip_skip(first, clip_skip)
+            self._set_scheduler(first, scheduler)
+            second.scheduler = first.scheduler
+            
+            factor = first.vae_scale_factor
+            hires_width = int(width * scale) // factor * factor
+            hires_height = int(height * scale) // factor * factor
+            logger.info(
+                f"Generating hires fix {width}x{height} -> {hires_width}x{hires_height} "
+                f"(strength {strength}) with prompt: {prompt[:50]}..."
+            )
+            
+            started_at = time.perf_counter()
+            prompt_kwargs = self._encode_prompt_once(first, prompt, negative_prompt) or {
+                "prompt": prompt,
+                "negative_prompt": negative_prompt if negative_prompt else None
+            }
+            encode_seconds = time.perf_counter() - started_at
+            
+            # With from_pipe both pipelines drive the same modules, so the
+            # memory plan on record has to follow whichever ran last
+            shared = second is not self.img2img_pipeline
+            first_pass = {
+                "prompt_encode": None, "denoise": None, "steps": [], "streamed_decode": False,
+                "suspended": 0.0, "preemptions": 0
+            }
+            
+            def prepare(generator, start, size):
+                kwargs = {
+                    **prompt_kwargs,
+                    "width": width,
+                    "height": height,
+                    "num_inference_steps": num_inference_steps,
+                    "guidance_scale": guidance_scale,
+                    "num_images_per_prompt": size,
+                    "generator": generator,
+                    "output_type": "latent"
+                }
+                if shared:
+                    first._memory_plan = getattr(second, "_memory_plan", None)
+                self._apply_memory_plan(first, width, height, size, guidance_scale)
+                output, run_stats = self._run_pipeline(first, kwargs)
+                if shared:
+                    second._memory_plan = first._memory_plan
+                self._merge_timings(first_pass, run_stats["timings"])
+                latents = self._upscale_latents(
+                    output.images, hires_height // factor, hires_width // factor, upscale_mode
+                )
+                return {"image": latents}
+            
+            pipeline_kwargs = {
+                **prompt_kwargs,
+                "num_inference_steps": hires_steps or num_inference_steps,
+                "guidance_scale": guidance_scale,
+                "strength": strength
+            }
+            images, count, run_stats = self._run_batched(
+                second, pipeline_kwargs, num_images, seed, hires_width, hires_height, prepare=prepare
+            )
+            if shared:
+                first._memory_plan = getattr(second, "_memory_plan", None)
+            
+            second_pass = run_stats.pop("timings")
+            first_pass_denoise = first_pass["denoise"]
+            timings = first_pass
+            self._merge_timings(timings, second_pass)
+            timings["prompt_encode"] = (timings["prompt_encode"] or 0.0) + encode_seconds
+            
+            return {
+                "success": True,
+                "images": images,
+                "num_images": count,
+                "width": hires_width,
+                "height": hires_height,
+                "hires": {
+                    "base_size": [width, height],
+                    "first_pass_denoise": first_pass_denoise,
+                    "second_pass_denoise": second_pass["denoise"],
+                    "shared_components": shared
+                },
+                "timings": timings,
+                "offload": run_stats
+            }
+            
+        except Exception as e:
+            logger.error(f"Error generating hires fix: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def _encode_prompt_once(self, pipeline: Any, prompt: str, negative_prompt: str) -> Optional[Dict]:
+        """
+        Prompt embeddings as pipeline kwargs, for reuse across pipeline calls
+        
+        Covers the families whose pipelines take precomputed embeddings; None
+        for the rest, which then encode the prompt on every call.
+        """
+        device = pipeline._execution_device
+        negative_prompt = negative_prompt or None
+        with torch.no_grad():
+            if self.model_family == "sd15":
+                embeds, negative = pipeline.encode_prompt(
+                    prompt, device, 1, True, negative_prompt=negative_prompt
+                )
+                return {"prompt_embeds": embeds, "negative_prompt_embeds": negative}
+            if self.model_family == "sdxl":
+                embeds, negative, pooled, negative_pooled = pipeline.encode_prompt(
+                    prompt=prompt,
+                    device=device,
+                    num_images_per_prompt=1,
+                    do_classifier_free_guidance=True,
+                    negative_prompt=negative_prompt
+                )
+                return {
+                    "prompt_embeds": embeds,
+                    "negative_prompt_embeds": negative,
+                    "pooled_prompt_embeds": pooled,
+                    "negative_pooled_prompt_embeds": negative_pooled
+                }
+            if self.model_family == "flux":
+                embeds, pooled, _ = pipeline.encode_prompt(
+                    prompt=prompt, prompt_2=None, device=device, num_images_per_prompt=1
+                )
+                return {"prompt_embeds": embeds, "pooled_prompt_embeds": pooled}
+        return None
+    
+    def generate_sweep(
+        self,
+        prompt: str,
+        negative_prompt: str,
+        width: int,
+        height: int,
+        cells: List[Dict],
+        clip_skip: int = 0
+    ) -> Dict:
+        """
+        Generate the cells of a parameter sweep, sharing work between them
+        
+        Each cell carries seed, guidance_scale, num_inference_steps and
+        scheduler. The prompt is encoded once; cells with the same scheduler
+        and step count run in shared micro-batches. Returns the cells in
+        execution order and a lazy iterator of their images in that order,
+        so groups are generated as the caller consumes them.
+        """
+        try:
+            if self.pipeline is None:
+                return {"success": False, "error": "No model loaded"}
+            
+            if self.is_video_model():
+                return {"success": False, "error": "Current model generates video, use /generate/video"}
+            
+            pipeline = self.pipeline
+            self._apply_clip_skip(pipeline, clip_skip)
+            
+            started_at = time.perf_counter()
+            prompt_kwargs = self._encode_prompt_once(pipeline, prompt, negative_prompt) or {
+                "prompt": prompt,
+                "negative_prompt": negative_prompt if negative_prompt else None
+            }
+            encode_seconds = time.perf_counter() - started_at
+            
+            groups = plan_groups(cells, self.model_family in PER_SAMPLE_GUIDANCE_FAMILIES)
+            logger.info(f"Sweep of {len(cells)} cells planned as {len(groups)} pipeline groups")
+            
+            def images():
+                scheduler = None
+                for group in groups:
+                    if group[0]["scheduler"] != scheduler:
+                        scheduler = group[0]["scheduler"]
+                        self._set_scheduler(pipeline, scheduler)
+                    yield from self._run_sweep_group(pipeline, prompt_kwargs, group, width, height)
+            
+            return {
+                "success": True,
+                "cells": [cell for group in groups for cell in group],
+                "images": images(),
+                "num_images": len(cells),
+                "groups": len(groups),
+                "timings": {"prompt_encode": encode_seconds}
+            }
+            
+        except Exception as e:
+            logger.error(f"Error generating sweep: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def _run_sweep_group(self, pipeline: Any, prompt_kwargs: Dict, group: List[Dict], width: int, height: int):
+        """Run one planned sweep group as micro-batches, yielding its images"""
+        scales = [cell["guidance_scale"] for cell in group]
+        pipeline_kwargs = {
+            **prompt_kwargs,
+            "width": width,
+            "height": height,
+            "num_inference_steps": group[0]["num_inference_steps"],
+            "guidance_scale": max(scales)
+        }
+        
+        with per_sample_guidance(pipeline, max(scales)) as set_scales:
+            def prepare(generator, start, size):
+                set_scales(scales[start:start + size])
+                return {}
+            
+            images, _, _ = self._run_batched(
+                pipeline, pipeline_kwargs, len(group), None, width, height,
+                prepare=prepare, seeds=[cell["seed"] for cell in group]
+            )
+        # Denoising is done; only the lazy decode remains
+        yield from images
+    
+    def is_video_model(self) -> bool:
+        """Whether the loaded model is a text/image-to-video model"""
+        model_info = self.AVAILABLE_MODELS.get(self.current_model or "")
+        return model_info is not None and model_info["type"] in VIDEO_TYPES
+    
+    def generate_video(
+        self,
+        prompt: str,
+        output_path: Path,
+        negative_prompt: str = "",
+        width: int = 832,
+        height: int = 480,
+        num_frames: int = 81,
+        num_inference_steps: int = 30,
+        guidance_scale: float = 5.0,
+        seed: Optional[int] = None,
+        fps: int = 16,
+        container: str = "mp4",
+        input_image_id: Optional[str] = None,
+        progress: Optional[Any] = None
+    ) -> Dict:
+        """
+        Generate a video and stream it into an encoder
+        
+        Denoising runs to latents; frames are then decoded in temporal chunks
+        of VIDEO_DECODE_CHUNK latent frames and appended to the MP4/WebM file
+        chunk by chunk. progress(stage, **fields) is called per step and chunk.
+        """
+        try:
+            if self.pipeline is None:
+                return {"success": False, "error": "No model loaded"}
+            if not self.is_video_model():
+                return {"success": False, "error": "Current model does not generate video"}
+            
+            report = progress or (lambda stage, **fields: None)
+            model_info = self.AVAILABLE_MODELS[self.current_model]
             
             generator = None
             if seed is not None:
                 generator = torch.Generator(device=self.device).manual_seed(seed)
             
-            logger.info(f"Generating img2img with strength={strength}, prompt: {prompt[:50]}...")
+            pipeline_kwargs = {
+                "prompt": prompt,
+                "negative_prompt": negative_prompt if negative_prompt else None,
+                "width": width,
+                "height": height,
+                "num_frames": num_frames,
+                "num_inference_steps": num_inference_steps,
+                "guidance_scale": guidance_scale,
+                "generator": generator,
+                "output_type": "latent"
+            }
+            if model_info["type"] == "image2video":
+                if not input_image_id or not input_image_store.exists(input_image_id):
+                    return {"success": False, "error": "Image-to-video needs an uploaded input image"}
+                pipeline_kwargs["image"] = input_image_store.get_pixels(input_image_id, width, height)
             
-            output = self.img2img_pipeline(
-                prompt=prompt,
-                image=input_image,
-                negative_prompt=negative_prompt if negative_prompt else None,
-                num_inference_steps=num_inference_steps,
-                guidance_scale=guidance_scale,
-                num_images_per_prompt=num_images,
-                generator=generator,
-                strength=strength
+            def on_step(pipeline, step, timestep, callback_kwargs):
+                report("denoising", step=step + 1)
+                return callback_kwargs
+            
+            logger.info(f"Generating {num_frames} frame video with prompt: {prompt[:50]}...")
+            report("denoising", step=0)
+            output, run_stats = self._run_pipeline(self.pipeline, pipeline_kwargs, callbacks=[on_step])
+            
+            report("decoding", frames_done=0)
+            chunks = decode_video_chunks(self.pipeline, output.frames, settings.VIDEO_DECODE_CHUNK)
+            frames = encode_video_stream(
+                chunks, output_path, fps, container,
+                on_chunk=lambda written: report("decoding", frames_done=written)
             )
             
             return {
                 "success": True,
-                "images": output.images,
-                "num_images": len(output.images)
+                "file_path": str(output_path),
+                "num_frames": frames,
+                "fps": fps,
+                "timings": run_stats.pop("timings"),
+                "offload": run_stats
             }
             
         except Exception as e:
-            logger.error(f"Error generating img2img: {e}")
+            logger.error(f"Error generating video: {e}")
             return {"success": False, "error": str(e)}
     
+    def _prepare_img2img_input(
+        self,
+        pipeline: Any,
+        image_id: str,
+        width: int,
+        height: int,
+        generator: Any
+    ) -> Any:
+        """
+        Return the img2img 'image' argument for an uploaded image
+        
+        For SD1.5/SDXL this is the initial latent: the cached VAE latent
+        distribution is sampled with the request generator exactly like the
+        pipeline would, so output is unchanged while the VAE encode is skipped
+        on repeat calls. Other pipelines get the cached resized pixels.
+        """
+        if not settings.CACHE_INPUT_LATENTS or self.model_family not in ("sd15", "sdxl"):
+            return input_image_store.get_pixels(image_id, width, height)
+        
+        vae = pipeline.vae
+        # SDXL img2img encodes with an fp32 VAE when force_upcast is set
+        upcast = self.model_family == "sdxl" and getattr(vae.config, "force_upcast", False)
+        
+        def encode(image: Image.Image) -> torch.Tensor:
+            pixels = pipeline.image_processor.preprocess(image)
+            original_dtype = vae.dtype
+            encode_dtype = torch.float32 if upcast else original_dtype
+            if upcast:
+                vae.to(dtype=torch.float32)
+            try:
+                with torch.no_grad():
+                    pixels = pixels.to(device=pipeline._execution_device, dtype=encode_dtype)
+                    return vae.encode(pixels).latent_dist.parameters
+            finally:
+                if upcast:
+                    vae.to(dtype=original_dtype)
+        
+        vae_key = f"{self.current_model}:{id(vae)}:{self.dtype}"
+        moments, hit = input_image_store.get_latent_moments(image_id, width, height, vae_key, encode)
+        if hit:
+            logger.info(f"Using cached latents for input image {image_id}")
+        
+        from diffusers.models.autoencoders.vae import DiagonalGaussianDistribution
+        
+        latent_dist = DiagonalGaussianDistribution(moments.to(pipeline._execution_device))
+        if isinstance(generator, list):
+            # One sample per image so each keeps its own seed
+            latents = torch.cat([latent_dist.sample(g) for g in generator]).to(self.dtype)
+        else:
+            latents = latent_dist.sample(generator).to(self.dtype)
+        
+        latents_mean = getattr(vae.config, "latents_mean", None)
+        latents_std = getattr(vae.config, "latents_std", None)
+        if latents_mean is not None and latents_std is not None:
+            mean = torch.tensor(latents_mean).view(1, -1, 1, 1).to(latents.device, latents.dtype)
+            std = torch.tensor(latents_std).view(1, -1, 1, 1).to(latents.device, latents.dtype)
+            return (latents - mean) * vae.config.scaling_factor / std
+        return vae.config.scaling_factor * latents
+    
     def get_current_model_info(self) -> Dict:
         """Get info about currently loaded model"""
         if self.current_model is None:
@@ -631,7 +1391,8 @@ class ModelManager:
                 "name": model_name,
                 "model_id": "custom",
                 "type": "custom",
-                "device": self.device
+                "device": self.device,
+                "offload_mode": self.offload_mode
             }
         
         # Regular model from AVAILABLE_MODELS
@@ -645,7 +1406,8 @@ class ModelManager:
             "name": model_info["name"],
             "model_id": model_info["model_id"],
             "type": model_info["type"],
-            "device": self.device
+            "device": self.device,
+            "offload_mode": self.offload_mode
         }
     
     def list_available_models(self) -> Dict:
@@ -670,7 +1432,7 @@ class ModelManager:
                     "name": info["name"],
                     "type": info["type"],
                     "loaded": key == self.current_model,
-                    "downloaded": info["model_id"] in downloaded_models
+                    "downloaded": info["model_id"] in downloaded_models or is_downloaded(info["model_id"])
                 }
                 for key, info in self.AVAILABLE_MODELS.items()
             ]
@@ -685,6 +1447,30 @@ class ModelManager:
             if len(loras) > 5:
                 return {"success": False, "error": "Maximum 5 LoRAs can be loaded at once"}
             
+            # Refusals the caller must not paper over: generating without the LoRAs would not be what was asked for
+            if loras and self.precision != "none":
+                return {
+                    "success": False,
+                    "incompatible": True,
+                    "error": f"LoRAs cannot be fused into {self.precision} weights; load the model with precision none or deactivate the LoRAs"
+                }
+            
+            if loras and self.cpu_tuning and self.cpu_tuning["fusion"]:
+                return {
+                    "success": False,
+                    "incompatible": True,
+                    "error": f"LoRAs cannot be loaded into a {self.cpu_tuning['fusion']}-fused model; set CPU_FUSION=none or deactivate the LoRAs"
+                }
+            
+            # Already fused: re-fusing would drift the weights by rounding
+            if loras and self.lora_signature(loras) == self.lora_signature(self.loaded_loras):
+                return {
+                    "success": True,
+                    "loaded_count": len(self.loaded_loras),
+                    "loras": [l.get("name") for l in self.loaded_loras],
+                    "method": "fuse_lora (PEFT-free)"
+                }
+            
             # Unload existing LoRAs first
             self.unload_all_loras()
             
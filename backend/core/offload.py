@@ -0,0 +1,223 @@
+"""
+Weight Offloading Tiers
+Trade generation speed for device memory footprint on large models
+(FLUX, Wan 14B, Qwen-Image)
+"""
+import inspect
+import threading
+import torch
+from pathlib import Path
+from typing import Any, Dict, Optional
+import logging
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+OFFLOAD_MODES = {
+    "none": "Full device - all weights resident in VRAM (fastest)",
+    "model": "Model-level CPU offload - one component on the device at a time",
+    "sequential": "Layer offload - blocks streamed from CPU memory (pinned, with next-block prefetch on diffusers >= 0.33)",
+    "disk": "Disk offload - weights written to OFFLOAD_DIR and streamed block by block (smallest footprint, diffusers >= 0.35)",
+}
+
+
+def resolve_offload_mode(requested: Optional[str], model_info: Optional[Dict], device: str) -> str:
+    """
+    Pick the effective offload mode
+
+    Order: explicit request > OFFLOAD_MODE setting > model default > 'none'.
+    Offloading only makes sense with an accelerator, so CPU always gets 'none'.
+    Raises ValueError for an explicitly requested tier this diffusers lacks;
+    the OFFLOAD_MODE setting is downgraded instead, so every load does not fail.
+    """
+    mode = requested or settings.OFFLOAD_MODE
+    if mode == "auto" or mode not in OFFLOAD_MODES:
+        if mode not in ("auto", None):
+            logger.warning(f"Unknown offload mode '{mode}', using model default")
+        mode = (model_info or {}).get("offload", "none")
+    if device == "cpu" and mode != "none":
+        logger.info(f"Offload mode '{mode}' ignored on CPU")
+        mode = "none"
+    reason = offload_unavailable(mode)
+    if reason is not None:
+        if requested:
+            raise ValueError(reason)
+        logger.error(f"{reason}; using 'sequential' instead")
+        mode = "sequential"
+    return mode
+
+
+def _group_offload_params() -> Optional[set]:
+    """Keyword arguments of diffusers' group offloading (diffusers >= 0.33), None without it"""
+    try:
+        from diffusers.hooks import apply_group_offloading
+    except ImportError:
+        return None
+    return set(inspect.signature(apply_group_offloading).parameters)
+
+
+def offload_unavailable(mode: str) -> Optional[str]:
+    """Why an offload tier cannot run with the installed diffusers, None if it can"""
+    if mode != "disk":
+        return None
+    params = _group_offload_params()
+    if params is None or "offload_to_disk_path" not in params:
+        return "Disk offload needs group offloading to disk (diffusers >= 0.35)"
+    return None
+
+
+def _apply_group_offload(pipeline: Any, device: str, disk_path: Optional[Path] = None) -> None:
+    """Block-level group offloading with CUDA-stream prefetch from pinned memory"""
+    from diffusers.hooks import apply_group_offloading
+
+    options = {
+        "onload_device": torch.device(device),
+        "offload_device": torch.device("cpu"),
+        "offload_type": "block_level",
+        "num_blocks_per_group": 1,
+        # Streams overlap the copy of block N+1 with compute of block N and
+        # keep offloaded weights in page-locked memory
+        "use_stream": device.startswith("cuda"),
+    }
+    if disk_path is not None:
+        disk_path.mkdir(parents=True, exist_ok=True)
+        options["offload_to_disk_path"] = str(disk_path)
+
+    for name, component in pipeline.components.items():
+        if not isinstance(component, torch.nn.Module):
+            continue
+        if name == "vae":
+            # The VAE is small and runs once; keep it on the device
+            component.to(device)
+            continue
+        apply_group_offloading(component, **options)
+        logger.info(f"Group offloading enabled for {name}")
+
+
+def apply_offload(pipeline: Any, mode: str, device: str, model_key: str = "") -> Any:
+    """Place pipeline weights according to the offload mode and return the pipeline"""
+    if mode == "none":
+        return pipeline.to(device)
+
+    if mode == "model":
+        pipeline.enable_model_cpu_offload(device=device)
+        logger.info("Model-level CPU offload enabled")
+        return pipeline
+
+    reason = offload_unavailable(mode)
+    if reason is not None:
+        raise ValueError(reason)
+
+    if _group_offload_params() is not None:
+        disk_path = None
+        if mode == "disk":
+            disk_path = settings.OFFLOAD_DIR / (model_key.replace("/", "--") or "pipeline")
+        _apply_group_offload(pipeline, device, disk_path)
+        return pipeline
+
+    # diffusers < 0.33: accelerate's per-layer offload. Weights are loaded
+    # into ordinary (pageable) CPU memory and each layer is copied to the
+    # device synchronously when it runs, without prefetch.
+    pipeline.enable_sequential_cpu_offload(device=device)
+    logger.info("Sequential CPU offload enabled (accelerate, no prefetch)")
+    return pipeline
+
+
+def _reset_peak_rss() -> bool:
+    """Reset this process' resident set high-water mark (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    """Resident set high-water mark since the last reset (VmHWM)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class OffloadStats:
+    """Per-model, per-tier measurements of peak memory and step latency"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, Dict]] = {}
+        self._running = 0  # Jobs inside a pipeline call, suspended ones included
+        self._lock = threading.Lock()
+        self._rss_reset = False  # Whether the CPU peak was reset for the current job
+
+    def begin_job(self, device: str) -> None:
+        """
+        Reset the peak memory counter before a generation
+
+        Not while a preempted job is suspended mid-call, which would lose its
+        peak; the preempting job then reports the peak since the suspended
+        job started, an upper bound of its own.
+        """
+        with self._lock:
+            self._running += 1
+            if self._running > 1:
+                return
+        if device.startswith("cuda") and torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats(torch.device(device))
+        else:
+            self._rss_reset = _reset_peak_rss()
+
+    def end_job(self) -> None:
+        """The pipeline call of a job returned (or failed)"""
+        with self._lock:
+            self._running -= 1
+
+    def peak_memory_bytes(self, device: str) -> Optional[int]:
+        """
+        Peak memory of the last job: device memory on CUDA, process RSS on
+        CPU (shared by in-process CPU workers, so an upper bound when they
+        overlap). None where the RSS peak cannot be reset per job (other
+        than Linux), since the lifetime peak says nothing about one job.
+        """
+        if device.startswith("cuda") and torch.cuda.is_available():
+            return torch.cuda.max_memory_allocated(torch.device(device))
+        if not self._rss_reset:
+            return None
+        return _peak_rss_bytes()
+
+    def record_load(self, model_key: str, mode: str, load_seconds: float, device: str) -> None:
+        """Record load time and resident footprint right after loading"""
+        entry = self._entry(model_key, mode)
+        entry["load_time_s"] = round(load_seconds, 2)
+        if device.startswith("cuda") and torch.cuda.is_available():
+            entry["resident_memory_gb"] = round(torch.cuda.memory_allocated(torch.device(device)) / 1024**3, 2)
+
+    def record_job(self, model_key: str, mode: str, device: str, step_seconds: Optional[float]) -> Dict:
+        """Record peak memory and per-step latency of the finished job"""
+        entry = self._entry(model_key, mode)
+        peak_bytes = self.peak_memory_bytes(device)
+        if peak_bytes is not None:
+            peak_gb = peak_bytes / 1024**3
+            entry["peak_memory_gb"] = round(max(entry.get("peak_memory_gb", 0.0), peak_gb), 2)
+            entry["last_peak_memory_gb"] = round(peak_gb, 2)
+        if step_seconds is not None:
+            # Running mean over all jobs on this tier
+            runs = entry.get("runs", 0)
+            previous = entry.get("step_latency_ms", 0.0)
+            entry["step_latency_ms"] = round((previous * runs + step_seconds * 1000) / (runs + 1), 1)
+        entry["runs"] = entry.get("runs", 0) + 1
+        return entry
+
+    def get(self, model_key: Optional[str] = None) -> Dict:
+        """Get stats for one model or all models"""
+        if model_key is not None:
+            return self._stats.get(model_key, {})
+        return self._stats
+
+    def _entry(self, model_key: str, mode: str) -> Dict:
+        return self._stats.setdefault(model_key, {}).setdefault(mode, {})
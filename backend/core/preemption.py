@@ -0,0 +1,273 @@
+"""
+Step-Boundary Preemption
+A worker's pipeline is guarded by a PriorityLock: waiting requests are
+served by priority (FIFO within a priority), and the running job checks at
+every denoising step whether a higher-priority request is waiting. If so it
+suspends inside its step callback: the state other jobs can touch (the
+scheduler, the pipeline's per-call attributes, the global RNG and the
+memory plan) is checkpointed, the lock is handed over, and once the
+preempting job is done the checkpoint is restored and denoising continues.
+The latents never leave the suspended call, so the result is bit-identical
+to an uninterrupted run.
+
+A waiting request may only preempt when it can run on the pipeline exactly
+as it is (same model, same fused LoRAs); other requests wait until every
+suspended job has finished.
+"""
+import copy
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Pipeline attributes owned by the memory policy, restored by re-applying the plan
+MEMORY_PLAN_ATTR = "_memory_plan"
+
+
+class JobPreempted(RuntimeError):
+    """A suspended job found the pipeline changed and cannot resume identically"""
+
+
+class _Entry:
+    """One lock holder or waiter"""
+
+    def __init__(self, priority: int, seq: int, compatible: Optional[Callable[[], bool]]):
+        self.priority = priority
+        self.seq = seq
+        self.compatible = compatible
+        self.thread = threading.get_ident()
+        self.suspended = False
+        self.depth = 0
+
+    @property
+    def order(self) -> tuple:
+        return (-self.priority, self.seq)
+
+    def can_preempt(self) -> bool:
+        if self.compatible is None:
+            return False
+        try:
+            return bool(self.compatible())
+        except Exception:
+            return False
+
+
+class PriorityLock:
+    """
+    Reentrant lock granted by priority that the holder can yield at step boundaries
+
+    Drop-in for threading.RLock (acquire/release/with). hold(priority,
+    compatible) acquires with a priority; compatible() tells whether the
+    request could run while other jobs are suspended.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._seq = itertools.count()
+        self._holder: Optional[_Entry] = None
+        self._waiters: List[_Entry] = []  # Suspended jobs included
+        self.preemptions = 0
+
+    def _next(self) -> Optional[_Entry]:
+        """
+        The waiter to grant the free lock to
+
+        Without suspended jobs: highest priority, then oldest. With suspended
+        jobs: the top suspended job resumes unless a compatible waiter of
+        higher priority can run first.
+        """
+        if not self._waiters:
+            return None
+        suspended = [e for e in self._waiters if e.suspended]
+        if not suspended:
+            return min(self._waiters, key=lambda e: e.order)
+        resume = min(suspended, key=lambda e: e.order)
+        preemptors = [
+            e for e in self._waiters
+            if not e.suspended and e.priority > resume.priority and e.can_preempt()
+        ]
+        return min(preemptors, key=lambda e: e.order) if preemptors else resume
+
+    def _wait_for_turn(self, entry: _Entry, blocking: bool) -> bool:
+        # Caller holds self._cond
+        self._waiters.append(entry)
+        while not (self._holder is None and self._next() is entry):
+            if not blocking:
+                self._waiters.remove(entry)
+                return False
+            self._cond.wait()
+        self._waiters.remove(entry)
+        self._holder = entry
+        return True
+
+    def acquire(
+        self,
+        blocking: bool = True,
+        priority: int = 0,
+        compatible: Optional[Callable[[], bool]] = None
+    ) -> bool:
+        with self._cond:
+            holder = self._holder
+            if holder is not None and holder.thread == threading.get_ident():
+                holder.depth += 1
+                return True
+            entry = _Entry(priority, next(self._seq), compatible)
+            if not self._wait_for_turn(entry, blocking):
+                return False
+            entry.depth = 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            holder = self._holder
+            if holder is None or holder.thread != threading.get_ident():
+                raise RuntimeError("cannot release un-acquired lock")
+            holder.depth -= 1
+            if holder.depth == 0:
+                self._holder = None
+                self._cond.notify_all()
+
+    def __enter__(self) -> "PriorityLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    @contextmanager
+    def hold(self, priority: int = 0, compatible: Optional[Callable[[], bool]] = None) -> Iterator[None]:
+        """Hold the lock with a priority; compatible() allows preempting suspended jobs"""
+        self.acquire(priority=priority, compatible=compatible)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def should_yield(self) -> bool:
+        """Whether a higher-priority waiter could run on the holder's pipeline now"""
+        with self._cond:
+            holder = self._holder
+            if holder is None or holder.thread != threading.get_ident():
+                return False
+            return any(
+                not e.suspended and e.priority > holder.priority and e.can_preempt()
+                for e in self._waiters
+            )
+
+    def suspend(self) -> float:
+        """
+        Hand the lock to the waiters and block until it is this job's turn again
+
+        Keeps the job's priority and queue position, so it resumes ahead of
+        requests that arrived after it. Returns the seconds spent suspended.
+        """
+        with self._cond:
+            entry = self._holder
+            if entry is None or entry.thread != threading.get_ident():
+                raise RuntimeError("cannot suspend un-acquired lock")
+            self.preemptions += 1
+            suspended_at = time.perf_counter()
+            entry.suspended = True
+            self._holder = None
+            self._cond.notify_all()
+            self._wait_for_turn(entry, blocking=True)
+            entry.suspended = False
+            return time.perf_counter() - suspended_at
+
+    def status(self) -> Dict:
+        with self._cond:
+            return {
+                "holder_priority": self._holder.priority if self._holder else None,
+                "waiting": sum(1 for e in self._waiters if not e.suspended),
+                "suspended": sum(1 for e in self._waiters if e.suspended),
+                "preemptions": self.preemptions,
+            }
+
+
+def _rng_states(device: str) -> Dict:
+    states = {"cpu": torch.get_rng_state()}
+    if device.startswith("cuda") and torch.cuda.is_available():
+        states["cuda"] = torch.cuda.get_rng_state(device)
+    return states
+
+
+def _restore_rng(device: str, states: Dict) -> None:
+    torch.set_rng_state(states["cpu"])
+    if "cuda" in states:
+        torch.cuda.set_rng_state(states["cuda"], device)
+
+
+def checkpoint(pipeline: Any, device: str) -> Dict:
+    """Snapshot the pipeline state a job running in between could modify"""
+    scheduler = pipeline.scheduler
+    call_state = {
+        name: value for name, value in vars(pipeline).items()
+        if name.startswith("_") and name != MEMORY_PLAN_ATTR
+        and not isinstance(value, torch.nn.Module) and not callable(value)
+    }
+    return {
+        "scheduler": scheduler,
+        "scheduler_state": copy.deepcopy(vars(scheduler)),
+        "call_state": call_state,
+        "rng": _rng_states(device),
+        "memory_plan": getattr(pipeline, MEMORY_PLAN_ATTR, None),
+    }
+
+
+def restore(pipeline: Any, device: str, saved: Dict) -> None:
+    """Put a checkpoint back (the memory plan is re-applied by the caller)"""
+    scheduler = saved["scheduler"]
+    vars(scheduler).clear()
+    vars(scheduler).update(saved["scheduler_state"])
+    pipeline.scheduler = scheduler
+    for name, value in saved["call_state"].items():
+        setattr(pipeline, name, value)
+    _restore_rng(device, saved["rng"])
+
+
+class StepPreemption:
+    """
+    Step callback that suspends the running job for higher-priority requests
+
+    state() returns a token of everything the job's output depends on
+    besides the checkpoint (model, pipeline objects, fused LoRAs); if it
+    differs after resuming, JobPreempted is raised instead of producing a
+    different image. on_resume(memory_plan) re-applies the job's memory plan.
+    """
+
+    def __init__(
+        self,
+        lock: PriorityLock,
+        device: str,
+        state: Callable[[], Any],
+        on_resume: Callable[[Optional[Dict]], None],
+        on_suspended: Callable[[float], None]
+    ):
+        self.lock = lock
+        self.device = device
+        self.state = state
+        self.on_resume = on_resume
+        self.on_suspended = on_suspended
+
+    def __call__(self, pipeline: Any, step: int, timestep: Any, callback_kwargs: Dict) -> Dict:
+        if not self.lock.should_yield():
+            return callback_kwargs
+
+        token = self.state()
+        saved = checkpoint(pipeline, self.device)
+        logger.info(f"Suspending job after step {step + 1} for a higher-priority request")
+        waited = self.lock.suspend()
+
+        if self.state() != token:
+            raise JobPreempted("The pipeline changed while this job was suspended; retry the request")
+        restore(pipeline, self.device, saved)
+        self.on_resume(saved["memory_plan"])
+        self.on_suspended(waited)
+        logger.info(f"Resumed job at step {step + 2} after {waited:.1f}s")
+        return callback_kwargs
@@ -0,0 +1,172 @@
+"""
+On-Demand Profiler
+Capture torch.profiler traces and sampled Python stacks for the next N
+generations (or a single flagged request). When nothing is armed, capture()
+is a null context and costs nothing.
+"""
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+import logging
+
+import torch
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Keep the newest captures listed (files stay on disk)
+MAX_CAPTURES = 50
+
+
+class StackSampler:
+    """Sample one thread's Python stack at a fixed interval into collapsed stacks"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def write_collapsed(self, path: Path) -> None:
+        """Brendan Gregg collapsed format (flamegraph.pl, speedscope)"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfilerController:
+    """Arms profiling for upcoming generations and records the captures"""
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.remaining = 0
+        self.captures: List[Dict] = []
+        self._capturing = False  # torch.profiler supports one session per process
+        self._lock = threading.Lock()
+
+    def arm(self, count: int = 1) -> Dict:
+        """Profile the next `count` generations"""
+        with self._lock:
+            self.remaining = count
+        logger.info(f"Profiler armed for {count} generation(s)")
+        return self.status()
+
+    def disarm(self) -> Dict:
+        with self._lock:
+            self.remaining = 0
+        return self.status()
+
+    def status(self) -> Dict:
+        return {
+            "armed": self.remaining > 0,
+            "remaining": self.remaining,
+            "capturing": self._capturing,
+            "output_dir": str(self.output_dir),
+            "captures": list(reversed(self.captures)),
+        }
+
+    def get_capture(self, capture_id: str) -> Optional[Dict]:
+        return next((c for c in self.captures if c["id"] == capture_id), None)
+
+    def capture(self, name: str, force: bool = False):
+        """
+        Context manager profiling the enclosed block if armed (or forced)
+
+        Consumes one armed generation. Not armed, or another capture already
+        running on a different device: a null context.
+        """
+        if not force and self.remaining <= 0:
+            return nullcontext()
+        with self._lock:
+            if self._capturing or (not force and self.remaining <= 0):
+                return nullcontext()
+            if not force:
+                self.remaining -= 1
+            self._capturing = True
+        return self._profile(name)
+
+    @contextmanager
+    def _profile(self, name: str) -> Iterator[None]:
+        try:
+            capture_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+            sampler = StackSampler(threading.get_ident(), settings.PROFILER_SAMPLE_INTERVAL_MS / 1000)
+            profiler = torch.profiler.profile(activities=activities, record_shapes=True)
+
+            logger.info(f"Profiling {name} as capture {capture_id}")
+            started = time.perf_counter()
+            with profiler:
+                sampler.start()
+                try:
+                    yield
+                finally:
+                    sampler.stop()
+            elapsed = time.perf_counter() - started
+
+            try:
+                self._write(capture_id, name, profiler, sampler, elapsed, activities)
+            except Exception as e:
+                logger.error(f"Could not write profile {capture_id}: {e}")
+        finally:
+            self._capturing = False
+
+    def _write(self, capture_id, name, profiler, sampler, elapsed, activities) -> None:
+        trace_path = self.output_dir / f"{capture_id}.trace.json"
+        stacks_path = self.output_dir / f"{capture_id}.stacks.txt"
+        ops_path = self.output_dir / f"{capture_id}.ops.txt"
+
+        profiler.export_chrome_trace(str(trace_path))
+        sampler.write_collapsed(stacks_path)
+
+        sort_by = "self_cuda_time_total" if len(activities) > 1 else "self_cpu_time_total"
+        table = profiler.key_averages().table(sort_by=sort_by, row_limit=60)
+        ops_path.write_text(table, encoding="utf-8")
+
+        capture = {
+            "id": capture_id,
+            "name": name,
+            "seconds": round(elapsed, 3),
+            "stack_samples": sum(sampler.stacks.values()),
+            "files": {
+                "trace": trace_path.name,
+                "stacks": stacks_path.name,
+                "ops": ops_path.name,
+            },
+        }
+        with self._lock:
+            self.captures.append(capture)
+            del self.captures[:-MAX_CAPTURES]
+        logger.info(f"Profile {capture_id} written to {self.output_dir} ({elapsed:.1f}s)")
+
+
+# Global instance
+profiler_controller = ProfilerController(settings.DIAGNOSTICS_DIR)
@@ -0,0 +1,162 @@
+"""
+Weight-Only Quantization
+Keep the large Linear weights of the denoiser (UNet/transformer) and of big
+text encoders (T5 for FLUX, Qwen2.5-VL) in int8 or fp8 with one scale per
+output channel, and dequantize each weight to the activation dtype right
+before its matmul. Activations stay in full precision, so quality is close
+to the unquantized model while weight memory roughly halves (fp16) or
+quarters (fp32). Pure PyTorch: works on CPU as well as CUDA.
+"""
+import time
+from typing import Any, Dict, Optional
+import logging
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PRECISION_MODES = {
+    "none": "Weights in the model dtype (fp16 on CUDA, fp32 on CPU)",
+    "int8": "Weight-only int8, per-channel scales; dequantized per layer at run time",
+    "fp8": "Weight-only fp8 (e4m3), per-channel scales; dequantized per layer at run time",
+}
+
+# Components quantized whenever present, and text encoders worth quantizing
+DENOISER_COMPONENTS = ("unet", "transformer")
+TEXT_ENCODER_COMPONENTS = ("text_encoder", "text_encoder_2", "text_encoder_3")
+TEXT_ENCODER_MIN_PARAMS = 1_000_000_000  # T5-XXL and Qwen2.5-VL, not CLIP
+
+# Small layers gain little and are often precision sensitive
+MIN_LINEAR_FEATURES = 256
+
+INT8_MAX = 127.0
+FP8_MAX = 448.0  # Largest finite float8_e4m3fn value
+
+
+def resolve_precision(requested: Optional[str]) -> str:
+    """Explicit request > WEIGHT_PRECISION setting; unknown values fall back to 'none'"""
+    precision = requested or settings.WEIGHT_PRECISION
+    if precision not in PRECISION_MODES:
+        logger.warning(f"Unknown weight precision '{precision}', using none")
+        return "none"
+    if precision == "fp8" and not hasattr(torch, "float8_e4m3fn"):
+        logger.warning("This PyTorch build has no float8 support, using int8")
+        return "int8"
+    return precision
+
+
+class QuantLinear(nn.Module):
+    """
+    Linear layer with int8/fp8 weight storage and per-output-channel scales
+
+    fp8 weights are stored as their uint8 bit pattern so module.to(dtype)
+    (which converts every floating point tensor) leaves them alone.
+    """
+
+    def __init__(self, linear: nn.Linear, mode: str):
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        self.mode = mode
+
+        weight = linear.weight.detach().float()
+        amax = weight.abs().amax(dim=1).clamp(min=1e-8)
+        if mode == "int8":
+            scale = amax / INT8_MAX
+            stored = torch.round(weight / scale[:, None]).clamp(-INT8_MAX, INT8_MAX).to(torch.int8)
+        else:
+            scale = amax / FP8_MAX
+            stored = (weight / scale[:, None]).to(torch.float8_e4m3fn).view(torch.uint8)
+        self.weight_q = nn.Parameter(stored, requires_grad=False)
+        self.scale = nn.Parameter(scale.to(linear.weight.dtype), requires_grad=False)
+        self.bias = linear.bias
+
+    @property
+    def weight(self) -> torch.Tensor:
+        """
+        Shape and dtype stand-in for code that inspects layer.weight
+
+        (e.g. T5 casting activations to the weight dtype). Lives on the meta
+        device, so any attempt to compute with it fails loudly.
+        """
+        return torch.empty((self.out_features, self.in_features), dtype=self.scale.dtype, device="meta")
+
+    def dequantize(self, dtype: torch.dtype) -> torch.Tensor:
+        stored = self.weight_q
+        if self.mode == "fp8":
+            stored = stored.view(torch.float8_e4m3fn)
+        return stored.to(dtype) * self.scale.to(dtype)[:, None]
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        bias = self.bias.to(x.dtype) if self.bias is not None else None
+        return F.linear(x, self.dequantize(x.dtype), bias)
+
+    def extra_repr(self) -> str:
+        return f"in_features={self.in_features}, out_features={self.out_features}, mode={self.mode}"
+
+
+def _param_bytes(module: nn.Module) -> int:
+    return sum(p.numel() * p.element_size() for p in module.parameters())
+
+
+def quantize_module(module: nn.Module, mode: str) -> int:
+    """Replace large nn.Linear layers in place; returns the number replaced"""
+    replaced = 0
+    for name, child in list(module.named_children()):
+        if isinstance(child, nn.Linear) and min(child.in_features, child.out_features) >= MIN_LINEAR_FEATURES:
+            setattr(module, name, QuantLinear(child, mode))
+            replaced += 1
+        else:
+            replaced += quantize_module(child, mode)
+    return replaced
+
+
+def _targets(pipeline: Any) -> Dict[str, nn.Module]:
+    components = getattr(pipeline, "components", {}) or {}
+    targets = {name: components[name] for name in DENOISER_COMPONENTS if isinstance(components.get(name), nn.Module)}
+    for name in TEXT_ENCODER_COMPONENTS:
+        encoder = components.get(name)
+        if isinstance(encoder, nn.Module) and sum(p.numel() for p in encoder.parameters()) >= TEXT_ENCODER_MIN_PARAMS:
+            targets[name] = encoder
+    return targets
+
+
+def apply_quantization(pipeline: Any, precision: str) -> Optional[Dict]:
+    """
+    Quantize a freshly loaded pipeline (before offloading/moving it)
+
+    Returns per-component memory before/after and the time it took, or
+    None for precision 'none'.
+    """
+    if precision == "none":
+        return None
+    started_at = time.perf_counter()
+    components = {}
+    for name, module in _targets(pipeline).items():
+        before = _param_bytes(module)
+        layers = quantize_module(module, precision)
+        after = _param_bytes(module)
+        components[name] = {
+            "layers": layers,
+            "bytes_before": before,
+            "bytes_after": after,
+        }
+        logger.info(
+            f"Quantized {name} to {precision}: {layers} layers, "
+            f"{before / 1024**3:.2f} GB -> {after / 1024**3:.2f} GB"
+        )
+    before = sum(c["bytes_before"] for c in components.values())
+    after = sum(c["bytes_after"] for c in components.values())
+    return {
+        "precision": precision,
+        "components": components,
+        "bytes_before": before,
+        "bytes_after": after,
+        "saved_gb": round((before - after) / 1024**3, 2),
+        "quantize_seconds": round(time.perf_counter() - started_at, 2),
+    }
+
@@ -0,0 +1,119 @@
+"""
+Deterministic Result Cache
+Content-addressed keys for seeded generations plus coalescing of identical
+requests that are in flight at the same time
+"""
+import asyncio
+import base64
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def hash_input_image(input_image_base64: Optional[str]) -> Optional[str]:
+    """SHA-256 of the decoded input image bytes (data URL prefix ignored)"""
+    if not input_image_base64:
+        return None
+    if "," in input_image_base64:
+        input_image_base64 = input_image_base64.split(",")[1]
+    return hashlib.sha256(base64.b64decode(input_image_base64)).hexdigest()
+
+
+def make_cache_key(
+    model_key: str,
+    dtype: str,
+    loras: List[Dict],
+    prompt: str,
+    negative_prompt: str,
+    width: int,
+    height: int,
+    steps: int,
+    guidance_scale: float,
+    num_images: int,
+    seed: int,
+    scheduler: Optional[str],
+    clip_skip: int,
+    strength: Optional[float] = None,
+    input_image_hash: Optional[str] = None,
+    hires: Optional[Dict] = None,
+    precision: str = "none",
+    cpu_mode: Optional[Dict] = None
+) -> str:
+    """
+    Build a content-addressed key from every input that determines the output
+
+    Only meaningful for requests with a fixed seed. precision is the weight
+    precision the model runs at (int8/fp8 weights change the pixels);
+    cpu_mode the autocast dtype and fusion backend of CPU performance mode.
+    """
+    payload = {
+        "model": model_key,
+        "dtype": dtype,
+        "loras": sorted((str(l.get("file_path")), float(l.get("weight", 1.0))) for l in loras),
+        "prompt": prompt,
+        "negative_prompt": negative_prompt or "",
+        "size": [width, height],
+        "steps": steps,
+        "guidance": round(float(guidance_scale), 4),
+        "num_images": num_images,
+        "seed": seed,
+        "scheduler": scheduler or "",
+        "clip_skip": clip_skip,
+        "strength": round(float(strength), 4) if input_image_hash and strength is not None else None,
+        "input_image": input_image_hash,
+    }
+    # Absent when off, so existing keys stay valid
+    if hires:
+        payload["hires"] = hires
+    if precision != "none":
+        payload["precision"] = precision
+    if cpu_mode and any(cpu_mode.values()):
+        payload["cpu"] = cpu_mode
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class RequestCoalescer:
+    """Run identical concurrent requests once and share the result"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> tuple:
+        """
+        Await the in-flight call for key, or start it
+
+        Returns (result, coalesced) where coalesced tells whether this caller
+        piggybacked on another request.
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            logger.info(f"Coalescing identical request {key[:12]}")
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await factory()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure does not log a warning
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+
+# Global instance
+request_coalescer = RequestCoalescer()
@@ -0,0 +1,367 @@
+"""
+Output Retention and Garbage Collection
+Background task that applies the retention policy (max age, max total
+size, keep favorites) and reconciles generation rows with files on disk.
+Work runs in short time-boxed slices with file I/O off the event loop, so
+request handling is never blocked for long.
+
+GC_ORPHAN_POLICY decides what happens to orphans in both directions:
+"delete" (default) removes image files no row refers to and rows whose
+file has been missing for two consecutive passes; "quarantine" moves such
+files into GC_QUARANTINE_DIR and only flags the rows (file_missing);
+"flag" only flags rows and counts files. Paths are compared relative to
+OUTPUTS_DIR, files younger than GC_ORPHAN_GRACE_SECONDS are kept, and
+nothing is removed while the database has no generations under the
+current root (fresh database, moved install), while OUTPUTS_DIR is empty
+(unmounted volume) or for rows pointing outside it.
+"""
+import asyncio
+import itertools
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+import logging
+
+from config import settings
+from models.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Output subdirectories not tracked in the generations table
+UNTRACKED_DIRS = ("videos", "sheets")
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+
+ORPHAN_POLICIES = ("flag", "quarantine", "delete")
+
+
+def orphan_policy() -> str:
+    return settings.GC_ORPHAN_POLICY if settings.GC_ORPHAN_POLICY in ORPHAN_POLICIES else "flag"
+
+
+class OutputGC:
+    """Retention policy plus two-way orphan collection for outputs and history rows"""
+
+    def __init__(self, db: Database, root: Path):
+        self.db = db
+        self.root = root
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._row_cursor = 0
+        self._file_walk: Optional[Iterator[Path]] = None
+        self._referenced: Optional[Set[str]] = None  # Snapshot for the current file pass
+        self.stats = {
+            "slices": 0,
+            "expired_rows": 0,
+            "over_budget_rows": 0,
+            "rows_flagged_missing": 0,
+            "rows_found_again": 0,
+            "missing_rows_deleted": 0,
+            "orphan_files": 0,
+            "orphan_files_deleted": 0,
+            "files_quarantined": 0,
+            "orphans_refused": False,
+            "files_deleted": 0,
+            "bytes_freed": 0,
+            "row_passes": 0,
+            "file_passes": 0,
+            "free_pages": None,
+            "last_slice_at": None,
+            "last_slice_seconds": None,
+        }
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Output GC running every {settings.GC_INTERVAL}s")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.GC_INTERVAL)
+            try:
+                await self.run_slice()
+            except Exception as e:
+                logger.warning(f"Output GC slice failed: {e}")
+
+    async def run_slice(self) -> Dict:
+        """One time-boxed pass: retention, row reconcile, file reconcile, vacuum"""
+        async with self._lock:
+            started_at = time.monotonic()
+            deadline = started_at + settings.GC_SLICE_SECONDS
+            if self.root.exists():
+                await self._apply_retention(deadline)
+                await self._reconcile_rows(deadline)
+                await self._reconcile_files(deadline)
+            self.stats["free_pages"] = await self.db.incremental_vacuum(settings.GC_VACUUM_PAGES)
+            self.stats["slices"] += 1
+            self.stats["last_slice_at"] = time.time()
+            self.stats["last_slice_seconds"] = round(time.monotonic() - started_at, 3)
+        return self.status()
+
+    def status(self) -> Dict:
+        return {
+            "running": self._task is not None,
+            "policy": {
+                "max_age_days": settings.RETENTION_MAX_AGE_DAYS,
+                "max_total_gb": settings.RETENTION_MAX_TOTAL_GB,
+                "keep_favorites": settings.RETENTION_KEEP_FAVORITES,
+                "orphans": orphan_policy(),
+            },
+            "row_cursor": self._row_cursor,
+            **self.stats,
+        }
+
+    # Retention
+    async def _apply_retention(self, deadline: float) -> None:
+        keep_favorites = settings.RETENTION_KEEP_FAVORITES
+        batch_size = settings.GC_BATCH_SIZE
+
+        if settings.RETENTION_MAX_AGE_DAYS > 0:
+            # created_at is stored by SQLite as UTC text
+            cutoff = (datetime.utcnow() - timedelta(days=settings.RETENTION_MAX_AGE_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+            while time.monotonic() < deadline:
+                ids = await self.db.get_expired_generation_ids(cutoff, keep_favorites, batch_size)
+                if not ids:
+                    break
+                await self._delete_rows(ids)
+                self.stats["expired_rows"] += len(ids)
+
+        if settings.RETENTION_MAX_TOTAL_GB > 0:
+            budget = int(settings.RETENTION_MAX_TOTAL_GB * 1024**3)
+            while time.monotonic() < deadline:
+                excess = await self.db.get_total_output_bytes() - budget
+                if excess <= 0:
+                    break
+                rows = await self.db.get_oldest_generations(keep_favorites, batch_size)
+                if not rows:
+                    break
+                # Just enough of the oldest rows to get under budget
+                ids = []
+                for row in rows:
+                    ids.append(row["id"])
+                    excess -= row["file_size"] or 0
+                    if excess <= 0:
+                        break
+                await self._delete_rows(ids)
+                self.stats["over_budget_rows"] += len(ids)
+
+    async def _delete_rows(self, ids: List[int]) -> None:
+        orphaned = await self.db.delete_generations(ids)
+        await asyncio.to_thread(self.remove_files, orphaned)
+
+    def _relative(self, path) -> Optional[str]:
+        """Path relative to the output root (posix), None for files elsewhere"""
+        path = Path(path)
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            pass
+        try:
+            return path.resolve().relative_to(self.root.resolve()).as_posix()
+        except (ValueError, OSError):
+            return None
+
+    def _inside_root(self, path: Path) -> bool:
+        try:
+            path.resolve().relative_to(self.root.resolve())
+            return True
+        except (ValueError, OSError):
+            return False
+
+    def remove_files(self, paths: List[str], grace: bool = False) -> int:
+        """
+        Delete output files no generation refers to any more
+
+        Files outside OUTPUTS_DIR are never touched. Explicitly deleted
+        rows take their file along at once; with grace, as for files found
+        by the walk, files modified within the grace period are kept since
+        a running request may just have written or deduplicated onto one
+        before its history row exists. Returns the number of files deleted.
+        """
+        min_age = settings.GC_ORPHAN_GRACE_SECONDS if grace else 0
+        now = time.time()
+        deleted = 0
+        for path in map(Path, paths):
+            if not self._inside_root(path):
+                continue
+            try:
+                stat = path.stat()
+                if now - stat.st_mtime < min_age:
+                    continue
+                path.unlink()
+                deleted += 1
+                self.stats["files_deleted"] += 1
+                self.stats["bytes_freed"] += stat.st_size
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not delete {path}: {e}")
+        return deleted
+
+    def quarantine_files(self, paths: List[Path]) -> int:
+        """
+        Move unreferenced output files into GC_QUARANTINE_DIR
+
+        Files keep their path relative to OUTPUTS_DIR, so moving them back
+        restores them. Files modified within the grace period are kept.
+        Returns the number of files moved.
+        """
+        grace = settings.GC_ORPHAN_GRACE_SECONDS
+        now = time.time()
+        moved = 0
+        for path in paths:
+            relative = self._relative(path)
+            if relative is None:
+                continue
+            try:
+                if now - path.stat().st_mtime < grace:
+                    continue
+                target = settings.GC_QUARANTINE_DIR / relative
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(path), str(target))
+                moved += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not quarantine {path}: {e}")
+        return moved
+
+    # Rows -> files
+    def _check_rows(self, rows: List[Dict]):
+        """
+        Sizes to backfill, ids of rows whose file is gone, of flagged rows
+        whose file is back and of flagged rows under the root still missing
+        """
+        keep_favorites = settings.RETENTION_KEEP_FAVORITES
+        sizes, missing, found, gone = [], [], [], []
+        for row in rows:
+            try:
+                size = os.path.getsize(row["file_path"])
+            except OSError:
+                if not row["file_missing"]:
+                    missing.append(row["id"])
+                elif self._relative(row["file_path"]) is not None and not (keep_favorites and row["is_favorite"]):
+                    gone.append(row["id"])
+                continue
+            if row["file_missing"]:
+                found.append(row["id"])
+            if row["file_size"] != size:
+                sizes.append({"id": row["id"], "file_size": size})
+        return sizes, missing, found, gone
+
+    def _root_empty(self) -> bool:
+        with os.scandir(self.root) as entries:
+            return next(entries, None) is None
+
+    async def _reconcile_rows(self, deadline: float) -> None:
+        delete = orphan_policy() == "delete" and not await asyncio.to_thread(self._root_empty)
+        while time.monotonic() < deadline:
+            rows = await self.db.get_generation_files(self._row_cursor, settings.GC_BATCH_SIZE)
+            if not rows:
+                # Full pass done; start over on the next slice
+                self._row_cursor = 0
+                self.stats["row_passes"] += 1
+                return
+            sizes, missing, found, gone = await asyncio.to_thread(self._check_rows, rows)
+            if missing:
+                await self.db.set_files_missing(missing, True)
+                self.stats["rows_flagged_missing"] += len(missing)
+            if found:
+                await self.db.set_files_missing(found, False)
+                self.stats["rows_found_again"] += len(found)
+            if gone and delete:
+                # Flagged on an earlier pass and still missing
+                await self.db.delete_generations(gone)
+                self.stats["missing_rows_deleted"] += len(gone)
+            if sizes:
+                await self.db.set_file_sizes(sizes)
+            self._row_cursor = rows[-1]["id"]
+
+    # Files -> rows
+    def _walk(self) -> Iterator[Path]:
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if Path(dirpath) == self.root:
+                dirnames[:] = [d for d in dirnames if d not in UNTRACKED_DIRS]
+            for name in filenames:
+                yield Path(dirpath) / name
+
+    def _next_files(self) -> Optional[List[Path]]:
+        if self._file_walk is None:
+            self._file_walk = self._walk()
+        files = list(itertools.islice(self._file_walk, settings.GC_BATCH_SIZE))
+        if not files:
+            self._file_walk = None
+            return None
+        return files
+
+    def _relative_set(self, paths: List[str]) -> Set[str]:
+        relative = (self._relative(path) for path in paths)
+        return {path for path in relative if path is not None}
+
+    async def _start_file_pass(self) -> None:
+        """
+        Snapshot the referenced paths; files written after it are covered by
+        the grace period, and orphans are re-checked before they are moved
+        """
+        self._referenced = await asyncio.to_thread(self._relative_set, await self.db.get_all_file_paths())
+        self.stats["orphan_files"] = 0  # Counted per pass
+        refused = not self._referenced
+        if refused and orphan_policy() != "flag" and not self.stats["orphans_refused"]:
+            logger.warning(
+                f"No generation refers to a file under {self.root}; leaving unreferenced outputs alone "
+                f"(empty database, restored backup or moved install?)"
+            )
+        self.stats["orphans_refused"] = refused
+
+    async def _reconcile_files(self, deadline: float) -> None:
+        if self._referenced is None:
+            await self._start_file_pass()
+        while time.monotonic() < deadline:
+            files = await asyncio.to_thread(self._next_files)
+            if files is None:
+                self._referenced = None
+                self.stats["file_passes"] += 1
+                return
+
+            # Interrupted writes and imports leave .part files behind
+            stale = [str(f) for f in files if f.suffix == ".part"]
+            if stale:
+                await asyncio.to_thread(self.remove_files, stale, grace=True)
+
+            if not self._referenced:
+                continue
+            orphans = [
+                f for f in files
+                if f.suffix.lower() in IMAGE_SUFFIXES and f.relative_to(self.root).as_posix() not in self._referenced
+            ]
+            if not orphans:
+                continue
+            # Rows written since the snapshot
+            referenced = await self.db.get_referenced_paths([str(f) for f in orphans])
+            orphans = [f for f in orphans if str(f) not in referenced]
+            self.stats["orphan_files"] += len(orphans)
+            if not orphans:
+                continue
+            policy = orphan_policy()
+            if policy == "delete":
+                self.stats["orphan_files_deleted"] += await asyncio.to_thread(
+                    self.remove_files, [str(f) for f in orphans], grace=True
+                )
+            elif policy == "quarantine":
+                self.stats["files_quarantined"] += await asyncio.to_thread(self.quarantine_files, orphans)
+
+
+# Global instance
+output_gc = OutputGC(Database(settings.DB_PATH), settings.OUTPUTS_DIR)
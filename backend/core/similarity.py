@@ -0,0 +1,275 @@
+"""
+Visual Similarity Index
+One image embedding per generation, kept as a contiguous float16 matrix
+that is memory-mapped from disk and appended to as images are saved.
+Nearest-neighbour queries are a blocked matrix-vector product over the
+whole matrix followed by a partial sort.
+
+Embedders:
+- phash: 64-bit DCT perceptual hash as a +-1/8 vector (dot = 1 - hamming/32)
+- clip:  normalized CLIP image embedding (optional, loads transformers lazily)
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+from PIL import Image
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rows converted to float32 per step of a query
+SEARCH_BLOCK_ROWS = 65536
+
+PHASH_SIZE = 32  # Grayscale thumbnail side
+PHASH_BITS = 8   # Low-frequency DCT block side (64-bit hash)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * x + 1) * k / (2 * n)).astype(np.float32)
+
+
+class PerceptualHash:
+    """DCT perceptual hash; cheap enough to run inline on every save"""
+
+    name = "phash"
+    dim = PHASH_BITS * PHASH_BITS
+
+    def __init__(self):
+        self._dct = _dct_matrix(PHASH_SIZE)
+
+    def embed(self, images: Sequence[Image.Image]) -> np.ndarray:
+        vectors = np.empty((len(images), self.dim), dtype=np.float16)
+        scale = 1.0 / np.sqrt(self.dim)
+        for i, image in enumerate(images):
+            pixels = np.asarray(
+                image.convert("L").resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float32
+            )
+            coefficients = (self._dct @ pixels @ self._dct.T)[:PHASH_BITS, :PHASH_BITS].ravel()
+            # Median without the DC term, which only carries mean brightness
+            bits = coefficients > np.median(coefficients[1:])
+            vectors[i] = np.where(bits, scale, -scale)
+        return vectors
+
+
+class ClipEmbedder:
+    """CLIP image embeddings, loaded on first use"""
+
+    def __init__(self, model_id: str, device: str):
+        self.model_id = model_id
+        self.device = device
+        self.name = "clip-" + model_id.rstrip("/").split("/")[-1]
+        self._model = None
+        self._processor = None
+        self._dim: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def dim(self) -> int:
+        if self._dim is None:
+            from transformers import CLIPVisionConfig
+            self._dim = CLIPVisionConfig.from_pretrained(self.model_id).projection_dim
+        return self._dim
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from transformers import CLIPImageProcessor, CLIPVisionModelWithProjection
+                logger.info(f"Loading {self.model_id} for similarity search on {self.device}")
+                self._processor = CLIPImageProcessor.from_pretrained(self.model_id)
+                self._model = CLIPVisionModelWithProjection.from_pretrained(self.model_id).to(self.device).eval()
+        return self._model, self._processor
+
+    def embed(self, images: Sequence[Image.Image]) -> np.ndarray:
+        import torch
+        model, processor = self._load()
+        inputs = processor(images=[image.convert("RGB") for image in images], return_tensors="pt").to(self.device)
+        with torch.inference_mode():
+            embeds = model(**inputs).image_embeds.float()
+        embeds = torch.nn.functional.normalize(embeds, dim=-1)
+        return embeds.cpu().numpy().astype(np.float16)
+
+
+def get_embedder(name: str):
+    if name == "phash":
+        return PerceptualHash()
+    if name == "clip":
+        return ClipEmbedder(settings.SIMILARITY_CLIP_MODEL, settings.SIMILARITY_DEVICE)
+    raise ValueError(f"Unknown similarity embedder: {name} (use phash or clip)")
+
+
+class SimilarityIndex:
+    """
+    Append-only embedding matrix plus generation ids, one pair of files per embedder
+
+    <name>.f16 holds N x dim float16 rows and <name>.ids the matching int64
+    generation ids. Rows are only ever appended; deleted generations drop
+    out when their ids no longer resolve, and compact() rewrites the files.
+    """
+
+    def __init__(self, directory: Path, embedder_name: str):
+        self.directory = directory
+        self.embedder_name = embedder_name
+        self._embedder = None
+        self._lock = threading.Lock()
+        self._count = 0
+        self._vectors: Optional[np.memmap] = None
+        self._ids = np.empty(0, dtype=np.int64)
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = get_embedder(self.embedder_name)
+        return self._embedder
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.directory / f"{self.embedder.name}.f16"
+
+    @property
+    def ids_path(self) -> Path:
+        return self.directory / f"{self.embedder.name}.ids"
+
+    def _rows_on_disk(self) -> int:
+        try:
+            vectors = self.vectors_path.stat().st_size // (self.embedder.dim * 2)
+            ids = self.ids_path.stat().st_size // 8
+        except FileNotFoundError:
+            return 0
+        return min(vectors, ids)
+
+    def _refresh(self) -> None:
+        """Remap the files if rows were appended since the last query (lock held)"""
+        count = self._rows_on_disk()
+        if count == self._count:
+            return
+        if count:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(count, self.embedder.dim))
+            self._ids = np.fromfile(self.ids_path, dtype=np.int64, count=count)
+        else:
+            self._vectors, self._ids = None, np.empty(0, dtype=np.int64)
+        self._count = count
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._count
+
+    # Writes
+    def append(self, gen_ids: Sequence[int], vectors: np.ndarray) -> None:
+        if not len(gen_ids):
+            return
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # An interrupted append leaves one file longer than the other; cut both back first
+            count = self._rows_on_disk()
+            for path, row_bytes in ((self.vectors_path, self.embedder.dim * 2), (self.ids_path, 8)):
+                if path.exists() and path.stat().st_size != count * row_bytes:
+                    os.truncate(path, count * row_bytes)
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float16).tobytes())
+            with open(self.ids_path, "ab") as f:
+                f.write(np.asarray(gen_ids, dtype=np.int64).tobytes())
+
+    def embed_files(self, paths: Sequence[str]) -> Tuple[List[int], np.ndarray]:
+        """Embeddings of the readable images among paths, with their positions"""
+        images, positions = [], []
+        for position, path in enumerate(paths):
+            try:
+                with Image.open(path) as image:
+                    images.append(image.convert("RGB"))
+                positions.append(position)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot embed {path}: {e}")
+        if not images:
+            return [], np.empty((0, self.embedder.dim), dtype=np.float16)
+        return positions, self.embedder.embed(images)
+
+    def add_files(self, gen_ids: Sequence[int], paths: Sequence[str]) -> Dict[int, np.ndarray]:
+        """Embed and append images; returns the vectors by generation id"""
+        positions, vectors = self.embed_files(paths)
+        ids = [gen_ids[p] for p in positions]
+        self.append(ids, vectors)
+        return dict(zip(ids, vectors))
+
+    def compact(self, live_ids: set) -> int:
+        """Rewrite the files without deleted or repeated generations; returns rows kept"""
+        with self._lock:
+            self._refresh()
+            if not self._count:
+                return 0
+            # Last row per id wins, in id order
+            reversed_ids = self._ids[::-1]
+            unique_ids, first = np.unique(reversed_ids, return_index=True)
+            rows = self._count - 1 - first
+            keep = np.isin(unique_ids, np.fromiter(live_ids, dtype=np.int64, count=len(live_ids)))
+            rows, unique_ids = rows[keep], unique_ids[keep]
+
+            for path, data in ((self.vectors_path, self._vectors[rows]), (self.ids_path, unique_ids)):
+                temp_path = path.with_suffix(path.suffix + ".part")
+                np.ascontiguousarray(data).tofile(temp_path)
+                os.replace(temp_path, path)
+            self._vectors, self._ids, self._count = None, np.empty(0, dtype=np.int64), 0
+            return len(rows)
+
+    def reset(self) -> None:
+        with self._lock:
+            for path in (self.vectors_path, self.ids_path):
+                path.unlink(missing_ok=True)
+            self._vectors, self._ids, self._count = None, np.empty(0, dtype=np.int64), 0
+
+    # Reads
+    def indexed_ids(self) -> set:
+        with self._lock:
+            self._refresh()
+            return set(self._ids.tolist())
+
+    def vector_for(self, gen_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            self._refresh()
+            rows = np.flatnonzero(self._ids == gen_id)
+            if not len(rows):
+                return None
+            return np.array(self._vectors[rows[-1]], dtype=np.float32)
+
+    def search(self, vector: np.ndarray, k: int, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """The k most similar generations as (id, cosine similarity), best first"""
+        with self._lock:
+            self._refresh()
+            count, vectors, ids = self._count, self._vectors, self._ids
+        if not count or k <= 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        scores = np.empty(count, dtype=np.float32)
+        # float16 has no BLAS path; widen one block at a time to keep memory flat
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            block = vectors[start:start + SEARCH_BLOCK_ROWS]
+            np.dot(block.astype(np.float32), query, out=scores[start:start + len(block)])
+        if exclude is not None:
+            scores[ids == exclude] = -np.inf
+
+        # Extra candidates cover ids appended more than once
+        candidates = min(count, k * 2)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top = top[np.argsort(-scores[top])]
+        results, seen = [], set()
+        for row in top:
+            gen_id = int(ids[row])
+            if gen_id in seen or not np.isfinite(scores[row]):
+                continue
+            seen.add(gen_id)
+            results.append((gen_id, float(scores[row])))
+            if len(results) == k:
+                break
+        return results
+
+
+# Global instance
+similarity_index = SimilarityIndex(settings.SIMILARITY_DIR, settings.SIMILARITY_EMBEDDER)
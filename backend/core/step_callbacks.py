@@ -0,0 +1,114 @@
+"""
+Per-step pipeline callbacks
+Small helpers around diffusers' callback_on_step_end hook
+"""
+import inspect
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+StepCallback = Callable[[Any, int, Any, Dict], Dict]
+
+
+def supports_step_callback(pipeline: Any) -> bool:
+    """Whether the pipeline's __call__ accepts callback_on_step_end"""
+    try:
+        return "callback_on_step_end" in inspect.signature(pipeline.__call__).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def chain_callbacks(callbacks: List[Optional[StepCallback]]) -> Optional[StepCallback]:
+    """Combine several step callbacks into one, each may update callback_kwargs"""
+    callbacks = [cb for cb in callbacks if cb is not None]
+    if not callbacks:
+        return None
+    if len(callbacks) == 1:
+        return callbacks[0]
+
+    def chained(pipeline: Any, step: int, timestep: Any, callback_kwargs: Dict) -> Dict:
+        for callback in callbacks:
+            result = callback(pipeline, step, timestep, callback_kwargs)
+            if result is not None:
+                callback_kwargs = result
+        return callback_kwargs
+
+    return chained
+
+
+class StepTimer:
+    """Record wall-clock duration of every denoising step"""
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.denoise_started_at: Optional[float] = None
+        self.last_step_at: Optional[float] = None
+        self.step_durations: List[float] = []
+        self.suspended_seconds = 0.0
+        self.suspensions = 0
+
+    def start(self) -> None:
+        """Mark the start of the pipeline call"""
+        self.started_at = time.perf_counter()
+        self.denoise_started_at = None
+        self.last_step_at = self.started_at
+        self.step_durations = []
+        self.suspended_seconds = 0.0
+        self.suspensions = 0
+
+    def watch_denoiser(self, pipeline: Any) -> Optional[Any]:
+        """
+        Mark the first UNet/transformer forward as the start of denoising
+
+        Everything before it (prompt encoding, latent preparation) is then
+        reported as prompt encode time instead of inflating the first step.
+        Returns the hook handle; the caller removes it after the call.
+        """
+        denoiser = getattr(pipeline, "unet", None) or getattr(pipeline, "transformer", None)
+        if denoiser is None or not hasattr(denoiser, "register_forward_pre_hook"):
+            return None
+
+        def mark(module, args):
+            if self.denoise_started_at is None:
+                self.denoise_started_at = time.perf_counter()
+                self.last_step_at = self.denoise_started_at
+
+        return denoiser.register_forward_pre_hook(mark)
+
+    def __call__(self, pipeline: Any, step: int, timestep: Any, callback_kwargs: Dict) -> Dict:
+        now = time.perf_counter()
+        if self.last_step_at is not None:
+            self.step_durations.append(now - self.last_step_at)
+        self.last_step_at = now
+        return callback_kwargs
+
+    def exclude(self, seconds: float) -> None:
+        """Leave time spent suspended (preempted) out of step and denoise durations"""
+        self.suspended_seconds += seconds
+        self.suspensions += 1
+        if self.last_step_at is not None:
+            self.last_step_at += seconds
+
+    def timings(self) -> Dict:
+        """Prompt encode, total denoise and per-step seconds for the last call"""
+        if self.started_at is None:
+            return {}
+        denoise_start = self.denoise_started_at or self.started_at
+        return {
+            "prompt_encode": (
+                self.denoise_started_at - self.started_at if self.denoise_started_at else None
+            ),
+            "denoise": (
+                self.last_step_at - denoise_start - self.suspended_seconds if self.step_durations else None
+            ),
+            "steps": list(self.step_durations),
+            "suspended": self.suspended_seconds,
+            "preemptions": self.suspensions,
+        }
+
+    @property
+    def mean_step_seconds(self) -> Optional[float]:
+        """Mean step duration, ignoring the first step (it may include prompt encoding)"""
+        durations = self.step_durations[1:] or self.step_durations
+        if not durations:
+            return None
+        return sum(durations) / len(durations)
@@ -0,0 +1,152 @@
+"""
+Output Storage
+Content-addressed image store under OUTPUTS_DIR, sharded by date and hash
+prefix: YYYY/MM/ab/<sha256>.png. Identical outputs are stored once, and
+every file has a stable URL below /outputs.
+"""
+import hashlib
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional
+
+from config import settings
+
+# URL prefix under which main.py serves OUTPUTS_DIR
+URL_PREFIX = "/outputs"
+
+_YEAR = re.compile(r"^\d{4}$")
+_MONTH = re.compile(r"^\d{2}$")
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class OutputStorage:
+    """Sharded, deduplicating file store for generated images"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.Lock()
+        self._months: Optional[List[Path]] = None  # Newest first
+
+    def relative_path(self, content_hash: str, created: Optional[datetime] = None, suffix: str = ".png") -> PurePosixPath:
+        created = created or datetime.now()
+        return PurePosixPath(f"{created:%Y}", f"{created:%m}", content_hash[:2], f"{content_hash}{suffix}")
+
+    def url_for(self, path) -> Optional[str]:
+        """Public URL of a file below the storage root, None for files elsewhere"""
+        try:
+            relative = Path(path).resolve().relative_to(self.root.resolve())
+        except (ValueError, OSError):
+            return None
+        return f"{URL_PREFIX}/{relative.as_posix()}"
+
+    def _month_dirs(self) -> List[Path]:
+        """YYYY/MM shard directories, newest first (cached, updated on writes)"""
+        with self._lock:
+            if self._months is None:
+                months = []
+                for year in self.root.iterdir() if self.root.exists() else ():
+                    if year.is_dir() and _YEAR.match(year.name):
+                        months.extend(m for m in year.iterdir() if m.is_dir() and _MONTH.match(m.name))
+                self._months = sorted(months, reverse=True)
+            return list(self._months)
+
+    def _remember_month(self, month_dir: Path) -> None:
+        with self._lock:
+            if self._months is not None and month_dir not in self._months:
+                self._months = sorted(self._months + [month_dir], reverse=True)
+
+    def find(self, content_hash: str, suffix: str = ".png") -> Optional[Path]:
+        """Stored file with this content, whichever month it was first written in"""
+        name = f"{content_hash}{suffix}"
+        for month_dir in self._month_dirs():
+            candidate = month_dir / content_hash[:2] / name
+            if candidate.exists():
+                return candidate
+        return None
+
+    def _result(self, path: Path, content_hash: str, deduplicated: bool) -> Dict:
+        return {
+            "path": path,
+            "filename": path.name,
+            "url": self.url_for(path),
+            "content_hash": content_hash,
+            "size": path.stat().st_size,
+            "deduplicated": deduplicated,
+        }
+
+    def save(self, data: bytes, created: Optional[datetime] = None, suffix: str = ".png") -> Dict:
+        """
+        Store bytes under their content hash, reusing an identical stored file
+
+        Writes go to a temporary file first and are renamed into place, so
+        readers never see a partial image.
+        """
+        content_hash = hash_bytes(data)
+        existing = self.find(content_hash, suffix)
+        if existing is not None:
+            try:
+                # Fresh mtime keeps the output GC off a file that is about to be referenced again
+                os.utime(existing)
+                return self._result(existing, content_hash, True)
+            except FileNotFoundError:
+                pass  # Collected in the meantime; write it again
+
+        target = self.root / self.relative_path(content_hash, created, suffix)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = target.with_name(f".{uuid.uuid4().hex}.part")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, target)
+        self._remember_month(target.parent.parent)
+        return self._result(target, content_hash, False)
+
+    def adopt(self, source: Path, content_hash: str, created: Optional[datetime] = None) -> Dict:
+        """
+        Move an existing file with known hash into the store
+
+        The source is removed when the store already holds the same content.
+        Used by history import and the layout migration.
+        """
+        suffix = source.suffix or ".png"
+        existing = self.find(content_hash, suffix)
+        if existing is not None:
+            if existing.resolve() != source.resolve():
+                source.unlink()
+            return self._result(existing, content_hash, True)
+
+        target = self.root / self.relative_path(content_hash, created, suffix)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+        self._remember_month(target.parent.parent)
+        return self._result(target, content_hash, False)
+
+    def is_sharded(self, path: Path) -> bool:
+        """Whether a file already sits in the sharded layout"""
+        try:
+            parts = Path(path).resolve().relative_to(self.root.resolve()).parts
+        except (ValueError, OSError):
+            return False
+        return (
+            len(parts) == 4 and bool(_YEAR.match(parts[0])) and bool(_MONTH.match(parts[1]))
+            and parts[3].startswith(parts[2])
+        )
+
+
+def parse_created_at(value: Optional[str]) -> Optional[datetime]:
+    """created_at as stored by SQLite (UTC 'YYYY-MM-DD HH:MM:SS'), None if unparsable"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+# Global instance
+output_storage = OutputStorage(settings.OUTPUTS_DIR)
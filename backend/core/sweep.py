@@ -0,0 +1,153 @@
+"""
+Parameter Sweeps
+Expand XY-grid axes into cells, plan them into shared pipeline calls and
+stitch the results into a contact sheet
+"""
+import itertools
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import torch
+from PIL import Image, ImageDraw
+
+# Parameters a sweep axis may vary
+SWEEP_AXES = ("seed", "guidance_scale", "num_inference_steps", "scheduler")
+
+# Families whose pipelines run classifier-free guidance as a doubled batch,
+# so cells with different guidance scales can share one call
+PER_SAMPLE_GUIDANCE_FAMILIES = ("sd15", "sdxl")
+
+
+def build_cells(base: Dict, axes: List[Dict]) -> List[Dict]:
+    """
+    Cartesian product of the axes over the base parameters
+
+    Every cell carries its grid position (x, y) and the full set of sweep
+    parameters, so it can be saved and reproduced like a normal generation.
+    """
+    x_axis = axes[0]
+    y_axis = axes[1] if len(axes) > 1 else {"name": None, "values": [None]}
+    cells = []
+    for y, y_value in enumerate(y_axis["values"]):
+        for x, x_value in enumerate(x_axis["values"]):
+            cell = {name: base.get(name) for name in SWEEP_AXES}
+            cell[x_axis["name"]] = x_value
+            if y_axis["name"] is not None:
+                cell[y_axis["name"]] = y_value
+            cell.update(index=len(cells), x=x, y=y)
+            cells.append(cell)
+    return cells
+
+
+def plan_groups(cells: List[Dict], per_sample_guidance: bool) -> List[List[Dict]]:
+    """
+    Group cells that can run in the same pipeline calls
+
+    Cells need the same scheduler and step count to share a denoising loop.
+    Seeds always batch (one generator per image); guidance scales batch only
+    when the pipeline supports per-sample guidance and all of them enable
+    CFG, otherwise each scale gets its own group. Groups sharing a scheduler
+    are adjacent so it is swapped as rarely as possible.
+    """
+    def key(cell: Dict):
+        guidance = cell["guidance_scale"]
+        shared = per_sample_guidance and guidance > 1.0
+        return (cell["scheduler"] or "", cell["num_inference_steps"], "cfg" if shared else guidance)
+
+    ordered = sorted(cells, key=lambda cell: tuple(map(str, key(cell))))
+    return [list(group) for _, group in itertools.groupby(ordered, key=key)]
+
+
+def _split_cfg(output: Any):
+    """The noise prediction tensor of a UNet/transformer output, plus a rebuild function"""
+    if isinstance(output, tuple):
+        return output[0], lambda sample: (sample,) + output[1:]
+    if hasattr(output, "sample"):
+        def rebuild(sample):
+            output.sample = sample
+            return output
+        return output.sample, rebuild
+    return output, lambda sample: sample
+
+
+@contextmanager
+def per_sample_guidance(pipeline: Any, pipeline_scale: float) -> Iterator[Callable[[Optional[Sequence[float]]], None]]:
+    """
+    Apply a different guidance scale to every image of a CFG batch
+
+    The pipeline combines uncond + g * (text - uncond) with one scale g. The
+    hook rescales the text half of the denoiser output by scale_i / g, so the
+    pipeline's combination yields uncond + scale_i * (text - uncond). Yields
+    a setter for the scales of the next call; None or all-equal scales leave
+    the output untouched.
+    """
+    current: Dict[str, Optional[torch.Tensor]] = {"ratios": None}
+
+    def set_scales(scales: Optional[Sequence[float]]) -> None:
+        if not scales or all(scale == pipeline_scale for scale in scales):
+            current["ratios"] = None
+        else:
+            current["ratios"] = torch.tensor([scale / pipeline_scale for scale in scales])
+
+    def rescale(module, args, output):
+        ratios = current["ratios"]
+        if ratios is None:
+            return output
+        sample, rebuild = _split_cfg(output)
+        if sample.shape[0] != 2 * len(ratios):
+            return output
+        uncond, text = sample.chunk(2)
+        ratio = ratios.to(sample.device, sample.dtype).view(-1, *([1] * (sample.dim() - 1)))
+        return rebuild(torch.cat([uncond, uncond + ratio * (text - uncond)]))
+
+    denoiser = getattr(pipeline, "unet", None)
+    handle = denoiser.register_forward_hook(rescale) if denoiser is not None else None
+    try:
+        yield set_scales
+    finally:
+        if handle is not None:
+            handle.remove()
+
+
+def _label(name: Optional[str], value: Any) -> str:
+    if name is None:
+        return ""
+    short = {"guidance_scale": "cfg", "num_inference_steps": "steps"}.get(name, name)
+    return f"{short}={value}"
+
+
+def contact_sheet(
+    images: Dict[int, Image.Image],
+    cells: List[Dict],
+    axes: List[Dict],
+    thumb_size: int = 256
+) -> Image.Image:
+    """
+    Stitch cell images into a labelled grid
+
+    Columns follow the first axis and rows the second. Images are scaled to
+    thumb_size on their longer side; missing cells stay blank.
+    """
+    columns = len(axes[0]["values"])
+    rows = len(axes[1]["values"]) if len(axes) > 1 else 1
+    first = next(iter(images.values()))
+    scale = thumb_size / max(first.size)
+    cell_w, cell_h = max(1, round(first.width * scale)), max(1, round(first.height * scale))
+    margin_left = 110 if rows > 1 else 0
+    margin_top = 24
+
+    sheet = Image.new("RGB", (margin_left + columns * cell_w, margin_top + rows * cell_h), "white")
+    draw = ImageDraw.Draw(sheet)
+    for x, value in enumerate(axes[0]["values"]):
+        draw.text((margin_left + x * cell_w + 4, 6), _label(axes[0]["name"], value), fill="black")
+    if rows > 1:
+        for y, value in enumerate(axes[1]["values"]):
+            draw.text((4, margin_top + y * cell_h + cell_h // 2), _label(axes[1]["name"], value), fill="black")
+
+    for cell in cells:
+        image = images.get(cell["index"])
+        if image is None:
+            continue
+        thumb = image.convert("RGB").resize((cell_w, cell_h), Image.LANCZOS)
+        sheet.paste(thumb, (margin_left + cell["x"] * cell_w, margin_top + cell["y"] * cell_h))
+    return sheet
@@ -0,0 +1,218 @@
+"""
+GPU Telemetry Sampler
+Background thread that samples utilization, memory, temperature, power and
+clocks into a fixed-size ring buffer, so status endpoints read the latest
+snapshot instead of querying the driver on every poll
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+import logging
+
+import torch
+
+from config import settings
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 ** 2
+
+
+class TelemetrySampler:
+    """Periodic device snapshots in a ring buffer (NVML when available, torch otherwise)"""
+
+    def __init__(self, interval: float, history_size: int):
+        self.interval = interval
+        self.samples: deque = deque(maxlen=history_size)
+        self.source = "none"
+        self._handles: List = []
+        self._static: List[Dict] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Initialize the backends and start sampling"""
+        if self._thread is not None:
+            return
+        self._init_sources()
+        self._stop.clear()
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="gpu-telemetry", daemon=True)
+        self._thread.start()
+        logger.info(f"GPU telemetry sampling every {self.interval}s via {self.source}")
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.interval * 2)
+        self._thread = None
+        if self.source == "nvml":
+            try:
+                pynvml.nvmlShutdown()
+            except Exception:
+                pass
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def _init_sources(self) -> None:
+        count = torch.cuda.device_count() if torch.cuda.is_available() else 0
+        self._static = []
+        for index in range(count):
+            props = torch.cuda.get_device_properties(index)
+            self._static.append({
+                "index": index,
+                "name": props.name,
+                "total_mb": round(props.total_memory / MB),
+                "compute_capability": f"{props.major}.{props.minor}",
+            })
+
+        if pynvml is not None and count:
+            try:
+                pynvml.nvmlInit()
+                # NVML enumerates all GPUs; map through PCI bus ids so
+                # CUDA_VISIBLE_DEVICES reordering does not mix devices up
+                self._handles = [self._nvml_handle(index) for index in range(count)]
+                self.source = "nvml"
+                return
+            except Exception as e:
+                logger.warning(f"NVML unavailable, falling back to torch: {e}")
+        self._handles = []
+        self.source = "torch" if count else ("psutil" if psutil is not None else "none")
+
+    @staticmethod
+    def _nvml_handle(index: int):
+        props = torch.cuda.get_device_properties(index)
+        try:
+            bus_id = f"{props.pci_domain_id:08X}:{props.pci_bus_id:02X}:{props.pci_device_id:02X}.0"
+            return pynvml.nvmlDeviceGetHandleByPciBusId(bus_id.encode())
+        except Exception:
+            return pynvml.nvmlDeviceGetHandleByIndex(index)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"Telemetry sample failed: {e}")
+
+    def sample(self) -> Dict:
+        """Take one snapshot and append it to the ring buffer"""
+        snapshot = {"time": time.time(), "devices": [self._sample_device(d) for d in self._static]}
+        if psutil is not None:
+            memory = psutil.virtual_memory()
+            snapshot["host"] = {
+                "cpu_percent": psutil.cpu_percent(interval=None),
+                "memory_used_mb": round(memory.used / MB),
+                "memory_total_mb": round(memory.total / MB),
+            }
+        self.samples.append(snapshot)
+        return snapshot
+
+    def _sample_device(self, static: Dict) -> Dict:
+        index = static["index"]
+        device = {
+            "index": index,
+            "allocated_mb": round(torch.cuda.memory_allocated(index) / MB),
+            "reserved_mb": round(torch.cuda.memory_reserved(index) / MB),
+        }
+        if self._handles:
+            handle = self._handles[index]
+            device.update(self._nvml_fields(handle))
+        else:
+            try:
+                free, total = torch.cuda.mem_get_info(index)
+                device["used_mb"] = round((total - free) / MB)
+            except Exception:
+                pass
+        return device
+
+    @staticmethod
+    def _nvml_fields(handle) -> Dict:
+        fields = {}
+        queries = {
+            "used_mb": lambda: round(pynvml.nvmlDeviceGetMemoryInfo(handle).used / MB),
+            "gpu_util_percent": lambda: pynvml.nvmlDeviceGetUtilizationRates(handle).gpu,
+            "memory_util_percent": lambda: pynvml.nvmlDeviceGetUtilizationRates(handle).memory,
+            "temperature_c": lambda: pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU),
+            "power_w": lambda: round(pynvml.nvmlDeviceGetPowerUsage(handle) / 1000, 1),
+            "power_limit_w": lambda: round(pynvml.nvmlDeviceGetEnforcedPowerLimit(handle) / 1000, 1),
+            "sm_clock_mhz": lambda: pynvml.nvmlDeviceGetClockInfo(handle, pynvml.NVML_CLOCK_SM),
+            "memory_clock_mhz": lambda: pynvml.nvmlDeviceGetClockInfo(handle, pynvml.NVML_CLOCK_MEM),
+        }
+        for name, query in queries.items():
+            try:
+                fields[name] = query()
+            except Exception:
+                # Not every board/driver exposes every counter
+                pass
+        return fields
+
+    def latest(self) -> Optional[Dict]:
+        """Most recent snapshot, None before the first sample"""
+        return self.samples[-1] if self.samples else None
+
+    def device_info(self, index: int) -> Optional[Dict]:
+        """Static properties merged with the latest sample for one GPU"""
+        snapshot = self.latest()
+        if snapshot is None or index >= len(self._static):
+            return None
+        return {**self._static[index], **snapshot["devices"][index], "sampled_at": snapshot["time"]}
+
+    def history(self, seconds: float, points: int) -> Dict:
+        """
+        Samples from the last `seconds`, averaged down to at most `points`
+
+        Memory is reported as the bucket maximum (what capacity planning
+        cares about); other counters as the bucket mean.
+        """
+        cutoff = time.time() - seconds
+        window = [s for s in list(self.samples) if s["time"] >= cutoff]
+        points = max(1, points)
+        size = max(1, -(-len(window) // points))
+        buckets = [window[i:i + size] for i in range(0, len(window), size)]
+        return {
+            "source": self.source,
+            "interval": self.interval,
+            "bucket_seconds": size * self.interval,
+            "devices": self._static,
+            "samples": [self._merge(bucket) for bucket in buckets],
+        }
+
+    @staticmethod
+    def _merge(bucket: List[Dict]) -> Dict:
+        merged = {"time": bucket[-1]["time"], "devices": []}
+        for index in range(len(bucket[-1]["devices"])):
+            device = {"index": index}
+            for key in bucket[-1]["devices"][index]:
+                if key == "index":
+                    continue
+                values = [s["devices"][index][key] for s in bucket if key in s["devices"][index]]
+                if key.endswith("_mb"):
+                    device[key] = max(values)
+                else:
+                    device[key] = round(sum(values) / len(values), 1)
+            merged["devices"].append(device)
+        if "host" in bucket[-1]:
+            merged["host"] = {
+                key: round(sum(s["host"][key] for s in bucket if "host" in s) / len(bucket), 1)
+                for key in bucket[-1]["host"]
+            }
+        return merged
+
+
+# Global instance
+telemetry = TelemetrySampler(settings.TELEMETRY_INTERVAL, settings.TELEMETRY_HISTORY)
@@ -0,0 +1,163 @@
+"""
+Streaming VAE Decode
+Decode denoised latents one image (optionally one tile) at a time so peak
+memory is bounded by a single image/tile and finished images can be saved
+while the rest of the batch is still being decoded
+"""
+import torch
+from typing import Any, Iterator, Optional
+from PIL import Image
+import logging
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Families whose latents we know how to unscale and decode ourselves
+STREAMING_FAMILIES = ("sd15", "sdxl", "flux")
+
+
+def supports_streaming_decode(pipeline: Any, family: Optional[str]) -> bool:
+    """
+    Whether latents of this pipeline can be decoded outside the pipeline
+
+    Pipelines with an active safety checker keep the built-in decode so the
+    NSFW filter still sees every image.
+    """
+    if not settings.STREAMING_VAE_DECODE or family not in STREAMING_FAMILIES:
+        return False
+    if getattr(pipeline, "safety_checker", None) is not None:
+        return False
+    return getattr(pipeline, "vae", None) is not None and hasattr(pipeline, "image_processor")
+
+
+def _unscale_latents(pipeline: Any, latents: torch.Tensor, height: int, width: int) -> torch.Tensor:
+    """Undo packing, scaling and shifting applied in latent space"""
+    vae = pipeline.vae
+    config = vae.config
+
+    # FLUX packs 2x2 latent patches into the sequence dimension
+    if latents.ndim == 3 and hasattr(pipeline, "_unpack_latents"):
+        latents = pipeline._unpack_latents(latents, height, width, pipeline.vae_scale_factor)
+
+    latents_mean = getattr(config, "latents_mean", None)
+    latents_std = getattr(config, "latents_std", None)
+    if latents_mean is not None and latents_std is not None:
+        mean = torch.tensor(latents_mean).view(1, -1, 1, 1).to(latents.device, latents.dtype)
+        std = torch.tensor(latents_std).view(1, -1, 1, 1).to(latents.device, latents.dtype)
+        return latents * std / config.scaling_factor + mean
+
+    latents = latents / config.scaling_factor
+    shift_factor = getattr(config, "shift_factor", None)
+    if shift_factor is not None:
+        latents = latents + shift_factor
+    return latents
+
+
+def _blend_ramp(length: int, overlap: int, at_start: bool, at_end: bool) -> torch.Tensor:
+    """1D weights rising over the leading overlap and falling over the trailing one"""
+    ramp = torch.ones(length)
+    if overlap > 0:
+        edge = torch.linspace(0, 1, overlap + 2)[1:-1]
+        if not at_start:
+            ramp[:overlap] = edge
+        if not at_end:
+            ramp[-overlap:] = edge.flip(0)
+    return ramp
+
+
+def _tile_starts(size: int, tile: int, stride: int) -> list:
+    """Tile start offsets covering [0, size) with the last tile flush to the edge"""
+    if size <= tile:
+        return [0]
+    starts = list(range(0, size - tile, stride))
+    starts.append(size - tile)
+    return starts
+
+
+@torch.no_grad()
+def decode_tiled(vae: Any, latents: torch.Tensor, tile_size: int, overlap: int) -> torch.Tensor:
+    """
+    Decode a single latent [1, C, h, w] in overlapping tiles
+
+    Tiles are blended with linear ramps over the overlap so seams vanish.
+    Only one tile's decoder activations are alive at any time; the blend
+    buffers hold the output image in float32 on the CPU.
+    """
+    scale = 2 ** (len(vae.config.block_out_channels) - 1)
+    tile = max(tile_size // scale, 8)
+    lap = min(overlap // scale, tile // 2)
+    stride = tile - lap
+
+    _, _, h, w = latents.shape
+    out = torch.zeros(1, 3, h * scale, w * scale)
+    weight = torch.zeros(1, 1, h * scale, w * scale)
+
+    ys = _tile_starts(h, tile, stride)
+    xs = _tile_starts(w, tile, stride)
+    for y in ys:
+        for x in xs:
+            patch = latents[:, :, y:y + tile, x:x + tile]
+            decoded = vae.decode(patch, return_dict=False)[0].float().cpu()
+
+            ph, pw = decoded.shape[-2:]
+            ramp_y = _blend_ramp(ph, lap * scale, y == ys[0], y == ys[-1])
+            ramp_x = _blend_ramp(pw, lap * scale, x == xs[0], x == xs[-1])
+            mask = (ramp_y[:, None] * ramp_x[None, :])[None, None]
+
+            py, px = y * scale, x * scale
+            out[:, :, py:py + ph, px:px + pw] += decoded * mask
+            weight[:, :, py:py + ph, px:px + pw] += mask
+            del decoded
+
+    return out / weight.clamp(min=1e-6)
+
+
+def _decode_dtype(vae: Any) -> torch.dtype:
+    """Dtype of the decoder input (an upcast VAE may keep post_quant_conv in fp16)"""
+    post_quant_conv = getattr(vae, "post_quant_conv", None)
+    if post_quant_conv is not None:
+        return next(iter(post_quant_conv.parameters())).dtype
+    return vae.dtype
+
+
+@torch.no_grad()
+def decode_latents_iter(
+    pipeline: Any,
+    latents: torch.Tensor,
+    height: int,
+    width: int,
+    tiled: Optional[bool] = None
+) -> Iterator[Image.Image]:
+    """
+    Yield decoded PIL images one by one from a batch of denoised latents
+
+    Args:
+        pipeline: Pipeline whose VAE and image processor are used
+        latents: Output of the pipeline called with output_type="latent"
+        height, width: Requested output size (needed to unpack FLUX latents)
+        tiled: Force tiled decode; defaults to the memory plan's vae_tiling
+    """
+    vae = pipeline.vae
+    if tiled is None:
+        tiled = (getattr(pipeline, "_memory_plan", None) or {}).get("vae_tiling", False)
+
+    # SDXL's VAE overflows in fp16 unless upcast (same check as the pipeline)
+    needs_upcasting = vae.dtype == torch.float16 and getattr(vae.config, "force_upcast", False)
+    if needs_upcasting and hasattr(pipeline, "upcast_vae"):
+        pipeline.upcast_vae()
+
+    try:
+        latents = _unscale_latents(pipeline, latents, height, width)
+        for index in range(latents.shape[0]):
+            sample = latents[index:index + 1].to(dtype=_decode_dtype(vae))
+            if tiled:
+                image = decode_tiled(vae, sample, settings.VAE_TILE_SIZE, settings.VAE_TILE_OVERLAP)
+            else:
+                image = vae.decode(sample, return_dict=False)[0]
+            pil = pipeline.image_processor.postprocess(image, output_type="pil")[0]
+            del image, sample
+            yield pil
+    finally:
+        if needs_upcasting:
+            vae.to(dtype=torch.float16)
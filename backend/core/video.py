@@ -0,0 +1,200 @@
+"""
+Video Generation Helpers
+Decode video latents in temporal chunks and stream the frames straight into
+an MP4/WebM encoder instead of holding every frame as a PIL image
+"""
+import inspect
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+import logging
+
+import numpy as np
+import torch
+
+try:
+    import imageio
+except ImportError:
+    imageio = None
+
+logger = logging.getLogger(__name__)
+
+VIDEO_TYPES = ("text2video", "image2video")
+
+VIDEO_CODECS = {
+    "mp4": {"codec": "libx264", "pixelformat": "yuv420p"},
+    "webm": {"codec": "libvpx-vp9", "pixelformat": "yuv420p"},
+}
+
+
+def _denormalize_latents(vae: Any, latents: torch.Tensor) -> torch.Tensor:
+    """Map model-space latents back to the VAE's latent space"""
+    config = vae.config
+    latents = latents.to(vae.dtype)
+    latents_mean = getattr(config, "latents_mean", None)
+    latents_std = getattr(config, "latents_std", None)
+    if latents_mean is not None and latents_std is not None:
+        channels = latents.shape[1]
+        mean = torch.tensor(latents_mean).view(1, channels, 1, 1, 1).to(latents.device, latents.dtype)
+        std = torch.tensor(latents_std).view(1, channels, 1, 1, 1).to(latents.device, latents.dtype)
+        return latents * std + mean
+    return latents / getattr(config, "scaling_factor", 1.0)
+
+
+def _frames(video: torch.Tensor) -> np.ndarray:
+    """[1, 3, F, H, W] in [-1, 1] to uint8 [F, H, W, 3]"""
+    frames = ((video[0].float() / 2 + 0.5).clamp(0, 1) * 255).round().to(torch.uint8)
+    return frames.permute(1, 2, 3, 0).cpu().numpy()
+
+
+def _has_causal_cache(vae: Any) -> bool:
+    """Whether the VAE decodes frame by frame through a causal feature cache (Wan)"""
+    return callable(getattr(vae, "clear_cache", None)) and hasattr(vae, "decoder") and hasattr(vae, "post_quant_conv")
+
+
+def _decode_with_cache(vae: Any, latents: torch.Tensor, chunk_frames: int) -> Iterator[torch.Tensor]:
+    """
+    Mirror of the Wan VAE's own decode loop, yielded every chunk_frames latent frames
+
+    Every causal convolution keeps its last input frames in the VAE's feature
+    cache, so stacked they see the whole history; the cache is carried across
+    chunks instead of being rebuilt, which makes the output identical to a
+    single decode() call while only one chunk of frames is held at a time.
+    """
+    first_chunk = "first_chunk" in inspect.signature(vae.decoder.forward).parameters
+    patch_size = getattr(vae.config, "patch_size", None)
+    if patch_size is not None:
+        from diffusers.models.autoencoders.autoencoder_kl_wan import unpatchify
+
+    vae.clear_cache()
+    try:
+        x = vae.post_quant_conv(latents)
+        total = x.shape[2]
+        for start in range(0, total, chunk_frames):
+            outputs = []
+            for i in range(start, min(start + chunk_frames, total)):
+                vae._conv_idx = [0]
+                kwargs = {"first_chunk": True} if first_chunk and i == 0 else {}
+                outputs.append(vae.decoder(x[:, :, i:i + 1], feat_cache=vae._feat_map, feat_idx=vae._conv_idx, **kwargs))
+            video = torch.cat(outputs, 2)
+            if patch_size is not None:
+                video = unpatchify(video, patch_size=patch_size)
+            yield video.clamp(-1, 1)
+            del outputs, video
+    finally:
+        vae.clear_cache()
+
+
+@torch.no_grad()
+def decode_video_chunks(pipeline: Any, latents: torch.Tensor, chunk_frames: int) -> Iterator[np.ndarray]:
+    """
+    Yield uint8 frame arrays [F, H, W, 3] decoded chunk by chunk
+
+    The video VAE is causal in time and its receptive field spans more
+    latent frames than a whole clip (every causal conv looks back two frames
+    and dozens are stacked), so decoding slices with a few frames of overlap
+    cannot reproduce a full decode. VAEs with a causal feature cache (Wan)
+    are streamed through that cache instead; others are decoded in one call
+    and the frames handed out chunk by chunk.
+    """
+    vae = pipeline.vae
+    latents = _denormalize_latents(vae, latents[:1])
+
+    if _has_causal_cache(vae) and not getattr(vae, "use_tiling", False):
+        for video in _decode_with_cache(vae, latents, chunk_frames):
+            yield _frames(video)
+        return
+
+    video = vae.decode(latents, return_dict=False)[0]
+    temporal_scale = getattr(pipeline, "vae_scale_factor_temporal", 4)
+    frames = _frames(video)
+    del video
+    # First latent frame decodes to one frame, every following one to temporal_scale
+    step = temporal_scale * chunk_frames
+    yield frames[:1 + temporal_scale * (chunk_frames - 1)]
+    for start in range(1 + temporal_scale * (chunk_frames - 1), len(frames), step):
+        yield frames[start:start + step]
+
+
+def encode_video_stream(
+    frame_chunks: Iterator[np.ndarray],
+    path: Path,
+    fps: int,
+    container: str,
+    on_chunk: Optional[Callable[[int], None]] = None
+) -> int:
+    """Append frame chunks to a video file as they arrive, return the frame count"""
+    if imageio is None:
+        raise RuntimeError("Video export requires imageio: pip install imageio imageio-ffmpeg")
+    if container not in VIDEO_CODECS:
+        raise ValueError(f"Unsupported container '{container}'. Use one of: {', '.join(VIDEO_CODECS)}")
+
+    codec = VIDEO_CODECS[container]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    writer = imageio.get_writer(
+        str(path),
+        fps=fps,
+        codec=codec["codec"],
+        pixelformat=codec["pixelformat"],
+        macro_block_size=1
+    )
+    try:
+        for chunk in frame_chunks:
+            for frame in chunk:
+                writer.append_data(frame)
+            written += len(chunk)
+            if on_chunk is not None:
+                on_chunk(written)
+    finally:
+        writer.close()
+    return written
+
+
+class VideoJobs:
+    """In-memory registry of video jobs and their progress"""
+
+    def __init__(self, max_jobs: int = 100):
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, params: Dict) -> Dict:
+        """Register a queued job"""
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "stage": "queued",
+            "step": 0,
+            "total_steps": params.get("num_inference_steps", 0),
+            "frames_done": 0,
+            "frames_total": params.get("num_frames", 0),
+            "file_path": None,
+            "url": None,
+            "error": None,
+            "created_at": time.time(),
+            "params": params,
+        }
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            # Forget the oldest finished jobs
+            finished = [jid for jid, j in self._jobs.items() if j["status"] in ("completed", "failed")]
+            while len(self._jobs) > self.max_jobs and finished:
+                self._jobs.pop(finished.pop(0))
+        return job
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+# Global instance
+video_jobs = VideoJobs()
@@ -14,6 +14,9 @@ import logging
 from contextlib import asynccontextmanager
 
 from api.routes import router, db
+from core.device_pool import device_pool
+from core.telemetry import telemetry
+from core.retention import output_gc
 from config import settings
 
 # Suppress warnings for cleaner logs
@@ -47,9 +50,17 @@ async def lifespan(app: FastAPI):
     await db.deactivate_all_custom_models()
     logger.info("Reset all custom model active states")
     
+    if settings.ENABLE_TELEMETRY:
+        telemetry.start()
+    if settings.ENABLE_OUTPUT_GC:
+        output_gc.start()
+    
     yield
     # Shutdown
     logger.info("Shutting down...")
+    await output_gc.stop()
+    telemetry.stop()
+    device_pool.shutdown()
 
 # Create FastAPI app
 app = FastAPI(
@@ -1,7 +1,7 @@
 import aiosqlite
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 import json
 import logging
 
@@ -32,7 +32,13 @@ class Database:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     metadata TEXT,
                     scheduler TEXT,
-                    denoise_strength REAL
+                    denoise_strength REAL,
+                    cache_key TEXT,
+                    peak_memory_mb REAL,
+                    content_hash TEXT,
+                    file_size INTEGER,
+                    is_favorite BOOLEAN DEFAULT 0,
+                    file_missing BOOLEAN DEFAULT 0
                 )
             """)
             
@@ -49,6 +55,54 @@ class Database:
             except:
                 pass  # Column already exists
             
+            try:
+                await db.execute("ALTER TABLE generations ADD COLUMN cache_key TEXT")
+                logger.info("Added cache_key column to generations table")
+            except:
+                pass  # Column already exists
+            
+            try:
+                await db.execute("ALTER TABLE generations ADD COLUMN peak_memory_mb REAL")
+                logger.info("Added peak_memory_mb column to generations table")
+            except:
+                pass  # Column already exists
+            
+            try:
+                await db.execute("ALTER TABLE generations ADD COLUMN content_hash TEXT")
+                logger.info("Added content_hash column to generations table")
+            except:
+                pass  # Column already exists
+            
+            try:
+                await db.execute("ALTER TABLE generations ADD COLUMN file_size INTEGER")
+                logger.info("Added file_size column to generations table")
+            except:
+                pass  # Column already exists
+            
+            try:
+                await db.execute("ALTER TABLE generations ADD COLUMN is_favorite BOOLEAN DEFAULT 0")
+                logger.info("Added is_favorite column to generations table")
+            except:
+                pass  # Column already exists
+            
+            try:
+                await db.execute("ALTER TABLE generations ADD COLUMN file_missing BOOLEAN DEFAULT 0")
+                logger.info("Added file_missing column to generations table")
+            except:
+                pass  # Column already exists
+            
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_generations_cache_key ON generations (cache_key)
+            """)
+            
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_generations_content_hash ON generations (content_hash)
+            """)
+            
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_generations_file_path ON generations (file_path)
+            """)
+            
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS settings (
                     key TEXT PRIMARY KEY,
@@ -88,6 +142,15 @@ class Database:
             """)
             
             await db.commit()
+            
+            # Freed pages are returned by the output GC in small steps
+            # (PRAGMA incremental_vacuum); switching mode needs one full VACUUM
+            async with db.execute("PRAGMA auto_vacuum") as cursor:
+                auto_vacuum = (await cursor.fetchone())[0]
+            if auto_vacuum != 2:
+                logger.info("Enabling incremental auto-vacuum (one-time VACUUM)...")
+                await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                await db.execute("VACUUM")
             logger.info("Database initialized")
     
     async def save_generation(
@@ -104,7 +167,11 @@ class Database:
         thumbnail_path: Optional[str] = None,
         metadata: Optional[Dict] = None,
         scheduler: Optional[str] = None,
-        denoise_strength: Optional[float] = None
+        denoise_strength: Optional[float] = None,
+        cache_key: Optional[str] = None,
+        peak_memory_mb: Optional[float] = None,
+        content_hash: Optional[str] = None,
+        file_size: Optional[int] = None
     ) -> int:
         """Save generation to database"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -112,13 +179,15 @@ class Database:
                 INSERT INTO generations (
                     prompt, negative_prompt, model_key, width, height,
                     steps, guidance_scale, seed, file_path, thumbnail_path, 
-                    metadata, scheduler, denoise_strength
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    metadata, scheduler, denoise_strength, cache_key, peak_memory_mb,
+                    content_hash, file_size
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 prompt, negative_prompt, model_key, width, height,
                 steps, guidance_scale, seed, file_path, thumbnail_path,
                 json.dumps(metadata) if metadata else None,
-                scheduler, denoise_strength
+                scheduler, denoise_strength, cache_key, peak_memory_mb,
+                content_hash, file_size
             ))
             await db.commit()
             return cursor.lastrowid
@@ -145,6 +214,102 @@ class Database:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
     
+    async def get_generations_by_ids(self, gen_ids: List[int]) -> Dict[int, Dict]:
+        """Generations by id; ids that no longer exist are missing from the result"""
+        if not gen_ids:
+            return {}
+        placeholders = ",".join("?" * len(gen_ids))
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                f"SELECT * FROM generations WHERE id IN ({placeholders})", gen_ids
+            ) as cursor:
+                return {row["id"]: dict(row) for row in await cursor.fetchall()}
+    
+    async def get_generation_ids(self) -> set:
+        """Ids of all generations"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("SELECT id FROM generations") as cursor:
+                return {row[0] for row in await cursor.fetchall()}
+    
+    async def get_generations_by_cache_key(self, cache_key: str, limit: int) -> List[Dict]:
+        """Get the most recent generations stored under a result cache key, oldest first"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT * FROM generations
+                WHERE cache_key = ?
+                ORDER BY id DESC
+                LIMIT ?
+            """, (cache_key, limit)) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in reversed(rows)]
+    
+    async def iter_generations(self, batch_size: int = 500) -> AsyncIterator[Dict]:
+        """Yield all generations oldest first, batch_size rows per query"""
+        last_id = 0
+        while True:
+            # Keyset pagination; the connection is closed while the caller consumes rows
+            async with aiosqlite.connect(self.db_path) as db:
+                db.row_factory = aiosqlite.Row
+                async with db.execute("""
+                    SELECT * FROM generations
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (last_id, batch_size)) as cursor:
+                    rows = [dict(row) for row in await cursor.fetchall()]
+            if not rows:
+                return
+            for row in rows:
+                yield row
+            last_id = rows[-1]["id"]
+    
+    async def has_content_hash(self, content_hash: str) -> bool:
+        """Whether a generation with this image content is already stored"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("""
+                SELECT 1 FROM generations WHERE content_hash = ? LIMIT 1
+            """, (content_hash,)) as cursor:
+                return await cursor.fetchone() is not None
+    
+    async def import_generations(self, rows: List[Dict]) -> int:
+        """
+        Insert imported generations in one transaction
+        
+        Rows whose content_hash is already stored (or earlier in the batch)
+        are skipped; file_size may be None. Returns the number of rows inserted.
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            before = db.total_changes
+            await db.executemany("""
+                INSERT INTO generations (
+                    prompt, negative_prompt, model_key, width, height,
+                    steps, guidance_scale, seed, file_path, metadata,
+                    scheduler, denoise_strength, cache_key, peak_memory_mb,
+                    content_hash, file_size, created_at
+                )
+                SELECT
+                    :prompt, :negative_prompt, :model_key, :width, :height,
+                    :steps, :guidance_scale, :seed, :file_path, :metadata,
+                    :scheduler, :denoise_strength, :cache_key, :peak_memory_mb,
+                    :content_hash, :file_size, COALESCE(:created_at, CURRENT_TIMESTAMP)
+                WHERE :content_hash IS NULL
+                   OR NOT EXISTS (SELECT 1 FROM generations WHERE content_hash = :content_hash)
+            """, rows)
+            await db.commit()
+            return db.total_changes - before
+    
+    async def update_file_paths(self, updates: List[Dict]) -> None:
+        """Rewrite file_path (and content_hash) of many generations in one transaction"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany("""
+                UPDATE generations
+                SET file_path = :file_path, content_hash = COALESCE(:content_hash, content_hash)
+                WHERE id = :id
+            """, updates)
+            await db.commit()
+    
     async def delete_generation(self, gen_id: int) -> bool:
         """Delete generation"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -152,6 +317,129 @@ class Database:
             await db.commit()
             return True
     
+    async def delete_generations(self, gen_ids: List[int]) -> List[str]:
+        """
+        Delete generations in one transaction
+        
+        Returns the file paths no remaining row refers to (deduplicated
+        outputs can be shared), which the caller may remove from disk.
+        """
+        if not gen_ids:
+            return []
+        placeholders = ",".join("?" * len(gen_ids))
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                f"SELECT DISTINCT file_path FROM generations WHERE id IN ({placeholders})", gen_ids
+            ) as cursor:
+                paths = [row[0] for row in await cursor.fetchall()]
+            await db.execute(f"DELETE FROM generations WHERE id IN ({placeholders})", gen_ids)
+            orphaned = []
+            for path in paths:
+                async with db.execute("SELECT 1 FROM generations WHERE file_path = ? LIMIT 1", (path,)) as cursor:
+                    if await cursor.fetchone() is None:
+                        orphaned.append(path)
+            await db.commit()
+            return orphaned
+    
+    async def set_generation_favorite(self, gen_id: int, is_favorite: bool) -> bool:
+        """Mark a generation as favorite (kept by the retention policy)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute("""
+                UPDATE generations SET is_favorite = ? WHERE id = ?
+            """, (1 if is_favorite else 0, gen_id))
+            await db.commit()
+            return cursor.rowcount > 0
+    
+    async def get_expired_generation_ids(self, before: str, keep_favorites: bool, limit: int) -> List[int]:
+        """Oldest generations created before a UTC timestamp ('YYYY-MM-DD HH:MM:SS')"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(f"""
+                SELECT id FROM generations
+                WHERE created_at < ? {"AND NOT is_favorite" if keep_favorites else ""}
+                ORDER BY id
+                LIMIT ?
+            """, (before, limit)) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+    
+    async def get_oldest_generations(self, keep_favorites: bool, limit: int) -> List[Dict]:
+        """id and file_size of the oldest generations, for trimming outputs to a size budget"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(f"""
+                SELECT id, file_size FROM generations
+                {"WHERE NOT is_favorite" if keep_favorites else ""}
+                ORDER BY id
+                LIMIT ?
+            """, (limit,)) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+    
+    async def get_total_output_bytes(self) -> int:
+        """Disk space of all referenced outputs, shared files counted once"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("""
+                SELECT COALESCE(SUM(size), 0) FROM (
+                    SELECT MAX(file_size) AS size FROM generations GROUP BY file_path
+                )
+            """) as cursor:
+                return (await cursor.fetchone())[0]
+    
+    async def get_generation_files(self, after_id: int, limit: int) -> List[Dict]:
+        """id, file_path, file_size, file_missing and is_favorite of generations after an id, for reconciling"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT id, file_path, file_size, file_missing, is_favorite FROM generations
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (after_id, limit)) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+    
+    async def set_file_sizes(self, sizes: List[Dict]) -> None:
+        """Backfill file_size for many generations in one transaction"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany("""
+                UPDATE generations SET file_size = :file_size WHERE id = :id
+            """, sizes)
+            await db.commit()
+    
+    async def get_referenced_paths(self, paths: List[str]) -> set:
+        """Which of the given file paths some generation refers to"""
+        if not paths:
+            return set()
+        placeholders = ",".join("?" * len(paths))
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                f"SELECT DISTINCT file_path FROM generations WHERE file_path IN ({placeholders})", paths
+            ) as cursor:
+                return {row[0] for row in await cursor.fetchall()}
+    
+    async def get_all_file_paths(self) -> List[str]:
+        """Distinct file paths of all generations"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("SELECT DISTINCT file_path FROM generations") as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+    
+    async def set_files_missing(self, gen_ids: List[int], missing: bool) -> None:
+        """Flag (or unflag) generations whose output file is not on disk"""
+        if not gen_ids:
+            return
+        placeholders = ",".join("?" * len(gen_ids))
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                f"UPDATE generations SET file_missing = ? WHERE id IN ({placeholders})",
+                [1 if missing else 0, *gen_ids]
+            )
+            await db.commit()
+    
+    async def incremental_vacuum(self, pages: int) -> int:
+        """Return up to `pages` free pages to the filesystem; returns the pages still free"""
+        async with aiosqlite.connect(self.db_path) as db:
+            # execute() would step the pragma once (one page); a script runs it to completion
+            await db.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+            async with db.execute("PRAGMA freelist_count") as cursor:
+                return (await cursor.fetchone())[0]
+    
     async def search_generations(self, query: str, limit: int = 50) -> List[Dict]:
         """Search generations by prompt"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -0,0 +1,5 @@
+"""Tests import backend modules the way the app does (backend/ on sys.path)"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
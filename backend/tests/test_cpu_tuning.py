@@ -0,0 +1,128 @@
+"""CPU performance mode: core slot planning, bf16 selection and pipeline tuning"""
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("pydantic_settings")
+
+from config import settings
+from core import cpu_tuning
+from core.cpu_tuning import fusion_backend, parse_cpulist, plan_core_slots, resolve_bf16, tune_pipeline
+
+
+@pytest.fixture
+def two_nodes(monkeypatch):
+    """Eight physical cores on each of two NUMA nodes"""
+    monkeypatch.setattr(cpu_tuning, "numa_nodes", lambda: [list(range(8)), list(range(8, 16))])
+    monkeypatch.setattr(settings, "CPU_THREADS", 0)
+
+
+def test_parse_cpulist():
+    assert parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpulist("") == []
+
+
+def test_sysfs_topology(tmp_path, monkeypatch):
+    # cpu0/cpu2 and cpu1/cpu3 are SMT siblings; node1 holds cpus outside the affinity mask
+    for cpu, siblings in {0: "0,2", 1: "1,3", 2: "0,2", 3: "1,3"}.items():
+        topology = tmp_path / "cpu" / f"cpu{cpu}" / "topology"
+        topology.mkdir(parents=True)
+        (topology / "thread_siblings_list").write_text(siblings)
+    (tmp_path / "node" / "node0").mkdir(parents=True)
+    (tmp_path / "node" / "node0" / "cpulist").write_text("0-3")
+    (tmp_path / "node" / "node1").mkdir()
+    (tmp_path / "node" / "node1" / "cpulist").write_text("4-7")
+    monkeypatch.setattr(cpu_tuning, "CPU_DIR", tmp_path / "cpu")
+    monkeypatch.setattr(cpu_tuning, "NODE_DIR", tmp_path / "node")
+    monkeypatch.setattr(cpu_tuning, "_available_cpus", lambda: [0, 1, 2, 3])
+
+    assert cpu_tuning.numa_nodes() == [[0, 1]]
+
+
+def test_slots_stay_within_nodes(two_nodes):
+    assert plan_core_slots(1) == [list(range(16))]
+    assert plan_core_slots(2) == [list(range(8)), list(range(8, 16))]
+    assert plan_core_slots(4) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12, 13, 14, 15]]
+
+
+def test_slots_capped(two_nodes, monkeypatch):
+    # Never more workers than cores, and never an empty slot
+    assert len(plan_core_slots(64)) == 16
+    monkeypatch.setattr(settings, "CPU_THREADS", 2)
+    assert plan_core_slots(2) == [[0, 1], [8, 9]]
+
+
+def test_resolve_bf16(monkeypatch):
+    monkeypatch.setattr(cpu_tuning, "bf16_supported", lambda: False)
+    monkeypatch.setattr(settings, "CPU_BF16", "auto")
+    assert not resolve_bf16()
+    monkeypatch.setattr(settings, "CPU_BF16", "on")
+    assert resolve_bf16()
+    monkeypatch.setattr(settings, "CPU_BF16", "off")
+    assert not resolve_bf16()
+
+
+@pytest.mark.parametrize("mode, ipex, expected", [
+    ("none", True, None),
+    ("compile", True, "compile"),
+    ("auto", True, "ipex"),
+    ("auto", False, None),
+    ("ipex", False, None),
+    ("unknown", True, "ipex"),
+])
+def test_fusion_backend(monkeypatch, mode, ipex, expected):
+    monkeypatch.setattr(settings, "CPU_FUSION", mode)
+    find_spec = cpu_tuning.importlib.util.find_spec
+
+    def fake_find_spec(name, *args):
+        if name == "intel_extension_for_pytorch":
+            return object() if ipex else None
+        return find_spec(name, *args)
+
+    monkeypatch.setattr(cpu_tuning.importlib.util, "find_spec", fake_find_spec)
+    assert fusion_backend() == expected
+
+
+def pipeline():
+    unet = torch.nn.Conv2d(4, 8, 3)
+    vae = torch.nn.Conv2d(8, 3, 3)
+    return SimpleNamespace(unet=unet, vae=vae, components={"unet": unet, "vae": vae, "scheduler": object()})
+
+
+def test_tune_pipeline_without_fusion(monkeypatch):
+    monkeypatch.setattr(settings, "CPU_FUSION", "none")
+    tuned = pipeline()
+    unet = tuned.unet
+
+    applied = tune_pipeline(tuned, bf16=False)
+
+    assert applied == {"bf16": False, "channels_last": ["unet", "vae"], "fusion": None}
+    assert tuned.unet is unet
+    assert unet.weight.is_contiguous(memory_format=torch.channels_last)
+    assert tuned.vae.weight.is_contiguous(memory_format=torch.channels_last)
+
+
+def test_failed_fusion_keeps_module(monkeypatch):
+    monkeypatch.setattr(settings, "CPU_FUSION", "compile")
+
+    def fail(module, mode, bf16):
+        raise RuntimeError("no compiler")
+
+    monkeypatch.setattr(cpu_tuning, "_fuse", fail)
+    tuned = pipeline()
+    unet = tuned.unet
+
+    applied = tune_pipeline(tuned, bf16=False)
+
+    assert applied["fusion"] is None
+    assert tuned.unet is unet
+
+
+def test_bf16_autocast():
+    layer = torch.nn.Linear(4, 4)
+    x = torch.randn(2, 4)
+    with cpu_tuning.bf16_autocast(True):
+        assert layer(x).dtype == torch.bfloat16
+    with cpu_tuning.bf16_autocast(False):
+        assert layer(x).dtype == torch.float32
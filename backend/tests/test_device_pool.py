@@ -0,0 +1,56 @@
+"""Model-affinity routing across virtual CPU devices"""
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("diffusers")
+pytest.importorskip("pydantic_settings")
+
+from config import settings
+from core.device_pool import DevicePool
+from core.gpu_monitor import gpu_monitor
+from core.model_manager import ModelManager
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_DEVICE_POOL", True)
+    monkeypatch.setattr(settings, "VIRTUAL_DEVICES", 3)
+    monkeypatch.setattr(settings, "INFERENCE_WORKER_PROCESS", False)
+    monkeypatch.setattr(settings, "CPU_PERF_MODE", False)
+    monkeypatch.setattr(gpu_monitor, "list_devices", lambda: [])
+    return DevicePool.from_settings(ModelManager(device="cpu"))
+
+
+def test_virtual_devices_get_their_own_workers(pool):
+    assert [w.device for w in pool.workers] == ["cpu", "cpu", "cpu"]
+    assert len({id(w) for w in pool.workers}) == 3
+    assert len({id(w.lock) for w in pool.workers}) == 3
+    assert pool.get("cpu") is pool.primary
+
+
+def test_prefers_worker_with_model_loaded(pool):
+    pool.workers[2].current_model = "sdxl"
+    assert pool.route("sdxl") is pool.workers[2]
+    with pool.acquire("sdxl"):
+        # Busy, but still the only worker that needs no model load
+        assert pool.route("sdxl") is pool.workers[2]
+
+
+def test_spreads_loads_over_idle_workers(pool):
+    pool.workers[0].current_model = "sd15"
+    with pool.acquire("sdxl") as first, pool.acquire("sdxl") as second:
+        # Idle workers without a model first, then the idle one holding another model
+        assert {first, second} == {pool.workers[1], pool.workers[2]}
+        assert pool.route("sdxl") is pool.workers[0]
+
+
+def test_requests_without_model_follow_primary(pool):
+    pool.workers[0].current_model = "sd15"
+    pool.workers[1].current_model = "sd15"
+    assert pool.route() is pool.primary
+    with pool.acquire():
+        assert pool.route() is pool.workers[1]
+
+    pool.workers[0].current_model = None
+    pool.workers[1].current_model = None
+    assert pool.route() is pool.primary
@@ -0,0 +1,207 @@
+"""Ranged, resumable model downloads against a local stand-in for the hub"""
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+from config import settings
+from core.downloads import ACTIVE_STATES, DownloadManager, snapshot_dir
+
+REPO_ID = "test/tiny-model"
+COMMIT = "0123456789abcdef0123456789abcdef01234567"
+MB = 1024 * 1024
+WEIGHTS = "unet/diffusion_pytorch_model.safetensors"
+CONFIG = "unet/config.json"
+
+
+class StandInHub:
+    """Serves the hub API and ranged file downloads; records every range request"""
+
+    def __init__(self, files: Dict[str, bytes]):
+        self.files = files
+        self.sha256 = {path: hashlib.sha256(data).hexdigest() for path, data in files.items()}
+        self.extra_entries = []
+        self.ranges = []
+        self.truncate = {}  # (path, start) -> remaining truncated responses
+        self.delay = 0.0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tree(self):
+        entries = [
+            {"type": "file", "path": path, "size": len(data), "oid": "x",
+             "lfs": {"oid": self.sha256[path], "size": len(data)}}
+            for path, data in self.files.items()
+        ]
+        return entries + self.extra_entries
+
+    def _handler(self):
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+                if path == f"/api/models/{REPO_ID}/revision/main":
+                    return self._json({"sha": COMMIT})
+                if path == f"/api/models/{REPO_ID}/tree/{COMMIT}":
+                    return self._json(hub.tree())
+                prefix = f"/{REPO_ID}/resolve/{COMMIT}/"
+                if not path.startswith(prefix) or path[len(prefix):] not in hub.files:
+                    self.send_error(404)
+                    return
+                self._send_file(path[len(prefix):])
+
+            def _send_file(self, name):
+                data = hub.files[name]
+                start, end = 0, len(data) - 1
+                ranged = self.headers.get("Range")
+                if ranged:
+                    first, last = ranged.split("=")[1].split("-")
+                    start, end = int(first), int(last)
+                with hub._lock:
+                    hub.ranges.append((name, start, end))
+                    hub.active += 1
+                    hub.max_active = max(hub.max_active, hub.active)
+                    truncated = hub.truncate.get((name, start), 0) > 0
+                    if truncated:
+                        hub.truncate[(name, start)] -= 1
+                try:
+                    time.sleep(hub.delay)
+                    body = data[start:end + 1]
+                    self.send_response(206 if ranged else 200)
+                    self.send_header("Content-Length", str(len(body)))
+                    if ranged:
+                        self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                    self.end_headers()
+                    if truncated:
+                        # Connection drops halfway through the body
+                        self.wfile.write(body[:len(body) // 2])
+                        self.close_connection = True
+                        return
+                    self.wfile.write(body)
+                finally:
+                    with hub._lock:
+                        hub.active -= 1
+
+        return Handler
+
+    def chunk_requests(self, name):
+        return sorted(start // MB for path, start, _ in self.ranges if path == name)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def hub(tmp_path, monkeypatch):
+    files = {WEIGHTS: os.urandom(3 * MB + MB // 2), CONFIG: b'{"sample_size": 8}'}
+    hub = StandInHub(files)
+    monkeypatch.setattr(settings, "HF_ENDPOINT", hub.endpoint)
+    monkeypatch.setattr(settings, "HF_TOKEN", None)
+    monkeypatch.setattr(settings, "MODELS_DIR", tmp_path / "models")
+    monkeypatch.setattr(settings, "DOWNLOAD_CHUNK_MB", 1)
+    monkeypatch.setattr(settings, "DOWNLOAD_CONNECTIONS", 4)
+    monkeypatch.setattr(settings, "DOWNLOAD_RETRIES", 2)
+    yield hub
+    hub.close()
+
+
+def download(manager: DownloadManager, timeout: float = 30.0) -> Dict:
+    manager.start(REPO_ID)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = manager.status(REPO_ID)
+        if status["status"] not in ACTIVE_STATES:
+            return status
+        time.sleep(0.05)
+    raise AssertionError("download did not finish")
+
+
+def test_concurrent_ranges(hub):
+    hub.delay = 0.2
+    status = download(DownloadManager())
+
+    assert status["status"] == "complete", status["error"]
+    root = snapshot_dir(REPO_ID)
+    assert (root / WEIGHTS).read_bytes() == hub.files[WEIGHTS]
+    assert (root / CONFIG).read_bytes() == hub.files[CONFIG]
+    assert hub.chunk_requests(WEIGHTS) == [0, 1, 2, 3]
+    assert hub.max_active > 1
+    assert not list(root.rglob("*.part*"))
+
+
+def test_retries_dropped_connection(hub):
+    hub.truncate[(WEIGHTS, 2 * MB)] = 1
+    status = download(DownloadManager())
+
+    assert status["status"] == "complete", status["error"]
+    assert hub.chunk_requests(WEIGHTS) == [0, 1, 2, 2, 3]
+    assert (snapshot_dir(REPO_ID) / WEIGHTS).read_bytes() == hub.files[WEIGHTS]
+
+
+def test_resume_fetches_only_missing_chunks(hub, monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_RETRIES", 0)
+    hub.truncate[(WEIGHTS, 2 * MB)] = 1
+    status = download(DownloadManager())
+    assert status["status"] == "failed"
+
+    state_path = snapshot_dir(REPO_ID) / f"{WEIGHTS}.part.json"
+    done = json.loads(state_path.read_text())["done"]
+    assert 2 not in done
+
+    hub.ranges.clear()
+    status = download(DownloadManager())
+
+    assert status["status"] == "complete", status["error"]
+    assert hub.chunk_requests(WEIGHTS) == [i for i in range(4) if i not in done]
+    size = len(hub.files[WEIGHTS])
+    assert status["resumed_bytes"] >= sum(min(MB, size - i * MB) for i in done)
+    assert (snapshot_dir(REPO_ID) / WEIGHTS).read_bytes() == hub.files[WEIGHTS]
+    assert not state_path.exists()
+
+
+def test_hash_mismatch_discards_file(hub):
+    hub.sha256[WEIGHTS] = hashlib.sha256(b"other weights").hexdigest()
+    status = download(DownloadManager())
+
+    assert status["status"] == "failed"
+    assert "Hash mismatch" in status["error"]
+    root = snapshot_dir(REPO_ID)
+    assert not (root / WEIGHTS).exists()
+    assert not (root / f"{WEIGHTS}.part").exists()
+    assert not (root / ".complete.json").exists()
+
+
+def test_rejects_paths_outside_snapshot(hub):
+    hub.extra_entries.append({"type": "file", "path": "../escaped.json", "size": 2, "oid": "x"})
+    status = download(DownloadManager())
+
+    assert status["status"] == "failed"
+    assert "outside the snapshot" in status["error"]
+    assert not (settings.MODELS_DIR / "snapshots" / "escaped.json").exists()
+    assert hub.ranges == []
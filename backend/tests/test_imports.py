@@ -0,0 +1,30 @@
+"""Every backend module imports, so module-level mistakes (missing names, bad annotations) fail here"""
+import importlib
+import pkgutil
+from pathlib import Path
+
+import pytest
+
+for dependency in ("fastapi", "pydantic_settings", "aiosqlite", "torch", "diffusers"):
+    pytest.importorskip(dependency)
+
+BACKEND = Path(__file__).resolve().parent.parent
+PACKAGES = ("api", "core", "models", "utils")
+MODULES = ["config", "main"] + [
+    f"{package}.{module.name}"
+    for package in PACKAGES
+    for module in pkgutil.iter_modules([str(BACKEND / package)])
+]
+
+
+@pytest.mark.parametrize("name", MODULES)
+def test_module_imports(name):
+    importlib.import_module(name)
+
+
+def test_app_serves_routes():
+    from main import app
+
+    paths = {route.path for route in app.routes}
+    assert "/api/generate/image" in paths
+    assert "/api/history/{gen_id}" in paths
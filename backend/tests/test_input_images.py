@@ -0,0 +1,71 @@
+"""Input image store: content ids and the uploads directory limits"""
+import os
+import time
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("pydantic_settings")
+
+from PIL import Image
+
+from config import settings
+from core.input_images import InputImageStore
+
+# About 300 KB per PNG: three fit into 1 MB, four do not
+SIDE = 316
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOADS_MAX_AGE_DAYS", 0)
+    monkeypatch.setattr(settings, "UPLOADS_MAX_TOTAL_MB", 0)
+    return InputImageStore(tmp_path / "uploads")
+
+
+def png() -> bytes:
+    # Noise does not compress, so every file is about the same size
+    image = Image.frombytes("RGB", (SIDE, SIDE), os.urandom(SIDE * SIDE * 3))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def age(store: InputImageStore, image_id: str, seconds: float) -> None:
+    stamp = time.time() - seconds
+    os.utime(store._path(image_id), (stamp, stamp))
+
+
+def test_same_content_same_id(store):
+    data = png()
+    first = store.save(data)
+    assert store.save(data)["image_id"] == first["image_id"]
+    assert len(first["image_id"]) == 64
+    assert store.exists(first["image_id"])
+
+
+def test_prunes_unused_past_max_age(store, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOADS_MAX_AGE_DAYS", 1)
+    old = store.save(png())["image_id"]
+    age(store, old, 2 * 86400)
+
+    new = store.save(png())["image_id"]
+
+    assert not store.exists(old)
+    assert store.exists(new)
+
+
+def test_prunes_least_recently_used_over_budget(store, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOADS_MAX_TOTAL_MB", 1)
+    ids = []
+    for i in range(3):
+        ids.append(store.save(png())["image_id"])
+        age(store, ids[-1], 300 - i * 100)
+    # Using the oldest makes the second the least recently used
+    store.get_pixels(ids[0], 8, 8)
+
+    new = store.save(png())["image_id"]
+
+    assert [store.exists(i) for i in ids] == [True, False, True]
+    assert store.exists(new)
@@ -0,0 +1,105 @@
+"""Weight-only int8/fp8 quantization on CPU"""
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("pydantic_settings")
+
+from torch import nn
+
+from config import settings
+from core.quantization import MIN_LINEAR_FEATURES, QuantLinear, apply_quantization, resolve_precision
+
+MODES = ["int8"] + (["fp8"] if hasattr(torch, "float8_e4m3fn") else [])
+# Relative output error: int8 has 255 levels per channel, e4m3 only 3 mantissa bits
+TOLERANCE = {"int8": 0.02, "fp8": 0.1}
+
+
+def denoiser() -> nn.Module:
+    torch.manual_seed(0)
+    return nn.Sequential(
+        nn.Linear(MIN_LINEAR_FEATURES, 512),
+        nn.GELU(),
+        nn.Linear(512, MIN_LINEAR_FEATURES),
+        nn.Linear(MIN_LINEAR_FEATURES, 16),  # Too small to quantize
+    )
+
+
+def relative_error(actual: torch.Tensor, expected: torch.Tensor) -> float:
+    return ((actual - expected).norm() / expected.norm()).item()
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_quant_linear_matches_linear(mode):
+    linear = denoiser()[0]
+    x = torch.randn(4, MIN_LINEAR_FEATURES)
+    quantized = QuantLinear(linear, mode)
+
+    assert quantized.weight_q.element_size() == 1
+    assert quantized.weight.shape == linear.weight.shape
+    assert quantized.weight.device.type == "meta"
+    with torch.no_grad():
+        assert relative_error(quantized(x), linear(x)) < TOLERANCE[mode]
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_dtype_casts_keep_quantized_weights(mode):
+    quantized = QuantLinear(denoiser()[0], mode)
+    stored = quantized.weight_q.clone()
+
+    quantized.to(torch.bfloat16)
+
+    assert quantized.weight_q.dtype == stored.dtype
+    assert torch.equal(quantized.weight_q, stored)
+    assert quantized.scale.dtype == torch.bfloat16
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_apply_quantization_to_pipeline(mode):
+    unet = denoiser()
+    reference = denoiser()
+    # Small text encoders (CLIP) stay in full precision
+    text_encoder = nn.Sequential(nn.Linear(MIN_LINEAR_FEATURES, MIN_LINEAR_FEATURES))
+    pipeline = SimpleNamespace(components={"unet": unet, "text_encoder": text_encoder, "scheduler": object()})
+
+    report = apply_quantization(pipeline, mode)
+
+    assert list(report["components"]) == ["unet"]
+    assert report["components"]["unet"]["layers"] == 2
+    assert report["bytes_after"] < report["bytes_before"]
+    assert isinstance(unet[0], QuantLinear) and isinstance(unet[2], QuantLinear)
+    assert isinstance(unet[3], nn.Linear)
+    assert isinstance(text_encoder[0], nn.Linear)
+    x = torch.randn(2, MIN_LINEAR_FEATURES)
+    with torch.no_grad():
+        assert relative_error(unet(x), reference(x)) < 2 * TOLERANCE[mode]
+
+
+def test_none_leaves_pipeline_alone():
+    unet = denoiser()
+    assert apply_quantization(SimpleNamespace(components={"unet": unet}), "none") is None
+    assert isinstance(unet[0], nn.Linear)
+
+
+def test_resolve_precision(monkeypatch):
+    monkeypatch.setattr(settings, "WEIGHT_PRECISION", "int8")
+    assert resolve_precision(None) == "int8"
+    assert resolve_precision("none") == "none"
+    assert resolve_precision("int4") == "none"
+
+
+def test_loras_refused_on_quantized_weights(monkeypatch):
+    pytest.importorskip("diffusers")
+    from core.model_manager import ModelManager
+
+    monkeypatch.setattr(settings, "CPU_PERF_MODE", False)
+    manager = ModelManager(device="cpu")
+    manager.pipeline = object()
+    manager.precision = "int8"
+
+    result = manager.load_loras([{"name": "style", "file_path": "style.safetensors", "weight": 1.0}])
+
+    assert not result["success"]
+    assert result["incompatible"]
+    assert "int8" in result["error"]
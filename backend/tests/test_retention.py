@@ -0,0 +1,119 @@
+"""Output GC: explicit deletes, the grace period and orphan handling"""
+import asyncio
+import os
+import time
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("pydantic_settings")
+
+from config import settings
+from core.retention import OutputGC
+from models.database import Database
+
+
+@pytest.fixture
+def gc(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "GC_ORPHAN_GRACE_SECONDS", 3600)
+    monkeypatch.setattr(settings, "GC_QUARANTINE_DIR", tmp_path / "quarantine")
+    db = Database(tmp_path / "test.db")
+    asyncio.run(db.init_db())
+    root = tmp_path / "outputs"
+    root.mkdir()
+    return OutputGC(db, root)
+
+
+def write(path, age: float = 0.0):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"png")
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+    return path
+
+
+def save(gc: OutputGC, path) -> int:
+    return asyncio.run(gc.db.save_generation(
+        prompt="p", negative_prompt="", model_key="m", width=8, height=8,
+        steps=1, guidance_scale=1.0, seed=0, file_path=str(path)
+    ))
+
+
+def test_explicit_delete_ignores_grace_period(gc):
+    image = write(gc.root / "2026" / "new.png")
+    gen_id = save(gc, image)
+
+    orphaned = asyncio.run(gc.db.delete_generations([gen_id]))
+
+    assert gc.remove_files(orphaned) == 1
+    assert not image.exists()
+
+
+def test_walk_keeps_recent_part_files(gc):
+    recent = write(gc.root / "2026" / "recent.png.part")
+    stale = write(gc.root / "2026" / "stale.png.part", age=7200)
+
+    assert gc.remove_files([str(recent), str(stale)], grace=True) == 1
+    assert recent.exists()
+    assert not stale.exists()
+
+
+def test_never_removes_outside_root(gc, tmp_path):
+    outside = write(tmp_path / "elsewhere.png", age=7200)
+
+    assert gc.remove_files([str(outside)]) == 0
+    assert outside.exists()
+
+
+def reconcile(gc: OutputGC) -> None:
+    """One full row pass and one full file pass"""
+    asyncio.run(gc._reconcile_rows(time.monotonic() + 30))
+    asyncio.run(gc._reconcile_files(time.monotonic() + 30))
+
+
+def test_delete_policy_removes_orphans_both_ways(gc, monkeypatch):
+    monkeypatch.setattr(settings, "GC_ORPHAN_POLICY", "delete")
+    kept = write(gc.root / "2026" / "kept.png", age=7200)
+    save(gc, kept)
+    missing_id = save(gc, gc.root / "2026" / "missing.png")
+    orphan = write(gc.root / "2026" / "orphan.png", age=7200)
+    recent = write(gc.root / "2026" / "recent.png")
+
+    reconcile(gc)
+    assert not orphan.exists()
+    assert recent.exists()
+    assert kept.exists()
+    # Flagged on the first pass, deleted once still missing on the next
+    assert asyncio.run(gc.db.get_generation_by_id(missing_id))["file_missing"]
+
+    reconcile(gc)
+    assert asyncio.run(gc.db.get_generation_by_id(missing_id)) is None
+    assert gc.stats["missing_rows_deleted"] == 1
+
+
+@pytest.mark.parametrize("policy", ["flag", "quarantine"])
+def test_other_policies_keep_rows_and_files(gc, monkeypatch, policy):
+    monkeypatch.setattr(settings, "GC_ORPHAN_POLICY", policy)
+    save(gc, write(gc.root / "2026" / "kept.png", age=7200))
+    missing_id = save(gc, gc.root / "2026" / "missing.png")
+    orphan = write(gc.root / "2026" / "orphan.png", age=7200)
+
+    reconcile(gc)
+    reconcile(gc)
+
+    assert asyncio.run(gc.db.get_generation_by_id(missing_id))["file_missing"]
+    assert orphan.exists() == (policy == "flag")
+    assert (settings.GC_QUARANTINE_DIR / "2026" / "orphan.png").exists() == (policy == "quarantine")
+
+
+def test_refuses_without_rows_under_root(gc, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "GC_ORPHAN_POLICY", "delete")
+    # A moved install: every row points at the old root
+    save(gc, write(tmp_path / "old_outputs" / "image.png", age=7200))
+    orphan = write(gc.root / "2026" / "image.png", age=7200)
+
+    reconcile(gc)
+
+    assert orphan.exists()
+    assert gc.stats["orphans_refused"]
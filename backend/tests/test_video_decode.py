@@ -0,0 +1,47 @@
+"""Chunked video decode must reproduce a single full decode of the causal VAE"""
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+diffusers = pytest.importorskip("diffusers")
+AutoencoderKLWan = getattr(diffusers, "AutoencoderKLWan", None)
+if AutoencoderKLWan is None:
+    pytest.skip("diffusers without AutoencoderKLWan", allow_module_level=True)
+
+from core.video import _frames, decode_video_chunks
+
+LATENT_FRAMES = 6
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    torch.manual_seed(0)
+    # Dummy component shapes of the diffusers test-suite
+    vae = AutoencoderKLWan(
+        base_dim=3, z_dim=16, dim_mult=[1, 1, 1, 1], num_res_blocks=1, temperal_downsample=[False, True, True]
+    ).eval()
+    return SimpleNamespace(vae=vae, vae_scale_factor_temporal=4)
+
+
+@pytest.fixture(scope="module")
+def latents():
+    torch.manual_seed(1)
+    return torch.randn(1, 16, LATENT_FRAMES, 4, 4)
+
+
+@pytest.mark.parametrize("chunk_frames", [1, 2, 4, LATENT_FRAMES])
+def test_chunked_decode_matches_full_decode(pipeline, latents, chunk_frames):
+    vae = pipeline.vae
+    with torch.no_grad():
+        mean = torch.tensor(vae.config.latents_mean).view(1, -1, 1, 1, 1)
+        std = torch.tensor(vae.config.latents_std).view(1, -1, 1, 1, 1)
+        expected = _frames(vae.decode(latents * std + mean, return_dict=False)[0])
+
+    chunks = list(decode_video_chunks(pipeline, latents, chunk_frames))
+    decoded = torch.from_numpy(np.concatenate(chunks))
+
+    assert len(chunks) == -(-LATENT_FRAMES // chunk_frames)
+    assert len(decoded) == 1 + 4 * (LATENT_FRAMES - 1)
+    assert (decoded.int() - torch.from_numpy(expected).int()).abs().max() <= 1
@@ -0,0 +1,129 @@
+"""
+CPU Performance Mode Benchmark
+Denoising steps per second of a UNet on CPU with the previous defaults
+(fp32, PyTorch's default threading, no pinning) against CPU performance
+mode (pinned physical cores, channels_last, bf16 autocast and fusion as
+configured), and the aggregate rate of --workers pinned pipelines running
+side by side. Each variant runs in a fresh process because thread settings
+are process-wide.
+
+Uses a randomly initialised SD 1.5-sized UNet unless --model names a
+downloaded model, so no download is needed.
+
+    cd backend
+    python -m utils.benchmark_cpu [--model sd15] [--size 512] [--steps 10] [--workers 2]
+"""
+import argparse
+import multiprocessing as mp
+import time
+from typing import Any, Dict, List, Optional
+
+import torch
+
+
+def _load_unet(model_key: Optional[str]) -> torch.nn.Module:
+    from diffusers import UNet2DConditionModel
+
+    if model_key is None:
+        torch.manual_seed(0)
+        return UNet2DConditionModel(cross_attention_dim=768).eval()
+
+    from core.downloads import resolve_model_source
+    from core.model_manager import ModelManager
+
+    model_id = ModelManager.AVAILABLE_MODELS[model_key]["model_id"]
+    source = resolve_model_source(model_id)
+    if source is None:
+        raise SystemExit(f"{model_id} is not downloaded")
+    return UNet2DConditionModel.from_pretrained(source, subfolder="unet", torch_dtype=torch.float32).eval()
+
+
+def _run(
+    tuned: bool,
+    cores: Optional[List[int]],
+    args: argparse.Namespace,
+    barrier: Optional[Any],
+    results: Any
+) -> None:
+    """Worker process: time args.steps UNet calls (batch 2, as with CFG)"""
+    from core.cpu_tuning import bf16_autocast, bind_cores, configure_runtime, resolve_bf16, tune_pipeline
+
+    unet = _load_unet(args.model)
+    bf16 = False
+    applied: Dict = {}
+    if tuned:
+        configure_runtime(len(cores))
+        bind_cores(cores)
+        bf16 = resolve_bf16()
+
+        class _Pipeline:
+            components = {"unet": unet}
+
+        pipeline = _Pipeline()
+        applied = tune_pipeline(pipeline, bf16)
+        unet = getattr(pipeline, "unet", unet)
+
+    latent = args.size // 8
+    sample = torch.randn(2, 4, latent, latent)
+    if tuned:
+        sample = sample.contiguous(memory_format=torch.channels_last)
+    hidden_states = torch.randn(2, 77, 768)
+    timestep = torch.tensor(500)
+
+    with torch.inference_mode(), bf16_autocast(bf16):
+        unet(sample, timestep, encoder_hidden_states=hidden_states)  # Warm-up (and compile)
+        if barrier is not None:
+            barrier.wait()
+        started_at = time.perf_counter()
+        for _ in range(args.steps):
+            unet(sample, timestep, encoder_hidden_states=hidden_states)
+        seconds = time.perf_counter() - started_at
+
+    results.put({"seconds": seconds, "threads": torch.get_num_threads(), "bf16": bf16, **applied})
+
+
+def _measure(ctx: Any, tuned: bool, slots: List[Optional[List[int]]], args: argparse.Namespace) -> List[Dict]:
+    results = ctx.Queue()
+    barrier = ctx.Barrier(len(slots)) if len(slots) > 1 else None
+    processes = [ctx.Process(target=_run, args=(tuned, cores, args, barrier, results)) for cores in slots]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return measured
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark CPU performance mode against the previous defaults")
+    parser.add_argument("--model", default=None, help="Model key of a downloaded model (default: random SD 1.5 UNet)")
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=2, help="Pipelines for the throughput run (1 to skip)")
+    args = parser.parse_args()
+
+    from core.cpu_tuning import plan_core_slots
+
+    ctx = mp.get_context("spawn")
+    runs = [
+        ("defaults", False, [None]),
+        ("perf mode", True, plan_core_slots(1)),
+    ]
+    if args.workers > 1:
+        runs.append((f"perf x{args.workers}", True, plan_core_slots(args.workers)))
+
+    baseline = None
+    print(f"{'variant':<14}{'threads':>8}{'bf16':>6}{'fusion':>9}{'steps/s':>10}{'speedup':>9}")
+    for name, tuned, slots in runs:
+        measured = _measure(ctx, tuned, slots, args)
+        steps_per_second = sum(args.steps / m["seconds"] for m in measured)
+        baseline = baseline or steps_per_second
+        first = measured[0]
+        print(
+            f"{name:<14}{sum(m['threads'] for m in measured):>8}{'yes' if first['bf16'] else 'no':>6}"
+            f"{first.get('fusion') or '-':>9}{steps_per_second:>10.2f}{steps_per_second / baseline:>8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Weight-Only Quantization Benchmark
+Compare weight memory, forward latency and output error of none/int8/fp8 on
+a stack of transformer-sized Linear layers. Runs on CPU (default) or CUDA
+without downloading a model.
+
+    cd backend
+    python -m utils.benchmark_quantization [--device cpu] [--width 3072] [--layers 8] [--tokens 256]
+"""
+import argparse
+import copy
+import time
+
+import torch
+import torch.nn as nn
+
+from core.quantization import PRECISION_MODES, quantize_module, resolve_precision
+
+
+def _block(width: int) -> nn.Module:
+    # Feed-forward block shaped like a FLUX/SD3 transformer MLP
+    return nn.Sequential(nn.Linear(width, width * 4), nn.GELU(), nn.Linear(width * 4, width))
+
+
+def _weight_bytes(model: nn.Module) -> int:
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+def _time_forward(model: nn.Module, x: torch.Tensor, repeats: int) -> float:
+    with torch.inference_mode():
+        model(x)  # Warm-up
+        if x.is_cuda:
+            torch.cuda.synchronize()
+        started_at = time.perf_counter()
+        for _ in range(repeats):
+            model(x)
+        if x.is_cuda:
+            torch.cuda.synchronize()
+    return (time.perf_counter() - started_at) / repeats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark weight-only int8/fp8 against full precision")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--width", type=int, default=3072)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--tokens", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    dtype = torch.float16 if args.device.startswith("cuda") else torch.float32
+    torch.manual_seed(0)
+    reference = nn.Sequential(*(_block(args.width) for _ in range(args.layers))).to(dtype)
+    x = torch.randn(1, args.tokens, args.width, dtype=dtype, device=args.device) * 0.1
+
+    model = reference.to(args.device)
+    with torch.inference_mode():
+        expected = model(x).float()
+    baseline_bytes = _weight_bytes(model)
+    baseline_seconds = _time_forward(model, x, args.repeats)
+
+    print(f"{'precision':<10}{'weights':>12}{'saved':>9}{'latency':>12}{'rel. error':>12}")
+    print(f"{'none':<10}{baseline_bytes / 1024**2:>10.1f}MB{0:>8.0%}{baseline_seconds * 1000:>10.1f}ms{0:>12.2e}")
+    for precision in PRECISION_MODES:
+        if precision == "none" or resolve_precision(precision) != precision:
+            continue
+        quantized = copy.deepcopy(reference).cpu()
+        quantize_module(quantized, precision)
+        quantized = quantized.to(args.device)
+        with torch.inference_mode():
+            output = quantized(x).float()
+        error = ((output - expected).norm() / expected.norm()).item()
+        weight_bytes = _weight_bytes(quantized)
+        seconds = _time_forward(quantized, x, args.repeats)
+        print(
+            f"{precision:<10}{weight_bytes / 1024**2:>10.1f}MB{1 - weight_bytes / baseline_bytes:>8.0%}"
+            f"{seconds * 1000:>10.1f}ms{error:>12.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Build the Visual Similarity Index
+Embed every generation that is not in the similarity index yet, e.g. after
+switching SIMILARITY_EMBEDDER, importing history or re-indexing outputs.
+
+    cd backend
+    python -m utils.build_similarity_index [--batch-size 64] [--rebuild] [--compact]
+
+Images are decoded by a thread pool and embedded a batch at a time; each
+batch is appended to the memory-mapped matrix. --compact drops rows of
+deleted generations afterwards.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from config import settings
+from core.similarity import similarity_index
+from models.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+async def build(db: Database, batch_size: int, workers: int, rebuild: bool, compact: bool) -> Dict:
+    await db.init_db()
+    if rebuild:
+        similarity_index.reset()
+    indexed = similarity_index.indexed_ids()
+    stats = {"embedded": 0, "unreadable": 0, "already_indexed": len(indexed), "kept": None}
+    loop = asyncio.get_running_loop()
+    batch: List[Dict] = []
+
+    def embed(rows: List[Dict], executor: ThreadPoolExecutor) -> int:
+        # Decoding dominates for the perceptual hash, so split it across threads
+        chunks = [rows[i::workers] for i in range(workers)]
+        added = 0
+        for result in executor.map(
+            lambda chunk: similarity_index.add_files([r["id"] for r in chunk], [r["file_path"] for r in chunk]),
+            [chunk for chunk in chunks if chunk]
+        ):
+            added += len(result)
+        return added
+
+    async def flush(executor):
+        added = await loop.run_in_executor(None, embed, list(batch), executor)
+        stats["embedded"] += added
+        stats["unreadable"] += len(batch) - added
+        batch.clear()
+        logger.info(f"Embedded {stats['embedded']} images ({stats['unreadable']} unreadable)")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        async for row in db.iter_generations(batch_size):
+            if row["id"] in indexed:
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                await flush(executor)
+        if batch:
+            await flush(executor)
+
+    if compact:
+        stats["kept"] = similarity_index.compact(await db.get_generation_ids())
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embed generations for visual similarity search")
+    parser.add_argument("--batch-size", type=int, default=64, help="Images embedded per step")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel image decoders")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the index and embed everything again")
+    parser.add_argument("--compact", action="store_true", help="Drop rows of deleted generations afterwards")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    started_at = time.perf_counter()
+    stats = asyncio.run(build(Database(settings.DB_PATH), args.batch_size, args.workers, args.rebuild, args.compact))
+    elapsed = time.perf_counter() - started_at
+    print(
+        f"{similarity_index.embedder.name}: embedded {stats['embedded']} images in {elapsed:.1f}s, "
+        f"{stats['already_indexed']} already indexed, {stats['unreadable']} unreadable"
+        + (f", {stats['kept']} rows after compaction" if stats["kept"] is not None else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Output Storage Migration
+Move images from the old flat outputs/ layout into the sharded,
+content-addressed layout and rewrite generations.file_path.
+
+    cd backend
+    python -m utils.migrate_storage [--workers 8] [--batch-size 500] [--dry-run]
+
+Files are hashed and moved in parallel; each batch of path updates is
+written in one transaction. Safe to re-run: rows already in the sharded
+layout are skipped, and identical files collapse into one.
+"""
+import argparse
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import settings
+from core.history_transfer import hash_file
+from core.storage import output_storage, parse_created_at
+from models.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_file(row: Dict, dry_run: bool = False) -> Optional[Dict]:
+    """Move one generation's image into the sharded layout, returning its path update"""
+    source = Path(row["file_path"])
+    if output_storage.is_sharded(source):
+        return None
+    if not source.exists():
+        # Another row may have pointed at the same content and moved it already
+        if row.get("content_hash"):
+            existing = output_storage.find(row["content_hash"], source.suffix or ".png")
+            if existing is not None:
+                return {"id": row["id"], "file_path": str(existing), "content_hash": row["content_hash"]}
+        logger.warning(f"Missing file for generation {row['id']}: {source}")
+        return None
+
+    content_hash = row.get("content_hash") or hash_file(source)
+    if dry_run:
+        target = output_storage.root / output_storage.relative_path(
+            content_hash, parse_created_at(row.get("created_at")), source.suffix or ".png"
+        )
+        return {"id": row["id"], "file_path": str(target), "content_hash": content_hash}
+
+    stored = output_storage.adopt(source, content_hash, parse_created_at(row.get("created_at")))
+    return {"id": row["id"], "file_path": str(stored["path"]), "content_hash": content_hash}
+
+
+async def migrate(db: Database, workers: int, batch_size: int, dry_run: bool) -> Dict:
+    await db.init_db()  # Adds the content_hash column on databases that predate it
+    stats = {"moved": 0, "skipped": 0}
+    loop = asyncio.get_running_loop()
+    batch = []
+
+    async def flush(executor):
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, migrate_file, row, dry_run) for row in batch
+        ))
+        updates = [update for update in results if update is not None]
+        stats["moved"] += len(updates)
+        stats["skipped"] += len(batch) - len(updates)
+        if updates and not dry_run:
+            await db.update_file_paths(updates)
+        batch.clear()
+        logger.info(f"Migrated {stats['moved']} files ({stats['skipped']} skipped)")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        async for row in db.iter_generations(batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                await flush(executor)
+        if batch:
+            await flush(executor)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move outputs into the sharded storage layout")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel file moves")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per database transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would move without touching anything")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    db = Database(settings.DB_PATH)
+    stats = asyncio.run(migrate(db, args.workers, args.batch_size, args.dry_run))
+    print(f"{'Would move' if args.dry_run else 'Moved'} {stats['moved']} files, skipped {stats['skipped']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+PNG Generation Metadata
+Embed generation parameters as PNG text chunks and read them back without
+decoding pixels, so outputs can be re-indexed when the database is lost
+"""
+import json
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from PIL.PngImagePlugin import PngInfo
+
+# iTXt chunk holding the full parameters as JSON
+METADATA_KEY = "ai_studio"
+
+# A1111-style summary understood by other tools
+PARAMETERS_KEY = "parameters"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+TEXT_CHUNKS = (b"tEXt", b"iTXt", b"zTXt")
+
+
+def build_pnginfo(params: Dict[str, Any]) -> PngInfo:
+    """
+    Text chunks for one image
+
+    params should be deterministic for a given request (no timestamps), so
+    identical outputs still deduplicate by content hash.
+    """
+    info = PngInfo()
+    info.add_itxt(METADATA_KEY, json.dumps(params, sort_keys=True, ensure_ascii=False))
+    info.add_text(PARAMETERS_KEY, format_parameters(params))
+    return info
+
+
+def format_parameters(params: Dict[str, Any]) -> str:
+    lines = [params.get("prompt", "")]
+    if params.get("negative_prompt"):
+        lines.append(f"Negative prompt: {params['negative_prompt']}")
+    hires = params.get("hires") or {}
+    if hires:
+        # A1111 lists the first pass size plus the upscale
+        params = {
+            **params,
+            "width": hires["base_size"][0],
+            "height": hires["base_size"][1],
+            "denoise_strength": hires.get("denoise_strength"),
+        }
+    fields = [
+        ("Steps", params.get("steps")),
+        ("Sampler", params.get("scheduler")),
+        ("CFG scale", params.get("guidance_scale")),
+        ("Seed", params.get("seed")),
+        ("Size", f"{params.get('width')}x{params.get('height')}"),
+        ("Model", params.get("model_key")),
+        ("Denoising strength", params.get("denoise_strength")),
+        ("Clip skip", params.get("clip_skip") or None),
+        ("Hires upscale", hires.get("scale")),
+        ("Hires steps", hires.get("steps")),
+        ("Hires upscaler", f"Latent ({hires['upscale_mode']})" if hires else None),
+    ]
+    lines.append(", ".join(f"{name}: {value}" for name, value in fields if value is not None))
+    for lora in params.get("loras") or ():
+        lines[-1] += f", Lora: {lora.get('name')}:{lora.get('weight')}"
+    return "\n".join(lines)
+
+
+def _decode_text_chunk(kind: bytes, data: bytes):
+    keyword, _, rest = data.partition(b"\0")
+    keyword = keyword.decode("latin-1")
+    if kind == b"tEXt":
+        return keyword, rest.decode("latin-1")
+    if kind == b"zTXt":
+        return keyword, zlib.decompress(rest[1:]).decode("latin-1")
+    # iTXt: compression flag, method, language tag, translated keyword, text
+    compressed, rest = rest[0], rest[2:]
+    _, _, rest = rest.partition(b"\0")
+    _, _, text = rest.partition(b"\0")
+    if compressed:
+        text = zlib.decompress(text)
+    return keyword, text.decode("utf-8")
+
+
+def read_text_chunks(path: Path, stop_at_idat: bool = True) -> Dict[str, str]:
+    """
+    Text chunks of a PNG, reading chunk headers only
+
+    Image data is skipped with seeks; by default parsing stops at the first
+    IDAT chunk since the metadata written here precedes the pixels.
+    """
+    chunks = {}
+    with open(path, "rb") as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError(f"{path} is not a PNG file")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, kind = struct.unpack(">I4s", header)
+            if kind == b"IEND" or (stop_at_idat and kind == b"IDAT"):
+                break
+            if kind in TEXT_CHUNKS:
+                try:
+                    keyword, text = _decode_text_chunk(kind, f.read(length))
+                    chunks[keyword] = text
+                except (ValueError, zlib.error, IndexError):
+                    pass
+                f.seek(4, 1)  # CRC
+            else:
+                f.seek(length + 4, 1)
+    return chunks
+
+
+def read_generation_params(path: Path) -> Optional[Dict[str, Any]]:
+    """Embedded generation parameters of an output image, None if it has none"""
+    text = read_text_chunks(path).get(METADATA_KEY)
+    if text is None:
+        return None
+    try:
+        params = json.loads(text)
+    except ValueError:
+        return None
+    return params if isinstance(params, dict) else None
@@ -0,0 +1,161 @@
+"""
+Rebuild Generation History From Outputs
+Scan OUTPUTS_DIR for images with embedded generation parameters and insert
+a history row for every file the database does not know yet.
+
+    cd backend
+    python -m utils.reindex_outputs [--workers 8] [--batch-size 2000]
+
+Files are read by a process pool, each worker parsing only the PNG text
+chunks in front of the image data; rows are bulk-inserted in batched
+transactions. Safe to re-run: indexed paths and known content hashes are
+skipped.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import settings
+from core.retention import UNTRACKED_DIRS
+from models.database import Database
+from utils.png_metadata import read_generation_params
+
+logger = logging.getLogger(__name__)
+
+# Files handed to a worker process per task
+FILES_PER_TASK = 256
+
+REQUIRED_PARAMS = ("prompt", "model_key", "width", "height", "steps", "guidance_scale")
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def walk_outputs(root: Path) -> Iterator[str]:
+    """PNG files below root, skipping directories without history rows"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        if Path(dirpath) == root:
+            dirnames[:] = [d for d in dirnames if d not in UNTRACKED_DIRS]
+        for name in filenames:
+            if name.lower().endswith(".png"):
+                yield os.path.join(dirpath, name)
+
+
+def row_from_params(params: Dict, path: str, stat: os.stat_result) -> Optional[Dict]:
+    """History row for an image from its embedded parameters"""
+    if any(params.get(key) is None for key in REQUIRED_PARAMS):
+        return None
+    stem = Path(path).stem
+    extra = {key: params[key] for key in ("loras", "clip_skip", "image_index", "hires") if params.get(key)}
+    return {
+        "prompt": params["prompt"],
+        "negative_prompt": params.get("negative_prompt"),
+        "model_key": params["model_key"],
+        "width": params["width"],
+        "height": params["height"],
+        "steps": params["steps"],
+        "guidance_scale": params["guidance_scale"],
+        "seed": params.get("seed"),
+        "file_path": path,
+        "metadata": json.dumps(extra) if extra else None,
+        "scheduler": params.get("scheduler"),
+        "denoise_strength": params.get("denoise_strength"),
+        "cache_key": None,
+        "peak_memory_mb": None,
+        # Sharded outputs are named by their hash; legacy files are not hashed here
+        "content_hash": stem if _SHA256.match(stem) else None,
+        "file_size": stat.st_size,
+        "created_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def read_files(paths: List[str]) -> Tuple[List[Dict], int]:
+    """Worker process: rows for files with usable parameters, plus the number without"""
+    rows = []
+    skipped = 0
+    for path in paths:
+        try:
+            params = read_generation_params(Path(path))
+            row = row_from_params(params, path, os.stat(path)) if params else None
+        except (OSError, ValueError):
+            row = None
+        if row is None:
+            skipped += 1
+        else:
+            rows.append(row)
+    return rows, skipped
+
+
+def _chunks(iterable: Iterator[str], size: int) -> Iterator[List[str]]:
+    while True:
+        chunk = list(itertools.islice(iterable, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def reindex(db: Database, root: Path, workers: int, batch_size: int) -> Dict:
+    await db.init_db()
+    stats = {"files": 0, "inserted": 0, "known": 0, "no_metadata": 0}
+    loop = asyncio.get_running_loop()
+    buffer: List[Dict] = []
+
+    async def flush():
+        inserted = await db.import_generations(buffer)
+        stats["inserted"] += inserted
+        stats["known"] += len(buffer) - inserted
+        buffer.clear()
+
+    async def collect(rows: List[Dict], skipped: int):
+        stats["files"] += len(rows) + skipped
+        stats["no_metadata"] += skipped
+        known = await db.get_referenced_paths([row["file_path"] for row in rows])
+        stats["known"] += len(known)
+        buffer.extend(row for row in rows if row["file_path"] not in known)
+        if len(buffer) >= batch_size:
+            await flush()
+
+    # Bounded number of tasks in flight keeps memory flat however many files there are
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk in _chunks(walk_outputs(root), FILES_PER_TASK):
+            pending.add(loop.run_in_executor(pool, read_files, chunk))
+            if len(pending) >= workers * 2:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    await collect(*future.result())
+        for future in asyncio.as_completed(pending):
+            await collect(*await future)
+    if buffer:
+        await flush()
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild generation history from PNG metadata in outputs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Reader processes")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Rows per database transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    started_at = time.perf_counter()
+    stats = asyncio.run(reindex(Database(settings.DB_PATH), settings.OUTPUTS_DIR, args.workers, args.batch_size))
+    elapsed = time.perf_counter() - started_at
+    rate = stats["files"] / elapsed if elapsed > 0 else 0
+    print(
+        f"Scanned {stats['files']} files in {elapsed:.1f}s ({rate:.0f}/s): "
+        f"{stats['inserted']} inserted, {stats['known']} already indexed, "
+        f"{stats['no_metadata']} without metadata"
+    )
+
+
+if __name__ == "__main__":
+    main()
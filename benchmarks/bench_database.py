@@ -0,0 +1,54 @@
+"""
+Database benchmarks: generation insert, prompt search and history listing
+"""
+import asyncio
+import random
+import time
+
+from harness import Results
+
+from models.database import Database
+
+WORDS = (
+    "portrait landscape castle forest neon city dragon ocean sunset robot cat "
+    "mountain river cyberpunk watercolor oil painting cinematic lighting"
+).split()
+
+
+async def _run(ctx, results: Results) -> None:
+    db = Database(ctx["workdir"] / "bench.db")
+    await db.init_db()
+    rows = ctx["db_rows"]
+    rng = random.Random(0)
+
+    start = time.perf_counter()
+    for i in range(rows):
+        await db.save_generation(
+            prompt=" ".join(rng.choices(WORDS, k=12)),
+            negative_prompt="blurry, lowres",
+            model_key=rng.choice(("sdxl", "sd15", "flux-dev")),
+            width=1024,
+            height=1024,
+            steps=30,
+            guidance_scale=7.5,
+            seed=i,
+            file_path=f"/outputs/bench_{i}.png",
+            scheduler="euler_a",
+        )
+    elapsed = time.perf_counter() - start
+    results.record("db.insert", [elapsed / rows], rows=rows, rows_per_second=round(rows / elapsed, 1))
+
+    for name, call in (
+        ("db.search", lambda: db.search_generations("dragon", limit=50)),
+        ("db.history", lambda: db.get_recent_generations(limit=50)),
+    ):
+        samples = []
+        for _ in range(ctx["repeat"]):
+            start = time.perf_counter()
+            await call()
+            samples.append(time.perf_counter() - start)
+        results.record(name, samples, rows=rows, queries_per_second=round(1 / min(samples), 1))
+
+
+def run(ctx, results: Results) -> None:
+    asyncio.run(_run(ctx, results))
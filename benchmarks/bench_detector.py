@@ -0,0 +1,18 @@
+"""
+Model type detection on synthetic single-file checkpoints
+"""
+from harness import Results, measure
+from tiny_models import build_checkpoints
+
+from utils.model_detector import detect_model_type
+
+
+def run(ctx, results: Results) -> None:
+    for expected, path in build_checkpoints(ctx["workdir"] / "checkpoints").items():
+        detected, _ = detect_model_type(str(path))
+        results.record(
+            f"detect_model_type.{expected}",
+            measure(lambda: detect_model_type(str(path)), ctx["repeat"], warmup=1),
+            detected=detected,
+            correct=detected == expected,
+        )
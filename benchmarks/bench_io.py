@@ -0,0 +1,34 @@
+"""
+Image I/O benchmarks: PNG encode + base64 as done for every generated image
+"""
+import base64
+
+import numpy as np
+from PIL import Image
+
+from harness import Results, measure
+
+from api.routes import encode_png
+
+SIZES = (512, 1024)
+
+
+def run(ctx, results: Results) -> None:
+    rng = np.random.default_rng(0)
+    for size in SIZES:
+        # Smooth gradient plus noise compresses roughly like a generated image
+        gradient = np.linspace(0, 255, size, dtype=np.float32)
+        base = (gradient[None, :, None] + gradient[:, None, None]) / 2
+        pixels = np.clip(base + rng.normal(0, 12, (size, size, 3)), 0, 255).astype(np.uint8)
+        image = Image.fromarray(pixels)
+
+        png = encode_png(image)
+        results.record(
+            f"png_encode.{size}",
+            measure(lambda: encode_png(image), ctx["repeat"], warmup=1),
+            png_bytes=len(png),
+        )
+        results.record(
+            f"png_base64.{size}",
+            measure(lambda: base64.b64encode(png).decode(), ctx["repeat"], warmup=1),
+        )
@@ -0,0 +1,157 @@
+"""
+ModelManager benchmarks on tiny pipelines: load, switch, LoRA, generation, img2img input prep
+"""
+import io
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from harness import Results, measure, measure_each
+from tiny_models import build_lora, build_sd15, build_sdxl
+
+from core.input_images import input_image_store
+from core.model_manager import ModelManager
+
+MODELS = {
+    "bench-sd15": {"builder": build_sd15, "family": "sd15"},
+    "bench-sdxl": {"builder": build_sdxl, "family": "sdxl"},
+}
+
+
+def register_models(ctx) -> None:
+    """Build the tiny pipelines once and add them to AVAILABLE_MODELS"""
+    from diffusers import (
+        StableDiffusionImg2ImgPipeline,
+        StableDiffusionPipeline,
+        StableDiffusionXLImg2ImgPipeline,
+        StableDiffusionXLPipeline,
+    )
+    classes = {
+        "sd15": (StableDiffusionPipeline, StableDiffusionImg2ImgPipeline),
+        "sdxl": (StableDiffusionXLPipeline, StableDiffusionXLImg2ImgPipeline),
+    }
+    for key, spec in MODELS.items():
+        directory = ctx["workdir"] / key
+        if not (directory / "model_index.json").exists():
+            spec["builder"](directory)
+        pipeline_class, img2img_class = classes[spec["family"]]
+        ModelManager.AVAILABLE_MODELS[key] = {
+            "name": f"Benchmark {spec['family']}",
+            "model_id": str(directory),
+            "pipeline_class": pipeline_class,
+            "img2img_class": img2img_class,
+            "type": "text2img",
+            "family": spec["family"],
+        }
+
+
+def _check(result: dict) -> dict:
+    if not result.get("success"):
+        raise RuntimeError(result.get("error"))
+    return result
+
+
+def run(ctx, results: Results) -> None:
+    register_models(ctx)
+    repeat = ctx["repeat"]
+    size = ctx["size"]
+    steps = ctx["steps"]
+    manager = ModelManager(device="cpu")
+
+    # Load: first load of each model, then warm reloads (OS file cache hot)
+    for key in MODELS:
+        start = time.perf_counter()
+        _check(manager.load_model(key))
+        cold = time.perf_counter() - start
+        samples = measure(lambda: _check(manager.load_model(key)), repeat)
+        results.record(f"model_load.{key}", samples, cold_seconds=cold)
+
+    # Switch back and forth between two different architectures
+    order = list(MODELS) * repeat
+    switch_samples = measure_each(lambda key: _check(manager.load_model(key)), order)
+    results.record("model_switch.sd15_sdxl", switch_samples)
+
+    for key in MODELS:
+        _check(manager.load_model(key))
+        _bench_lora(ctx, results, manager, key)
+        _bench_generate(results, manager, key, size, steps, repeat)
+        _bench_img2img_input(ctx, results, manager, key, size, repeat)
+
+
+def _bench_lora(ctx, results: Results, manager: ModelManager, key: str) -> None:
+    lora_path = ctx["workdir"] / "loras" / f"{key}.safetensors"
+    if not lora_path.exists():
+        build_lora(ctx["workdir"] / key, lora_path)
+    lora = {"name": key, "file_path": str(lora_path), "weight": 0.8}
+
+    if manager.load_loras([lora]).get("loaded_count", 0) == 0:
+        results.skip(f"lora_fuse.{key}", "LoRA did not load (is peft installed?)")
+        return
+    manager.unload_all_loras()
+
+    fuse, unfuse = [], []
+    for _ in range(ctx["repeat"]):
+        start = time.perf_counter()
+        manager.load_loras([lora])
+        fuse.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        manager.unload_all_loras()
+        unfuse.append(time.perf_counter() - start)
+    results.record(f"lora_fuse.{key}", fuse)
+    results.record(f"lora_unfuse.{key}", unfuse)
+
+
+def _bench_generate(results: Results, manager: ModelManager, key: str, size: int, steps: int, repeat: int) -> None:
+    timings = []
+
+    def generate():
+        result = _check(manager.generate_image(
+            prompt="a tiny benchmark prompt",
+            width=size,
+            height=size,
+            num_inference_steps=steps,
+            guidance_scale=5.0,
+            seed=0,
+        ))
+        list(result["images"])  # Decode when streaming
+        timings.append(result.get("timings") or {})
+
+    samples = measure(generate, repeat, warmup=1)
+    step_seconds = [
+        t["denoise"] / len(t["steps"]) for t in timings[1:] if t.get("denoise") and t.get("steps")
+    ]
+    results.record(
+        f"generate_image.{key}",
+        samples,
+        steps=steps,
+        size=size,
+        steps_per_second=round(steps / min(samples), 2),
+        denoise_steps_per_second=round(1 / min(step_seconds), 2) if step_seconds else None,
+    )
+
+
+def _bench_img2img_input(ctx, results: Results, manager: ModelManager, key: str, size: int, repeat: int) -> None:
+    """Upload -> resize -> VAE encode, uncached vs cached"""
+    rng = np.random.default_rng(0)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (size * 2, size * 2, 3), dtype=np.uint8)).save(buffer, format="PNG")
+    data = buffer.getvalue()
+
+    pipeline = manager.img2img_pipeline
+    generator = torch.Generator().manual_seed(0)
+
+    def uncached():
+        input_image_store.pixels.clear()
+        input_image_store.latents.clear()
+        image_id = input_image_store.save(data)["image_id"]
+        manager._prepare_img2img_input(pipeline, image_id, size, size, generator)
+
+    image_id = input_image_store.save(data)["image_id"]
+
+    def cached():
+        manager._prepare_img2img_input(pipeline, image_id, size, size, generator)
+
+    results.record(f"img2img_input.{key}.uncached", measure(uncached, repeat, warmup=1))
+    results.record(f"img2img_input.{key}.cached", measure(cached, repeat, warmup=1))
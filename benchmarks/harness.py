@@ -0,0 +1,140 @@
+"""
+Benchmark harness: timing, result collection and baseline comparison
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Results:
+    """Collects timings per benchmark and serializes them to JSON"""
+
+    def __init__(self):
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, name: str, samples: List[float], unit: str = "s", **extra) -> Dict:
+        """Store samples (lower is better) with summary statistics"""
+        entry = {
+            "unit": unit,
+            "median": statistics.median(samples),
+            "min": min(samples),
+            "mean": statistics.fmean(samples),
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            "samples": samples,
+        }
+        entry.update(extra)
+        self.results[name] = entry
+        print(f"  {name:<40} median {entry['median']:.4f}{unit}  min {entry['min']:.4f}{unit}")
+        return entry
+
+    def skip(self, name: str, reason: str) -> None:
+        self.results[name] = {"skipped": reason}
+        print(f"  {name:<40} skipped: {reason}")
+
+    def to_dict(self) -> Dict:
+        return {"meta": environment(), "results": self.results}
+
+
+def measure(func: Callable[[], Any], repeat: int, warmup: int = 0) -> List[float]:
+    """Wall-clock seconds of `repeat` calls after `warmup` unmeasured calls"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def measure_each(func: Callable[[Any], Any], arguments: List[Any]) -> List[float]:
+    """Wall-clock seconds of func(argument) for each argument, in order"""
+    samples = []
+    for argument in arguments:
+        start = time.perf_counter()
+        func(argument)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def environment() -> Dict:
+    """Versions and machine info stored alongside results"""
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+    for module in ("torch", "diffusers", "transformers", "peft"):
+        try:
+            meta[module] = __import__(module).__version__
+        except ImportError:
+            meta[module] = None
+    try:
+        import torch
+        meta["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    try:
+        meta["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=Path(__file__).parent, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        meta["git_commit"] = None
+    return meta
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """
+    Compare medians against a baseline run
+
+    Every benchmark is "lower is better". A ratio above 1 + tolerance is a
+    regression, below 1 - tolerance an improvement.
+    """
+    rows = []
+    for name, entry in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "median" not in base or "median" not in entry or not base["median"]:
+            continue
+        ratio = entry["median"] / base["median"]
+        if ratio > 1 + tolerance:
+            status = "regression"
+        elif ratio < 1 - tolerance:
+            status = "improvement"
+        else:
+            status = "unchanged"
+        rows.append({
+            "name": name,
+            "baseline": base["median"],
+            "current": entry["median"],
+            "ratio": round(ratio, 3),
+            "status": status,
+        })
+    return rows
+
+
+def print_comparison(rows: List[Dict]) -> None:
+    print("\nComparison against baseline (median, lower is better)")
+    for row in rows:
+        print(
+            f"  {row['name']:<40} {row['baseline']:.4f} -> {row['current']:.4f}"
+            f"  x{row['ratio']:<6} {row['status']}"
+        )
+
+
+def load_json(path: Optional[Path]) -> Optional[Dict]:
+    if path is None or not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_json(path: Path, data: Dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2), encoding="utf-8")
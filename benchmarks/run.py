@@ -0,0 +1,120 @@
+"""
+Run the component benchmarks
+
+    python benchmarks/run.py                                   # all suites
+    python benchmarks/run.py --suites io,database              # a subset
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json --fail-on-regression
+
+CPU only and offline: models are tiny random pipelines built on the fly.
+Results are written as JSON; with --baseline every median is compared
+against the stored run.
+"""
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent / "backend"
+
+SUITES = {
+    "model_manager": "bench_model_manager",
+    "io": "bench_io",
+    "database": "bench_database",
+    "detector": "bench_detector",
+}
+
+
+def configure_environment(workdir: Path) -> None:
+    """Point the backend at scratch directories and the CPU before config is imported"""
+    os.environ.setdefault("DEVICE", "cpu")
+    os.environ["ENABLE_DEVICE_POOL"] = "false"
+    os.environ["INFERENCE_WORKER_PROCESS"] = "false"
+    os.environ["ENABLE_XFORMERS"] = "false"
+    os.environ["MODELS_DIR"] = str(workdir / "models")
+    os.environ["OUTPUTS_DIR"] = str(workdir / "outputs")
+    os.environ["UPLOADS_DIR"] = str(workdir / "uploads")
+    os.environ["DB_PATH"] = str(workdir / "app.db")
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    sys.path.insert(0, str(BACKEND_DIR))
+    sys.path.insert(0, str(BENCH_DIR))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="AI Studio component benchmarks")
+    parser.add_argument("--suites", default=",".join(SUITES), help="Comma separated: " + ", ".join(SUITES))
+    parser.add_argument("--repeat", type=int, default=5, help="Measured repetitions per benchmark")
+    parser.add_argument("--steps", type=int, default=10, help="Denoising steps for generate_image")
+    parser.add_argument("--size", type=int, default=64, help="Image size for the tiny pipelines")
+    parser.add_argument("--db-rows", type=int, default=2000, help="Rows inserted for database benchmarks")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--output", type=Path, default=BENCH_DIR / "results" / "latest.json")
+    parser.add_argument("--baseline", type=Path, default=None, help="Compare against this results file")
+    parser.add_argument("--save-baseline", type=Path, default=None, help="Also write results here")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--workdir", type=Path, default=None, help="Keep built models here between runs")
+    args = parser.parse_args()
+
+    unknown = [s for s in args.suites.split(",") if s not in SUITES]
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(unknown)}")
+
+    scratch = None
+    if args.workdir is None:
+        scratch = tempfile.TemporaryDirectory(prefix="aistudio-bench-")
+        workdir = Path(scratch.name)
+    else:
+        workdir = args.workdir
+        workdir.mkdir(parents=True, exist_ok=True)
+    configure_environment(workdir)
+
+    import torch
+    from harness import Results, compare, load_json, print_comparison, write_json
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    ctx = {
+        "workdir": workdir,
+        "repeat": args.repeat,
+        "steps": args.steps,
+        "size": args.size,
+        "db_rows": args.db_rows,
+    }
+    results = Results()
+    for suite in args.suites.split(","):
+        print(f"[{suite}]")
+        importlib.import_module(SUITES[suite]).run(ctx, results)
+
+    data = results.to_dict()
+    data["meta"]["args"] = {k: str(v) for k, v in vars(args).items()}
+    write_json(args.output, data)
+    print(f"\nResults written to {args.output}")
+    if args.save_baseline:
+        write_json(args.save_baseline, data)
+        print(f"Baseline written to {args.save_baseline}")
+
+    exit_code = 0
+    if args.baseline:
+        baseline = load_json(args.baseline)
+        if baseline is None:
+            print(f"Baseline {args.baseline} not found, skipping comparison")
+        else:
+            rows = compare(data, baseline, args.tolerance)
+            data["comparison"] = rows
+            write_json(args.output, data)
+            print_comparison(rows)
+            if args.fail_on_regression and any(r["status"] == "regression" for r in rows):
+                exit_code = 1
+
+    if scratch is not None:
+        scratch.cleanup()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
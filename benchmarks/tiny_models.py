@@ -0,0 +1,195 @@
+"""
+Tiny randomly initialized SD1.5 / SDXL pipelines, LoRAs and checkpoint files
+
+Everything is built locally (including the CLIP tokenizer vocabulary), so the
+benchmarks run offline on a CPU-only machine. Shapes follow the dummy
+components used in the diffusers test-suite.
+"""
+import json
+from pathlib import Path
+from typing import Dict
+
+import torch
+from safetensors.torch import save_file
+
+SEED = 0
+
+
+def build_tokenizer(directory: Path):
+    """Byte-level CLIP tokenizer with no merges (every character is a token)"""
+    from transformers import CLIPTokenizer
+    from transformers.models.clip.tokenization_clip import bytes_to_unicode
+
+    directory.mkdir(parents=True, exist_ok=True)
+    vocab: Dict[str, int] = {"<|startoftext|>": 0, "<|endoftext|>": 1}
+    for char in bytes_to_unicode().values():
+        vocab.setdefault(char, len(vocab))
+        vocab.setdefault(f"{char}</w>", len(vocab))
+
+    (directory / "vocab.json").write_text(json.dumps(vocab), encoding="utf-8")
+    (directory / "merges.txt").write_text("#version: 0.2\n", encoding="utf-8")
+    return CLIPTokenizer(
+        str(directory / "vocab.json"),
+        str(directory / "merges.txt"),
+        pad_token="<|endoftext|>",
+        model_max_length=77,
+    )
+
+
+def _text_config(**overrides):
+    from transformers import CLIPTextConfig
+
+    config = dict(
+        bos_token_id=0,
+        eos_token_id=1,
+        pad_token_id=1,
+        hidden_size=32,
+        intermediate_size=37,
+        layer_norm_eps=1e-05,
+        num_attention_heads=4,
+        num_hidden_layers=5,
+        vocab_size=1000,
+    )
+    config.update(overrides)
+    return CLIPTextConfig(**config)
+
+
+def _vae():
+    from diffusers import AutoencoderKL
+
+    return AutoencoderKL(
+        block_out_channels=[32, 64],
+        in_channels=3,
+        out_channels=3,
+        down_block_types=["DownEncoderBlock2D", "DownEncoderBlock2D"],
+        up_block_types=["UpDecoderBlock2D", "UpDecoderBlock2D"],
+        latent_channels=4,
+        sample_size=128,
+    )
+
+
+def build_sd15(directory: Path) -> Path:
+    """Save a tiny SD1.5-style pipeline to directory"""
+    from diffusers import DDIMScheduler, StableDiffusionPipeline, UNet2DConditionModel
+    from transformers import CLIPTextModel
+
+    torch.manual_seed(SEED)
+    unet = UNet2DConditionModel(
+        block_out_channels=(32, 64),
+        layers_per_block=2,
+        sample_size=32,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        cross_attention_dim=32,
+    )
+    pipeline = StableDiffusionPipeline(
+        vae=_vae(),
+        text_encoder=CLIPTextModel(_text_config()),
+        tokenizer=build_tokenizer(directory / "_tokenizer"),
+        unet=unet,
+        scheduler=DDIMScheduler(
+            beta_start=0.00085,
+            beta_end=0.012,
+            beta_schedule="scaled_linear",
+            clip_sample=False,
+            set_alpha_to_one=False,
+        ),
+        safety_checker=None,
+        feature_extractor=None,
+        requires_safety_checker=False,
+    )
+    pipeline.save_pretrained(directory, safe_serialization=True)
+    return directory
+
+
+def build_sdxl(directory: Path) -> Path:
+    """Save a tiny SDXL-style pipeline (dual text encoders, text_time embedding)"""
+    from diffusers import EulerDiscreteScheduler, StableDiffusionXLPipeline, UNet2DConditionModel
+    from transformers import CLIPTextModel, CLIPTextModelWithProjection
+
+    torch.manual_seed(SEED)
+    unet = UNet2DConditionModel(
+        block_out_channels=(32, 64),
+        layers_per_block=2,
+        sample_size=32,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        attention_head_dim=(2, 4),
+        use_linear_projection=True,
+        addition_embed_type="text_time",
+        addition_time_embed_dim=8,
+        transformer_layers_per_block=(1, 2),
+        projection_class_embeddings_input_dim=80,  # 6 * 8 time ids + 32 pooled
+        cross_attention_dim=64,
+    )
+    tokenizer = build_tokenizer(directory / "_tokenizer")
+    pipeline = StableDiffusionXLPipeline(
+        vae=_vae(),
+        text_encoder=CLIPTextModel(_text_config(projection_dim=32)),
+        text_encoder_2=CLIPTextModelWithProjection(_text_config(projection_dim=32)),
+        tokenizer=tokenizer,
+        tokenizer_2=tokenizer,
+        unet=unet,
+        scheduler=EulerDiscreteScheduler(
+            beta_start=0.00085,
+            beta_end=0.012,
+            beta_schedule="scaled_linear",
+            timestep_spacing="leading",
+            steps_offset=1,
+        ),
+    )
+    pipeline.save_pretrained(directory, safe_serialization=True)
+    return directory
+
+
+def build_lora(pipeline_dir: Path, path: Path, rank: int = 4) -> Path:
+    """
+    Write a kohya-style LoRA for the attention projections of a saved UNet
+
+    Uses the same key layout as LoRAs users download, so it goes through the
+    same conversion path in load_lora_weights.
+    """
+    from diffusers import UNet2DConditionModel
+
+    unet = UNet2DConditionModel.from_pretrained(pipeline_dir / "unet")
+    generator = torch.Generator().manual_seed(SEED)
+    tensors = {}
+    for name, module in unet.named_modules():
+        if not isinstance(module, torch.nn.Linear):
+            continue
+        if not name.endswith(("attn1.to_q", "attn1.to_k", "attn1.to_v", "attn1.to_out.0",
+                              "attn2.to_q", "attn2.to_k", "attn2.to_v", "attn2.to_out.0")):
+            continue
+        key = "lora_unet_" + name.replace(".", "_")
+        tensors[f"{key}.lora_down.weight"] = torch.randn(rank, module.in_features, generator=generator) * 0.01
+        tensors[f"{key}.lora_up.weight"] = torch.randn(module.out_features, rank, generator=generator) * 0.01
+        tensors[f"{key}.alpha"] = torch.tensor(float(rank))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    save_file(tensors, str(path))
+    return path
+
+
+def build_checkpoints(directory: Path) -> Dict[str, Path]:
+    """Synthetic single-file checkpoints with the key layouts model_detector looks for"""
+    directory.mkdir(parents=True, exist_ok=True)
+    tensor = torch.zeros(4, 4, dtype=torch.float16)
+    layouts = {
+        "SD1.5": [f"model.diffusion_model.input_blocks.{i}.0.weight" for i in range(9)],
+        "SDXL": ["conditioner.embedders.0.transformer.weight"]
+                + [f"model.diffusion_model.input_blocks.{i}.0.weight" for i in range(12)],
+        "FLUX": [f"double_blocks.{i}.img_attn.qkv.weight" for i in range(19)]
+                + [f"single_blocks.{i}.linear1.weight" for i in range(38)],
+    }
+    paths = {}
+    for model_type, keys in layouts.items():
+        # Pad with unrelated tensors so key scanning has realistic work to do
+        names = keys + [f"first_stage_model.decoder.block.{i}.weight" for i in range(500)]
+        path = directory / f"{model_type.replace('.', '')}.safetensors"
+        save_file({name: tensor.clone() for name in names}, str(path))
+        paths[model_type] = path
+    return paths
@@ -73,7 +73,8 @@ export default function Header() {
         addGeneratedImages(response.images);
       }
     } catch (err: any) {
-      alert(err.response?.data?.detail || err.message || 'Generation fehlgeschlagen');
+      const detail = err.response?.data?.detail;
+      alert((typeof detail === 'object' ? detail?.error : detail) || err.message || 'Generation fehlgeschlagen');
       console.error('Generation error:', err);
     } finally {
       setIsGenerating(false);
@@ -18,6 +18,12 @@ export default function HistoryPanel() {
     return parts[parts.length - 1];
   };
 
+  // Served URL of a generation's image (sharded layout), flat outputs/ as fallback
+  const getImageUrl = (gen: Generation): string => {
+    if (gen.url) return `http://127.0.0.1:8000${gen.url}`;
+    return `http://127.0.0.1:8000/outputs/${getFilename(gen.file_path)}`;
+  };
+
   useEffect(() => {
     loadHistory();
   }, []);
@@ -65,7 +71,7 @@ export default function HistoryPanel() {
   const handleDownload = async (gen: Generation) => {
     try {
       const filename = getFilename(gen.file_path);
-      const imageUrl = `http://127.0.0.1:8000/outputs/${filename}`;
+      const imageUrl = getImageUrl(gen);
       
       const response = await fetch(imageUrl);
       const blob = await response.blob();
@@ -162,10 +168,10 @@ export default function HistoryPanel() {
                   <div className="w-20 h-20 bg-dark-600 rounded-lg flex-shrink-0 overflow-hidden">
                     {gen.file_path ? (
                       <img
-                        src={`http://127.0.0.1:8000/outputs/${getFilename(gen.file_path)}`}
+                        src={getImageUrl(gen)}
                         alt={gen.prompt}
                         className="w-full h-full object-cover cursor-pointer hover:opacity-80 transition-opacity"
-                        onClick={() => window.open(`http://127.0.0.1:8000/outputs/${getFilename(gen.file_path)}`, '_blank')}
+                        onClick={() => window.open(getImageUrl(gen), '_blank')}
                         onError={(e) => {
                           e.currentTarget.style.display = 'none';
                           e.currentTarget.parentElement!.classList.add('flex', 'items-center', 'justify-center');
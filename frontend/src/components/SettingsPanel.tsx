@@ -63,9 +63,14 @@ export default function SettingsPanel() {
         }
         await loadModels(); // Refresh model list
       }
-    } catch (error) {
+    } catch (error: any) {
       console.error('Error loading model:', error);
-      showToast('Fehler beim Laden', 'error');
+      if (error.response?.status === 409) {
+        // Not downloaded yet; the backend started the download
+        showToast('Model wird heruntergeladen, bitte später erneut laden', 'error');
+      } else {
+        showToast('Fehler beim Laden', 'error');
+      }
     } finally {
       setIsLoadingModel(false);
     }
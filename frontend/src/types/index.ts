@@ -16,6 +16,7 @@ export interface GenerateImageRequest {
 export interface GeneratedImage {
   filename: string;
   path: string;
+  url?: string | null;
   base64: string;
 }
 
@@ -62,6 +63,7 @@ export interface Generation {
   guidance_scale: number;
   seed: number | null;
   file_path: string;
+  url?: string | null;
   thumbnail_path: string | null;
   created_at: string;
   metadata: string | null;